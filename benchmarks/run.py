@@ -0,0 +1,173 @@
+"""
+    Benchmarks of the calibration and ingest hot paths.
+
+    Usage:
+    ------
+        python benchmarks/run.py                                  # default sizes
+        python benchmarks/run.py --rows 1e3 1e5 1e7 --pairs 1 8 32
+        python benchmarks/run.py --rows 1e8 --max-ingest-rows 1e8  # streams a 1e8 rows file
+        python benchmarks/run.py --save benchmarks/baseline.json  # record a baseline
+        python benchmarks/run.py --compare benchmarks/baseline.json
+
+    Every benchmark reports the best wall time over `--repeat` runs and the
+    peak memory traced by `tracemalloc` during one extra run. With `--compare`
+    the exit code is 1 if any benchmark is slower than the baseline by more
+    than `--tolerance` (relative) and `--min-delta` (seconds).
+
+    The synthetic files are written chunk by chunk and also read back in
+    chunks, so the ingest benchmarks run up to 1e8 rows in bounded memory.
+    The fits need the whole dataset in memory: sizes above `--max-memory`
+    (e.g. 1e8 rows of 32 pairs, about 50 GiB) are skipped and reported.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from sstc_fixedsensors.calibration import calibrate_pairs, calibration
+from sstc_fixedsensors.toa5 import parse_timestamp, read_toa5
+
+from synthetic import (
+    MAX_IN_MEMORY_BYTES, calibration_chunks, calibration_dataset, channel_names, dataset_bytes, write_toa5)
+
+
+def measure(func, repeat: int = 3) -> dict:
+    """
+    Best wall time over `repeat` runs and traced peak memory of `func()`.
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': min(times), 'peak_bytes': int(peak)}
+
+
+def run(rows: list, pairs: list, repeat: int, max_ingest_rows: int, max_memory: int) -> dict:
+    results = {}
+
+    def report(name: str, func):
+        results[name] = measure(func, repeat)
+        r = results[name]
+        print(f"{name:<40} {r['seconds'] * 1e3:>10.2f} ms {r['peak_bytes'] / 2**20:>10.1f} MiB")
+
+    for n_rows in rows:
+        if n_rows <= max_ingest_rows:
+            # Written chunk by chunk, the file can be larger than memory
+            with tempfile.TemporaryDirectory() as dirpath:
+                filepath = os.path.join(dirpath, 'synthetic.dat')
+                write_toa5(calibration_chunks(n_rows), filepath)
+                up, dw = channel_names(1)[0]
+                if dataset_bytes(n_rows, 1) <= max_memory:
+                    report(f'ingest/read_csv/rows={n_rows}', lambda: pd.read_csv(filepath, header=1))
+                    report(f'ingest/read_toa5/rows={n_rows}', lambda: read_toa5(filepath, columns=[up, dw]))
+                report(
+                    f'ingest/read_toa5_chunks/rows={n_rows}',
+                    lambda: sum(len(c) for c in read_toa5(filepath, columns=[up, dw], chunksize=1_000_000)))
+
+        # The fits need the whole dataset in memory
+        fitted_pairs = [p for p in pairs if dataset_bytes(n_rows, p) <= max_memory]
+        skipped = sorted(set(pairs) - set(fitted_pairs))
+        if skipped:
+            print(f'fit/rows={n_rows}: pairs={skipped} skipped, above --max-memory')
+        if not fitted_pairs:
+            continue
+
+        cal_df, channels_df, _ = calibration_dataset(n_rows, max(fitted_pairs), max_bytes=max_memory)
+        up, dw = channels_df.loc[0, 'Up'], channels_df.loc[0, 'Down']
+        timestamps = cal_df['TIMESTAMP'].dt.strftime('%Y-%m-%d %H:%M:%S')
+        report(f'timestamps/parse/rows={n_rows}', lambda: parse_timestamp(timestamps))
+        del timestamps
+
+        report(f'fit/single/rows={n_rows}', lambda: calibration(cal_df[up], cal_df[dw]))
+        for n_pairs in fitted_pairs:
+            report(
+                f'fit/batch/rows={n_rows}/pairs={n_pairs}',
+                lambda: calibrate_pairs(cal_df, channels_df.iloc[:n_pairs]))
+
+        del cal_df
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta: float) -> list:
+    regressions = []
+    for name, r in results.items():
+        if name not in baseline:
+            continue
+        ratio = r['seconds'] / baseline[name]['seconds']
+        # Sub-millisecond benchmarks are dominated by timer noise
+        slower = r['seconds'] - baseline[name]['seconds'] > min_delta
+        status = 'REGRESSION' if ratio > 1 + tolerance and slower else 'ok'
+        print(f'{name:<40} {ratio:>6.2f}x baseline  {status}')
+        if status != 'ok':
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', nargs='+', type=float, default=[1e3, 1e4, 1e5, 1e6, 1e7])
+    parser.add_argument('--pairs', nargs='+', type=int, default=[1, 4, 32])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument(
+        '--max-ingest-rows', type=float, default=1e7,
+        help='skip the file based benchmarks above this size (default: 1e7)')
+    parser.add_argument(
+        '--max-memory', type=float, default=MAX_IN_MEMORY_BYTES / 2**30,
+        help='skip the in-memory benchmarks of datasets larger than this many GiB (default: %(default)s)')
+    parser.add_argument('--save', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', help='JSON baseline to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown (default: 0.25)')
+    parser.add_argument(
+        '--min-delta', type=float, default=0.005,
+        help='ignore slowdowns smaller than this many seconds (default: 0.005)')
+    args = parser.parse_args(argv)
+
+    results = run(
+        rows=[int(r) for r in args.rows],
+        pairs=sorted(set(args.pairs)),
+        repeat=args.repeat,
+        max_ingest_rows=int(args.max_ingest_rows),
+        max_memory=int(args.max_memory * 2**30))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'meta': {
+                    'created': datetime.now().isoformat(timespec='seconds'),
+                    'python': platform.python_version(),
+                    'numpy': np.__version__,
+                    'pandas': pd.__version__,
+                    'machine': platform.machine(),
+                    'processor': platform.processor(),
+                    },
+                'results': results,
+                }, f, indent=2)
+        print(f'Baseline written to {args.save}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        if compare(results, baseline, args.tolerance, args.min_delta):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+    Synthetic Up/Dw logger data for the benchmarks.
+
+    Up channels follow a diurnal irradiance cycle with cloud attenuation, Dw
+    channels are a linear response of the Up channel plus noise. A fraction of
+    the Dw samples is corrupted by multiplicative outliers and a few samples
+    are missing, as in real logger files.
+
+    Datasets up to `MAX_IN_MEMORY_BYTES` are built in memory, e.g. 1e7 rows of
+    16 pairs. Larger ones, up to 1e8 rows of 32 pairs (about 50 GiB), are only
+    generated and written chunk by chunk.
+"""
+import csv
+import itertools
+
+import numpy as np
+import pandas as pd
+
+
+WAVELENGTHS_NM = [469, 531, 570, 650, 704, 740, 810, 860]
+
+
+def channel_names(n_pairs: int) -> list:
+    """
+    `(Up, Dw)` column names following the `Up_<wavelength>[_<set>]` convention.
+    """
+    names = []
+    for i in range(n_pairs):
+        wavelength = WAVELENGTHS_NM[i % len(WAVELENGTHS_NM)]
+        pair_set = i // len(WAVELENGTHS_NM)
+        suffix = f'_{pair_set}' if pair_set else ''
+        names.append((f'Up_{wavelength}{suffix}', f'Dw_{wavelength}{suffix}'))
+    return names
+
+
+# Bytes per value of the float64 channels, TIMESTAMP and RECORD columns
+VALUE_BYTES = 8
+# Largest dataset `calibration_dataset()` builds in memory, larger ones are
+# generated chunk by chunk with `calibration_chunks()`
+MAX_IN_MEMORY_BYTES = 4 * 2**30
+
+
+def dataset_bytes(n_rows: int, n_pairs: int) -> int:
+    """
+    Memory of a synthetic dataset: TIMESTAMP, RECORD and two channels per pair.
+    """
+    return int(n_rows) * (2 + 2 * n_pairs) * VALUE_BYTES
+
+
+def clear_sky(timestamps: pd.DatetimeIndex, peak=1000.0) -> np.ndarray:
+    """
+    Clear-sky like daily cycle in mV.
+    """
+    hours = (timestamps.hour + timestamps.minute / 60).to_numpy(dtype=np.float64)
+    day_of_year = timestamps.dayofyear.to_numpy(dtype=np.float64)
+    day_length = 12 + 6 * np.sin(2 * np.pi * (day_of_year - 80) / 365)
+    elevation = np.sin(np.pi * (hours - (12 - day_length / 2)) / day_length)
+    return peak * np.clip(elevation, 0, None)
+
+
+def diurnal_irradiance(timestamps: pd.DatetimeIndex, peak=1000.0, rng=None, walk: float = 0.0) -> tuple:
+    """
+    Daily cycle in mV with slowly varying cloud attenuation, a random walk
+    mapped between 0.3 and 1. `walk` is the walk value before the first
+    timestamp, so consecutive chunks continue the same clouds.
+
+    Returns:
+    --------
+        (irradiance, walk value at the last timestamp)
+    """
+    rng = np.random.default_rng(rng)
+    clouds = walk + np.cumsum(rng.normal(0, 0.02, len(timestamps)))
+    walk = float(clouds[-1]) if len(clouds) else walk
+    attenuation = 0.65 + 0.35 * np.tanh(clouds)
+    return clear_sky(timestamps, peak) * attenuation + rng.normal(0, 1.0, len(timestamps)), walk
+
+
+def calibration_truth(n_pairs: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Slope, intercept and Up gain of every pair, the same for any number of rows.
+    """
+    rng = np.random.default_rng([seed, 1])
+    truth = pd.DataFrame(channel_names(n_pairs), columns=['Up', 'Down'])
+    truth['slope'] = rng.uniform(0.8, 1.2, n_pairs)
+    truth['intercept'] = rng.uniform(-5, 5, n_pairs)
+    truth['gain'] = rng.uniform(0.5, 1.5, n_pairs)
+    return truth
+
+
+def calibration_chunks(
+        n_rows: int,
+        n_pairs: int = 1,
+        chunksize: int = 1_000_000,
+        outliers: float = 0.02,
+        missing: float = 0.001,
+        freq: str = '1min',
+        start: str = '2023-04-01',
+        seed: int = 0):
+    """
+    Synthetic calibration dataset generated in chunks of `chunksize` rows, so
+    that datasets larger than memory (1e8 rows and more) can be written to
+    disk or streamed. The pairs follow `calibration_truth(n_pairs, seed)`.
+
+    Yields:
+    -------
+        DataFrames with TIMESTAMP, RECORD and the Up/Dw columns.
+    """
+    truth = calibration_truth(n_pairs, seed)
+    rng = np.random.default_rng([seed, 2])
+    offset = pd.tseries.frequencies.to_offset(freq)
+    start = pd.Timestamp(start)
+    walk = 0.0
+    for first in range(0, int(n_rows), chunksize):
+        size = min(chunksize, int(n_rows) - first)
+        timestamps = pd.date_range(start + first * offset, periods=size, freq=freq)
+        columns = {'TIMESTAMP': timestamps, 'RECORD': np.arange(first, first + size)}
+
+        base, walk = diurnal_irradiance(timestamps, rng=rng, walk=walk)
+        for pair in truth.itertuples():
+            x = base * pair.gain + 200 + rng.normal(0, 1.0, size)
+            y = pair.slope * x + pair.intercept + rng.normal(0, 1.0, size)
+
+            corrupted = rng.random(size) < outliers
+            y[corrupted] *= rng.uniform(0.3, 2.0, corrupted.sum())
+            x[rng.random(size) < missing] = np.nan
+
+            columns[pair.Up] = x
+            columns[pair.Down] = y
+        yield pd.DataFrame(columns)
+
+
+def calibration_dataset(
+        n_rows: int,
+        n_pairs: int = 1,
+        outliers: float = 0.02,
+        missing: float = 0.001,
+        freq: str = '1min',
+        start: str = '2023-04-01',
+        seed: int = 0,
+        max_bytes: int = MAX_IN_MEMORY_BYTES) -> tuple:
+    """
+    Synthetic calibration dataset and its channels configuration, in memory.
+
+    Raises:
+    -------
+        MemoryError: if the dataset would take more than `max_bytes`, use
+            `calibration_chunks()` for those sizes.
+
+    Returns:
+    --------
+        (cal_df, channels_df, truth) where `truth` holds the slope and
+        intercept used to generate each pair.
+    """
+    if dataset_bytes(n_rows, n_pairs) > max_bytes:
+        raise MemoryError(
+            f'{n_rows:.0e} rows x {n_pairs} pairs take {dataset_bytes(n_rows, n_pairs) / 2**30:.1f} GiB, '
+            f'above the {max_bytes / 2**30:.1f} GiB limit: generate them with calibration_chunks()')
+
+    chunks = list(calibration_chunks(
+        n_rows, n_pairs, outliers=outliers, missing=missing, freq=freq, start=start, seed=seed))
+    cal_df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+    del chunks
+
+    truth = calibration_truth(n_pairs, seed)
+    channels_df = truth[['Up', 'Down']].copy()
+    channels_df['center_wavelength_nm'] = [int(up.split('_')[1]) for up in channels_df['Up']]
+    return cal_df, channels_df, truth[['Up', 'Down', 'slope', 'intercept']]
+
+
+def write_toa5(data, filepath: str):
+    """
+    Write a dataset, or an iterable of chunks (see `calibration_chunks()`),
+    as a Campbell TOA5 file.
+    """
+    chunks = iter([data] if isinstance(data, pd.DataFrame) else data)
+    first = next(chunks)
+    fields = list(first.columns)
+    units = ['TS', 'RN'] + ['mV'] * (len(fields) - 2)
+    aggregations = ['', ''] + ['Avg'] * (len(fields) - 2)
+    with open(filepath, 'w', newline='') as f:
+        f.write('"TOA5","SYNTHETIC","CR1000X","0","CR1000X.Std.05","CPU:synthetic.CR1X","0","Table1"\n')
+        for line in (fields, units, aggregations):
+            f.write(','.join(f'"{v}"' for v in line) + '\n')
+        for chunk in itertools.chain([first], chunks):
+            chunk = chunk[fields].copy()
+            chunk['TIMESTAMP'] = chunk['TIMESTAMP'].dt.strftime('"%Y-%m-%d %H:%M:%S"')
+            # Quotes are written as Campbell does, pandas must not escape them
+            chunk.to_csv(
+                f, header=False, index=False, na_rep='"NAN"', float_format='%.3f', quoting=csv.QUOTE_NONE)
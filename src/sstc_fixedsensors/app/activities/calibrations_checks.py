@@ -1,12 +1,23 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 
 from schemas import SITES
-import requests
-
-import numpy as np
-from scipy.optimize import curve_fit
 
+from sstc_fixedsensors.calibration import calibrate_pairs, pair_result
+from sstc_fixedsensors.robust import METHODS
+from sstc_fixedsensors import qc
+from sstc_fixedsensors.qc import screen
+from sstc_fixedsensors.solar import station_solar_position
+from sstc_fixedsensors.instrumentation import Profiler, timed
+from sstc_fixedsensors.toa5 import is_toa5, read_header, read_toa5
+from sstc_fixedsensors.cache import ResultCache, content_hash, make_key
+from sstc_fixedsensors.decimation import LODTiles, grid_indices
+from sstc_fixedsensors.jobs import JobQueue, QueueFull, UserLimitReached, DONE, FAILED, CANCELLED
+from sstc_fixedsensors.sensors.registry import get_registry
+
+import os
+import time
 import uuid
 from datetime import datetime
 
@@ -27,11 +38,174 @@ from datetime import datetime
     Up_800_1, Dw_800_1  ==> NIR Channel 
 """
 
+CALIBRATION_METHODS = ['iterative', *METHODS]
+# Seconds between reruns while a calibration job is queued or running
+JOB_POLL_SECONDS = 0.5
+
 @st.cache_data
 def convert_df(df):
     # IMPORTANT: Cache the conversion to prevent computation on every rerun
      return df.to_csv().encode("utf-8")
 
+@st.cache_resource
+def get_result_cache() -> ResultCache:
+    # Shared across sessions, parsed files and fits are keyed by content hash
+    return ResultCache(
+        maxsize=int(os.environ.get('SSTC_CACHE_MAXSIZE', 64)),
+        spill_dirpath=os.environ.get('SSTC_CACHE_DIRPATH'))
+
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    # Shared across sessions, identical fits submitted by several sessions run once
+    return JobQueue(
+        max_workers=int(os.environ.get('SSTC_JOB_WORKERS', 2)),
+        max_queued=int(os.environ.get('SSTC_JOB_QUEUE_SIZE', 16)),
+        max_per_user=int(os.environ.get('SSTC_JOBS_PER_USER', 1)),
+        cache=get_result_cache())
+
+@st.cache_resource
+def get_calibration_history():
+    # Shared across sessions, disabled unless SSTC_HISTORY_FILEPATH is set
+    filepath = os.environ.get('SSTC_HISTORY_FILEPATH')
+    if not filepath:
+        return None
+    from sstc_fixedsensors.history import CalibrationHistory
+    return CalibrationHistory(filepath)
+
+def run_job(key:str, label:str, func, *args, **kwargs):
+    """
+    Result of `func(*args, **kwargs)` computed by the job queue.
+
+    While the job is queued or running its progress and a cancel button are
+    shown and the script is rerun until it finishes.
+    """
+    job_queue = get_job_queue()
+    if key in st.session_state.cancelled_jobs:
+        st.info(f'Cancelled: {label}.')
+        if st.button('**restart**', key=f'restart_{key}'):
+            st.session_state.cancelled_jobs.discard(key)
+            st.rerun()
+        st.stop()
+
+    try:
+        job = job_queue.submit(key, st.session_state.session_id, func, *args, label=label, **kwargs)
+    except (QueueFull, UserLimitReached) as e:
+        st.info(f'Waiting for a free worker ({e}).')
+        time.sleep(JOB_POLL_SECONDS)
+        st.rerun()
+
+    if job.status == DONE:
+        # Fits run in the worker threads, their time is recorded once per session
+        if key not in st.session_state.profiled_jobs:
+            st.session_state.profiled_jobs.add(key)
+            current_profiler().record(f'job:{func.__name__}', job.elapsed)
+        return job.result
+    if job.status == FAILED:
+        st.error(f'{label} failed: {job.error}')
+        st.stop()
+    if job.status == CANCELLED:
+        st.session_state.cancelled_jobs.add(key)
+        st.rerun()
+
+    st.progress(job.progress, text=f'{label} ({job.status}) {job.message}')
+    if st.button('**cancel**', key=f'cancel_{key}'):
+        # The job keeps running while other sessions wait for it
+        job_queue.cancel(key, st.session_state.session_id)
+        st.session_state.cancelled_jobs.add(key)
+        st.rerun()
+    time.sleep(JOB_POLL_SECONDS)
+    st.rerun()
+
+def current_profiler() -> Profiler:
+    return st.session_state.profiler
+
+def debug_panel():
+    # Per-stage timings of this session, off unless toggled or SSTC_DEBUG=1
+    profiler = current_profiler()
+    profiler.enabled = st.sidebar.toggle('debug panel', value=profiler.enabled)
+    if not profiler.enabled:
+        if profiler.trace_memory:
+            profiler.stop_memory_tracing()
+        return
+
+    trace_memory = st.sidebar.checkbox('trace memory', value=profiler.trace_memory)
+    if trace_memory != profiler.trace_memory:
+        if trace_memory:
+            profiler.trace_memory = True
+        else:
+            profiler.stop_memory_tracing()
+
+    with st.sidebar.expander('**stage timings**', expanded=True):
+        st.dataframe(profiler.summary()[['count', 'last_s', 'mean_s', 'max_s', 'peak_bytes']])
+        st.download_button('**JSON**', data=profiler.to_json(indent=2), file_name='stage_timings.json')
+        st.download_button(
+            '**Prometheus**',
+            data=profiler.to_prometheus(labels={'session': st.session_state.session_id}),
+            file_name='stage_timings.prom')
+        if st.button('reset timings'):
+            profiler.reset()
+
+@timed('load_calibration_file', current_profiler)
+def load_calibration_file(uploaded_file):
+    if is_toa5(uploaded_file):
+        # Campbell TOA5: header lines are parsed as metadata, data columns as floats
+        toa5_header = read_header(uploaded_file)
+        return read_toa5(uploaded_file, header=toa5_header), toa5_header
+
+    calibration_df = pd.read_csv(
+        uploaded_file, 
+        delimiter=',',
+        decimal='.',
+        header=1,
+        encoding='utf-8',        
+        )
+    return calibration_df, None
+
+@timed('prepare_calibration_df', current_profiler)
+def prepare_calibration_df(calibration_df:pd.DataFrame, delete_rows:list)->pd.DataFrame:
+    cal_df = calibration_df.drop(delete_rows, axis=0)
+    cal_df['TIMESTAMP'] = pd.to_datetime(
+        cal_df['TIMESTAMP'],
+        format='%Y-%m-%d %H:%M:%S'
+        )
+    return cal_df
+
+@timed('build_calibration_plot', current_profiler)
+def build_calibration_plot(result, timestamps:pd.Series, points_per_tile:int=1000)-> dict:
+    # Up/Dw/fit series reduced to the pixel budget: min/max levels of detail
+    # along time and one scatter point per pixel cell for kept and rejected samples
+    x = np.asarray(result.XX, dtype=np.float64)
+    y = np.asarray(result.YY, dtype=np.float64)
+    timestamps = pd.DatetimeIndex(timestamps)
+    # Zooming needs a sorted time axis, unsorted files are tiled by row
+    sorted_time = timestamps.is_monotonic_increasing and not timestamps.hasnans
+    tiles = LODTiles(
+        timestamps.to_numpy() if sorted_time else np.arange(len(timestamps)),
+        np.vstack([x, y, result.slope * x + result.intercept]),
+        points_per_tile=points_per_tile)
+
+    scatter = grid_indices(x, y, groups=result.mask)
+    scatter_df = pd.DataFrame({
+        'Up': x[scatter],
+        'Dw': y[scatter],
+        'sample': np.where(result.mask[scatter], 'kept', 'rejected'),
+        })
+    return {'timestamps': timestamps, 'sorted_time': sorted_time, 'tiles': tiles, 'scatter': scatter_df}
+
+def scatter_chart(scatter_df:pd.DataFrame, result):
+    # altair is only loaded once a calibration is plotted
+    import altair as alt
+
+    points = alt.Chart(scatter_df).mark_circle(size=12, opacity=0.6).encode(
+        x=alt.X('Up', title='Up (mV)', scale=alt.Scale(zero=False)),
+        y=alt.Y('Dw', title='Dw (mV)', scale=alt.Scale(zero=False)),
+        color=alt.Color('sample', scale=alt.Scale(domain=['kept', 'rejected'], range=['#1f77b4', '#b3b3b3'])),
+        )
+    x_range = [scatter_df['Up'].min(), scatter_df['Up'].max()]
+    fit_df = pd.DataFrame({'Up': x_range, 'Dw': [result.slope * v + result.intercept for v in x_range]})
+    line = alt.Chart(fit_df).mark_line(color='red').encode(x='Up', y='Dw')
+    return (points + line).interactive()
+
 def generate_filename(station:str, name:str ):
     # Generate a global unique ID
     unique_id = uuid.uuid4()
@@ -47,59 +221,18 @@ def generate_filename(station:str, name:str ):
     
     return filename
 
-def linear_fit(x, a, b):
-    return a * x + b
-
-def calibration(
-        up_channel: pd.Series, 
-        dw_channel:pd.Series, 
-        standard=1, 
-        Threshold=0.03, 
-        Iter=100, 
-        speed=6):
-    
-    if len(up_channel) != len(dw_channel):
-        print('Must be two equal length arrays')
-        return
-    
-    dw_channel = dw_channel / standard
-    XX, YY = up_channel.copy(), dw_channel.copy()
-
-    popt, _ = curve_fit(linear_fit, up_channel, dw_channel)
-    yfit = linear_fit(up_channel, *popt)
-    ME = np.abs((yfit - dw_channel) / yfit)
-    MaxME = np.max(ME)
-    counter = 0
-    
-    while MaxME > Threshold:
-        Ind = np.where(ME > speed * Threshold)[0]
-        up_channel = np.delete(up_channel, Ind)
-        dw_channel = np.delete(dw_channel, Ind)
-        
-        popt, _ = curve_fit(linear_fit, up_channel, dw_channel)
-        yfit = linear_fit(up_channel, *popt)
-        ME = np.abs(yfit - dw_channel) / np.mean(yfit)
-        MaxME = np.max(ME)
-        speed -= 1
-        if speed < 1:
-            speed = 1
-        counter += 1
-        print('Iteration {}, Wait...'.format(counter))
-        if counter > Iter:
-            print('Reach maximum iteration!')
-            return
-    
-    print('Samples left {}.'.format(len(up_channel)))
-    
-    # Return the necessary data for plotting
-    return XX, YY, up_channel, dw_channel, yfit
-
-
+INSTRUCTIONS_FILEPATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instructions.md')
+INSTRUCTIONS_URL = "https://raw.githubusercontent.com/SITES-spectral/sstc-fixedsensors/main/src/sstc_fixedsensors/app/instructions.md"
 
 def fetch_markdown_instructions_from_github():
-    
-    url = "https://raw.githubusercontent.com/SITES-spectral/sstc-fixedsensors/main/src/sstc_fixedsensors/app/instructions.md"
-    response = requests.get(url)
+    # Only used when the bundled copy is missing, `requests` is imported on demand
+    import requests
+
+    try:
+        response = requests.get(INSTRUCTIONS_URL, timeout=5)
+    except requests.RequestException:
+        return None
     if response.status_code == 200:
         return response.text
     else:
@@ -107,9 +240,16 @@ def fetch_markdown_instructions_from_github():
 
 
 @st.cache_data()
+def read_instructions()-> str:
+    if os.path.isfile(INSTRUCTIONS_FILEPATH):
+        with open(INSTRUCTIONS_FILEPATH, encoding='utf-8') as f:
+            return f.read()
+    return fetch_markdown_instructions_from_github()
+
 def load_instructions():
-    instructions_md = fetch_markdown_instructions_from_github()
-    st.markdown(instructions_md)
+    instructions_md = read_instructions()
+    if instructions_md:
+        st.markdown(instructions_md)
     
 
 def initialize()-> dict:
@@ -129,6 +269,10 @@ def initialize()-> dict:
         st.session_state.all_channels = None
     if 'delete_rows' not in st.session_state:
         st.session_state.delete_rows = []
+    if 'toa5_header' not in st.session_state:
+        st.session_state.toa5_header = None
+    if 'file_hash' not in st.session_state:
+        st.session_state.file_hash = None
         
     if 'is_step01_done' not in st.session_state:
         st.session_state['is_step01_done'] = False
@@ -140,6 +284,18 @@ def initialize()-> dict:
         st.session_state['is_step04_done'] = False
     if 'is_sensor_calibration_done' not in st.session_state:
         st.session_state['is_sensor_calibration_done'] = False
+    if 'session_id' not in st.session_state:
+        st.session_state['session_id'] = str(uuid.uuid4())
+    if 'cancelled_jobs' not in st.session_state:
+        st.session_state['cancelled_jobs'] = set()
+    if 'profiler' not in st.session_state:
+        st.session_state['profiler'] = Profiler(enabled=os.environ.get('SSTC_DEBUG') == '1')
+    if 'profiled_jobs' not in st.session_state:
+        st.session_state['profiled_jobs'] = set()
+    if 'qc_flags' not in st.session_state:
+        st.session_state['qc_flags'] = None
+    if 'qc_key' not in st.session_state:
+        st.session_state['qc_key'] = None
     if 'calibration_df' not in st.session_state:
         st.session_state['calibration_df'] = None
     if 'cal_df' not in st.session_state:
@@ -173,13 +329,17 @@ def step01():
             type=["dat", "csv", "txt", "tsv"])
         
         if uploaded_file is not None:
-            calibration_df = pd.read_csv(
-                uploaded_file, 
-                delimiter=',',
-                decimal='.',
-                header=1,
-                encoding='utf-8',        
-                )
+            file_hash = content_hash(uploaded_file.getvalue())
+            calibration_df, toa5_header = get_result_cache().get_or_compute(
+                make_key('load_calibration_file', file_hash),
+                load_calibration_file,
+                uploaded_file)
+            st.session_state.file_hash = file_hash
+            st.session_state.toa5_header = toa5_header
+
+            if toa5_header is not None:
+                st.dataframe(pd.DataFrame([toa5_header.to_dict()]), hide_index=True)
+                st.dataframe(toa5_header.fields_df().set_index('field').T)
         else:
             calibration_df = None
 
@@ -216,25 +376,38 @@ def step02():
     step02_col1, step02_col2 = st.columns([1,5], gap='small')
 
     with step02_col1:
-        delete_rows = st.multiselect(
-            label='**delete** row number:',
-            options=[0,1],
-            )
+        if st.session_state.toa5_header is None:
+            delete_rows = st.multiselect(
+                label='**delete** row number:',
+                options=[0,1],
+                )
+        else:
+            # Units and aggregation rows are already parsed as TOA5 header metadata
+            delete_rows = []
+            st.caption('TOA5 header parsed, no rows to delete.')
         st.session_state['delete_rows']= delete_rows
 
+        utc_offset = st.number_input(
+            'logger UTC offset (h):', min_value=-12.0, max_value=14.0, value=0.0, step=1.0,
+            help='Hours the logger clock is ahead of UTC, used for the solar zenith')
+        max_zenith = st.number_input(
+            'max solar zenith (°):', min_value=0.0, max_value=180.0, value=80.0, step=5.0,
+            help='Samples with the sun lower than this are flagged as NIGHT')
+
     with step02_col2:
         st_cal = st.empty()
 
-        cal_df = cal_df.drop(st.session_state['delete_rows'], axis=0)
         if 'TIMESTAMP' in st.session_state.columns:
             try:                        
                 timestamp_col = 'TIMESTAMP'
-                cal_df[timestamp_col] = pd.to_datetime(
-                    cal_df['TIMESTAMP'],
-                    format='%Y-%m-%d %H:%M:%S'
-                    ) 
+                cal_df = get_result_cache().get_or_compute(
+                    make_key('prepare_calibration_df', st.session_state.file_hash, delete_rows),
+                    prepare_calibration_df,
+                    cal_df,
+                    delete_rows)
 
             except:
+                cal_df = cal_df.drop(delete_rows, axis=0)
                 message.error('`TIMESTAMP` cannot be processed. Delete extra rows affecting data values.')
                 st_cal = st.dataframe(cal_df)
                 st.session_state.is_step02_done = False 
@@ -253,6 +426,31 @@ def step02():
                     #st_cal.dataframe(cal_df)
                     st.session_state.cal_df = cal_df
                     st.session_state.is_step02_done = True
+
+                    # Quality flags of every sample, the fits skip the rejected ones
+                    try:
+                        solar_zenith = station_solar_position(
+                            st.session_state.station, cal_df['TIMESTAMP'], utc_offset)['solar_zenith'].to_numpy()
+                    except ValueError:
+                        # Station without coordinates, NIGHT falls back to the Up irradiance
+                        solar_zenith = None
+                    qc_key = make_key(
+                        'screen', st.session_state.file_hash, delete_rows, st.session_state.station, utc_offset, max_zenith)
+                    qc_flags = get_result_cache().get_or_compute(
+                        qc_key,
+                        screen,
+                        cal_df,
+                        solar_zenith=solar_zenith,
+                        max_zenith=max_zenith)
+                    st.session_state.qc_flags = qc_flags
+                    st.session_state.qc_key = qc_key
+                    qc_summary = qc.summary(qc_flags)
+                    flagged = qc_summary.loc[:, (qc_summary > 0).any(axis=0)]
+                    if flagged.empty:
+                        st.caption('Quality control: no flagged samples.')
+                    else:
+                        st.caption('Quality control: flagged samples per channel.')
+                        st.dataframe(flagged.loc[(flagged > 0).any(axis=1)])
         else:
             message.error('`TIMESTAMP` column not found')
             st.session_state.is_step02_done = False
@@ -260,6 +458,7 @@ def step02():
 
 def run():
     initialize()
+    debug_panel()
 
     _, instructions_col1, header_stations_col = st.columns([1,2,2], gap='small')
     station = None
@@ -273,22 +472,16 @@ def run():
             st.session_state.station = station
 
 
-    with st.expander('**Step 01**: Load calibration dataset', expanded=True):
+    profiler = current_profiler()
+    with st.expander('**Step 01**: Load calibration dataset', expanded=True), profiler.stage('step01'):
         step01()    
 
     if st.session_state.is_step01_done:            
-        with st.expander('**STEP 02**: dataprep'):
+        with st.expander('**STEP 02**: dataprep'), profiler.stage('step02'):
             step02()
-
-            # Remove rows where there is no value in a subset of columns (Column1 and Column2)
-            #cal_df_cleaned = cal_df.dropna(subset=st.session_state.all_channels)
-            #number_of_missing_data = len(cal_df) - len(cal_df_cleaned)
-            #if len(number_of_missing_data >0):
-            #    message.warning(f'Detected {number_of_missing_data} `empty` values in channels. Autoremove rows in progress')
-            #    cal_df = cal_df_cleaned
                                                     
     if st.session_state.is_step02_done:
-        with st.expander('**STEP 03**: Revise channels pairs and center wavelengths for each channel'):
+        with st.expander('**STEP 03**: Revise channels pairs and center wavelengths for each channel'), profiler.stage('step03'):
             
             # split the column names and select the first item in the list which is expected to be `Up` or `Dw`.
             up_channels = pd.DataFrame.from_dict({
@@ -305,9 +498,11 @@ def run():
             matched_channels['is_validated'] = False
 
             if matched_channels is not None:
-                sensor_brands = {'Skye': {'center_wavelengths_nm': [469, 530, 531, 532, 552, 570, 640, 644, 645, 650, 704, 740, 810, 856, 858, 860, 1636, 1640]}, 
-                                'Decagon': {'center_wavelengths_nm': [531, 532, 570, 830, 650, 800, 810]}}
-                center_wavelengths_nm = [469, 530, 531, 532, 552, 570, 640, 644, 645, 650, 704, 740, 800, 810, 830, 856, 858, 860, 1636, 1640]
+                # Pair channels and fill wavelengths and brands known from the sensors registry
+                registry = get_registry()
+                matched_channels = registry.auto_match(matched_channels)
+                sensor_brands = registry.brands
+                center_wavelengths_nm = registry.center_wavelengths_nm
                     
                 channels_df =  st.data_editor(
                     key='matched_channels_data_editor',
@@ -315,7 +510,7 @@ def run():
                     num_rows='fixed',
                     column_config={
                         'Down': st.column_config.SelectboxColumn('Down', required=True, options=matched_channels['Down']),
-                        'sensor_model': st.column_config.SelectboxColumn('sensor_model', required=True, options=sensor_brands.keys()),
+                        'sensor_model': st.column_config.SelectboxColumn('sensor_model', required=True, options=sensor_brands),
                         'center_wavelength_nm': st.column_config.SelectboxColumn('center_wavelength_nm', required=True, options=center_wavelengths_nm),                        
                         'mast_height_m': st.column_config.NumberColumn('mast_height_m', min_value = 1.0, max_value=150.0, step=0.5)
                         }
@@ -327,6 +522,7 @@ def run():
                     c1, c2 = st.columns([1,1])
                     with c1:
                         sensor_type = st.text_input('sensor_type', placeholder='SN54105')
+                        st.session_state.sensor_type = sensor_type
                     
 
                     filename = generate_filename(
@@ -346,9 +542,121 @@ def run():
                             st.session_state.is_step03_done = True
                             st.toast('Ready to **Step 04**')
 
-        with st.expander("**STEP 04**: calibration plot"):
-            up_channel = st.session_state.cal_df[ st.session_state.channels_df.loc[0, 'Up']].astype(float)  #.apply(lambda x: float(x))
-            dw_channel = st.session_state.cal_df[ st.session_state.channels_df.loc[0, 'Down']].astype(float)  #.apply(lambda x: float(x))            
+                        # Optional columnar store of the validated channels
+                        store_dirpath = os.environ.get('SSTC_STORE_DIRPATH')
+                        validated = channels_df[channels_df['is_validated'].fillna(False).astype(bool)]
+                        if store_dirpath and st.button(
+                                '**ingest to dataset store**',
+                                disabled=validated.empty,
+                                help='Only the pairs ticked in `is_validated` are ingested'):
+                            # pyarrow is only loaded when a dataset is ingested
+                            from sstc_fixedsensors.store import write_dataset
+                            written = write_dataset(
+                                st.session_state.cal_df,
+                                validated,
+                                station=st.session_state.station,
+                                root_dirpath=store_dirpath,
+                                name=st.session_state.file_hash)
+                            st.toast(f'{len(written)} files written to the dataset store')
+
+                            # Data freshness shown by the map activity
+                            history = get_calibration_history()
+                            if history is not None:
+                                from sstc_fixedsensors.status import StatusStore, channel_sensors
+                                from sstc_fixedsensors.store import station_acronym
+                                timestamps = st.session_state.cal_df['TIMESTAMP']
+                                keys = channel_sensors(validated)
+                                with StatusStore(history.filepath) as status:
+                                    # Same sensor and serial as the calibration history records
+                                    status.update_data(
+                                        station_acronym(st.session_state.station),
+                                        keys['channel'],
+                                        timestamps.min(),
+                                        timestamps.max(),
+                                        len(st.session_state.cal_df),
+                                        sensors=keys['sensor'],
+                                        serial=st.session_state.get('sensor_type') or None)
+                        elif store_dirpath and validated.empty:
+                            st.caption('Tick `is_validated` of the pairs to ingest into the dataset store.')
+
+        with st.expander("**STEP 04**: calibration plot"), profiler.stage('step04'):
+            p0, p1, p2, p3, p4, p5 = st.columns(6)
+            with p0:
+                method = st.selectbox(
+                    'Method', options=CALIBRATION_METHODS,
+                    help='`iterative` rejects outliers with the `speed` schedule, the others are robust fits')
+            with p1:
+                threshold = st.number_input('Threshold', min_value=0.001, max_value=1.0, value=0.03, step=0.005, format='%.3f')
+            with p2:
+                iterations = st.number_input('Iter', min_value=1, max_value=1000, value=100, step=10)
+            with p3:
+                speed = st.number_input('speed', min_value=1, max_value=20, value=6, step=1, disabled=method != 'iterative')
+            with p4:
+                seed = st.number_input('seed', min_value=0, value=0, step=1)
+            with p5:
+                n_bootstrap = st.number_input(
+                    'bootstrap', min_value=0, max_value=100_000, value=0, step=500,
+                    help='resamples giving the 95% confidence intervals of slope and intercept, 0 disables')
+            # NIGHT (sun above `max zenith` in STEP 02, else low Up irradiance) is skipped by default:
+            # the channels are only comparable in good illumination
+            reject_flags = st.multiselect(
+                'Skip samples flagged as:',
+                options=[flag.name for flag in qc.QC],
+                default=[flag.name for flag in qc.QC if flag & qc.DEFAULT_REJECT],
+                help='NIGHT samples have the sun lower than the STEP 02 max solar zenith')
+            reject = 0
+            for name in reject_flags:
+                reject |= qc.QC[name]
+            calibration_params = {
+                'Threshold': threshold, 'Iter': iterations, 'speed': speed, 'method': method, 'seed': seed,
+                'reject': int(reject), 'n_bootstrap': n_bootstrap}
+
+            # Reruns that do not change the dataset, its QC flags, channels or parameters are served from the cache
+            dataset_key = (st.session_state.file_hash, st.session_state.delete_rows, st.session_state.qc_key)
+
+            # Calibrate all the channel pairs at once, the masks of the pairs serve the plots
+            coefficients, masks = run_job(
+                make_key('calibrate_pairs', dataset_key, st.session_state.channels_df, calibration_params, 'masks'),
+                'calibrating channel pairs',
+                calibrate_pairs,
+                st.session_state.cal_df,
+                st.session_state.channels_df,
+                qc=st.session_state.qc_flags,
+                masks=True,
+                **calibration_params)
+            st.dataframe(coefficients)
+            if (~coefficients['converged']).any():
+                st.warning('Some channel pairs did not converge, check the `converged` column.')
+            st.download_button(
+                '**download coefficients**',
+                data=convert_df(coefficients),
+                file_name=generate_filename(
+                    station=st.session_state.station,
+                    name='calibration_coefficients'))
+
+            # Optional calibration history shared by every session
+            history = get_calibration_history()
+            if history is not None and st.button('**save to calibration history**'):
+                timestamps = st.session_state.cal_df['TIMESTAMP']
+                written = history.record(
+                    coefficients,
+                    station=st.session_state.station,
+                    start=timestamps.min(),
+                    end=timestamps.max(),
+                    serial=st.session_state.get('sensor_type') or None,
+                    method=method,
+                    source=st.session_state.file_hash)
+                st.toast(f'{written} channel pairs recorded in the calibration history')
+
+            pair = st.selectbox(
+                'Channel pair to plot:',
+                options=coefficients.index,
+                format_func=lambda i: f"{coefficients.loc[i, 'Up']} / {coefficients.loc[i, 'Down']}")
+            if pair is None:
+                st.stop()
+
+            up_channel = st.session_state.cal_df[coefficients.loc[pair, 'Up']].astype(float)  #.apply(lambda x: float(x))
+            dw_channel = st.session_state.cal_df[coefficients.loc[pair, 'Down']].astype(float)  #.apply(lambda x: float(x))
 
             if len(up_channel) != len(dw_channel):
                 st.error('`up_channel` and `down_channel` must have equal lengths')
@@ -371,28 +679,61 @@ def run():
                 #    yfit = st.session_state.calibration_results.yfit
                     
                 #else:
-                XX, YY, up_channel_calibrated, dw_channel_calibrated, yfit = calibration(up_channel, dw_channel)
+                result = pair_result(st.session_state.cal_df, coefficients, masks, pair, method=method)
+                if not result.converged:
+                    st.warning('Reach maximum iteration! The calibration did not converge, showing the last iteration.')
+
                 st.session_state.calibration_results = {
-                    'XX': XX,
-                    'YY': YY,
-                    'up_channel_calibrated': up_channel_calibrated,
-                    'dw_channel_calibrated': dw_channel_calibrated,
-                    'yfit': yfit
+                    'XX': result.XX,
+                    'YY': result.YY,
+                    'up_channel_calibrated': result.up_channel,
+                    'dw_channel_calibrated': result.dw_channel,
+                    'yfit': result.yfit
                     }
-    
-                        
-                                
-                        
 
-
-                
+                st.write(
+                    f'**slope:** {result.slope:.6f} | **intercept:** {result.intercept:.6f} | '
+                    f'**R²:** {result.r2:.4f} | **samples left:** {result.n_samples} | '
+                    f'**iterations:** {result.iterations} | **method:** {result.method}')
+                if n_bootstrap:
+                    b = coefficients.loc[pair]
+                    st.write(
+                        f'**95% intervals** ({n_bootstrap} resamples) | '
+                        f'**slope:** [{b.slope_ci_low:.6f}, {b.slope_ci_high:.6f}] | '
+                        f'**intercept:** [{b.intercept_ci_low:.6f}, {b.intercept_ci_high:.6f}]')
+
+                # Decimated series are cached with the fit, reruns only slice them
+                plot_data = get_result_cache().get_or_compute(
+                    make_key('calibration_plot', dataset_key, up_channel.name, dw_channel.name, calibration_params),
+                    build_calibration_plot,
+                    result,
+                    st.session_state.cal_df['TIMESTAMP'])
+
+                st.altair_chart(scatter_chart(plot_data['scatter'], result), use_container_width=True)
+
+                timestamps = plot_data['timestamps']
+                if plot_data['sorted_time'] and len(timestamps) > 1 and timestamps[0] < timestamps[-1]:
+                    zoom = st.slider(
+                        'Time window:',
+                        min_value=timestamps[0].to_pydatetime(),
+                        max_value=timestamps[-1].to_pydatetime(),
+                        value=(timestamps[0].to_pydatetime(), timestamps[-1].to_pydatetime()))
+                    indices = plot_data['tiles'].view(np.datetime64(zoom[0]), np.datetime64(zoom[1]))
+                else:
+                    indices = plot_data['tiles'].view()
+
+                # Kept samples are aligned to the full series, rejected ones are left empty
+                plot_df = pd.DataFrame({'XX': result.XX.iloc[indices], 'YY': result.YY.iloc[indices]})
+                plot_df['up_channel_calibrated'] = plot_df['XX'].where(result.mask[indices])
+                plot_df['dw_channel_calibrated'] = plot_df['YY'].where(result.mask[indices])
+                plot_df['yfit'] = result.slope * plot_df['up_channel_calibrated'] + result.intercept
+                plot_df.index = timestamps[indices]
 
                 # Plot using Streamlit
-                st.line_chart(pd.DataFrame({'XX': XX, 'YY': YY, 'up_channel_calibrated': up_channel_calibrated, 
-                                        'dw_channel_calibrated': dw_channel_calibrated, 'yfit': yfit}))
+                st.line_chart(plot_df)
+                st.caption(f'{len(indices)} of {len(result.XX)} samples drawn')
+
 
-                
-        
 if __name__ == 'calibrations_checks':
     run()
 else:
@@ -1,4 +1,134 @@
+"""
+    Aggregation of a logger file to 10 minute, hourly, daily or daily midday
+    windows. TOA5 files are streamed in chunks of `CHUNKSIZE` rows, so multi
+    year 1 minute records are aggregated in bounded memory.
+
+    With the calibration coefficients downloaded from the `CALIBRATION checks`
+    activity, the reflectances and vegetation indices are aggregated too.
+"""
+import io
+
 import streamlit as st
-st.title('Data Processing')
-st.divider()
-st.markdown('(Hands on Googgle COLAB)[https://colab.research.google.com/]')
+import pandas as pd
+
+from schemas import SITES
+
+from sstc_fixedsensors.resample import Resampler, STATS, WINDOWS
+from sstc_fixedsensors.sensors.products import compute_products
+from sstc_fixedsensors.solar import station_location
+from sstc_fixedsensors.toa5 import TIMESTAMP, is_toa5, read_header, read_toa5
+
+CHUNKSIZE = 100_000
+QUANTILES = [0.05, 0.1, 0.25, 0.75, 0.9, 0.95]
+
+
+@st.cache_data
+def convert_df(df):
+    # IMPORTANT: Cache the conversion to prevent computation on every rerun
+     return df.to_csv().encode("utf-8")
+
+def read_chunks(uploaded_file):
+    if is_toa5(uploaded_file):
+        return read_toa5(uploaded_file, header=read_header(uploaded_file), chunksize=CHUNKSIZE)
+
+    uploaded_file.seek(0)
+    df = pd.read_csv(uploaded_file, delimiter=',', decimal='.', header=1, encoding='utf-8')
+    df[TIMESTAMP] = pd.to_datetime(df[TIMESTAMP], errors='coerce')
+    return [df.apply(pd.to_numeric, errors='coerce').assign(**{TIMESTAMP: df[TIMESTAMP]})]
+
+@st.cache_data(show_spinner=False)
+def resample_file(file_bytes:bytes, file_name:str, coefficients:pd.DataFrame, params:dict) -> tuple:
+    # Cached on the file content, the coefficients and the options
+    uploaded_file = io.BytesIO(file_bytes)
+    uploaded_file.name = file_name
+
+    resampler = Resampler(**params)
+    parts = []
+    n_rows = 0
+    for chunk in read_chunks(uploaded_file):
+        if coefficients is not None:
+            products = compute_products(chunk, coefficients)
+            chunk = pd.concat([chunk, products.drop(columns=[TIMESTAMP], errors='ignore')], axis=1)
+        parts.append(resampler.update(chunk))
+        n_rows += len(chunk)
+    parts.append(resampler.flush())
+    return pd.concat([p for p in parts if len(p)] or parts[-1:]), n_rows, resampler.late_rows
+
+def run():
+    st.title('Data Processing')
+    st.divider()
+
+    research_stations = SITES['research_stations']
+    station = st.selectbox('Choose your Station:', options=research_stations.keys())
+
+    uploaded_file = st.file_uploader(label='Choose a data file:', type=['dat', 'csv', 'txt', 'tsv'])
+    coefficients_file = st.file_uploader(
+        label='Calibration coefficients (optional, adds reflectances and indices):', type=['csv'])
+    if uploaded_file is None:
+        st.stop()
+
+    coefficients = None
+    if coefficients_file is not None:
+        coefficients = pd.read_csv(coefficients_file, index_col=0)
+
+    window_col, stats_col = st.columns(2)
+    with window_col:
+        window = st.selectbox('window', options=list(WINDOWS), index=1)
+        min_coverage = st.slider(
+            'minimum coverage', min_value=0.0, max_value=1.0, value=0.5, step=0.05,
+            help='windows of a channel with fewer valid samples than this fraction of a full window get empty statistics')
+        fill_gaps = st.checkbox('fill gaps', value=True, help='list the windows without any record')
+    with stats_col:
+        stats = st.multiselect('statistics', options=STATS, default=['mean', 'median', 'count'])
+        quantiles = st.multiselect('quantiles', options=QUANTILES, default=[])
+
+    params = {
+        'window': window,
+        'stats': tuple(stats),
+        'quantiles': tuple(sorted(quantiles)),
+        'min_coverage': min_coverage,
+        'fill_gaps': fill_gaps,
+        }
+    if window == 'midday':
+        midday_col, offset_col = st.columns(2)
+        with midday_col:
+            midday_hours = st.slider('solar time span', min_value=6, max_value=18, value=(11, 13))
+        with offset_col:
+            utc_offset = st.number_input('logger UTC offset (hours)', value=0.0, step=1.0)
+        try:
+            params['longitude'] = station_location(station)['longitude']
+        except ValueError as e:
+            st.error(e)
+            st.stop()
+        params.update({'midday_hours': tuple(midday_hours), 'utc_offset': utc_offset})
+
+    # Kept across reruns until a file or an option changes
+    request = (uploaded_file.file_id, params, coefficients_file and coefficients_file.file_id)
+    if st.button('**resample**'):
+        st.session_state.resample_request = request
+    if st.session_state.get('resample_request') != request:
+        st.stop()
+
+    with st.spinner('resampling'):
+        resampled_df, n_rows, late_rows = resample_file(
+            uploaded_file.getvalue(), uploaded_file.name, coefficients, params)
+    st.caption(f'{n_rows} rows aggregated into {len(resampled_df)} windows')
+    if late_rows:
+        st.warning(f'{late_rows} rows out of time order were dropped, their window had already been aggregated.')
+
+    st.dataframe(resampled_df)
+    st.download_button(
+        '**download**',
+        data=convert_df(resampled_df),
+        file_name=f'{station}_{window}_{uploaded_file.name.rsplit(".", 1)[0]}.csv')
+
+    plot_columns = [c for c in resampled_df.columns if not c.endswith('_count') and c != 'expected']
+    selected = st.multiselect('plot', options=plot_columns, default=plot_columns[:2])
+    if selected:
+        st.line_chart(resampled_df[selected])
+
+
+if __name__ == 'data_processing':
+    run()
+else:
+    st.error('`data_processing` failed initialization. Report issue to mantainers in github')
@@ -1,5 +1,182 @@
+"""
+    Map of the SITES locations and of the sensor channels of every station
+    with their latest calibration and data freshness.
+
+    The status comes from the summary tables of `status.py`, kept up to date
+    by the calibration history and the ingest steps. They are read again only
+    when a status row changed, and viewport queries go through a grid index
+    of the channels.
+"""
+import os
+
 import streamlit as st
-st.title('Map')
-st.divider()
+import pandas as pd
+import numpy as np
+
+from schemas import SITES
+
+from sstc_fixedsensors.solar import station_location
+from sstc_fixedsensors.spatial import GridIndex
+from sstc_fixedsensors.status import STATES, StatusStore, channel_states
+
+# [R, G, B, A] per channel state, see `status.STATES`
+STATE_COLORS = {
+    'recalibrate': [214, 39, 40, 200],
+    'stale': [255, 127, 14, 200],
+    'no data': [148, 103, 189, 200],
+    'not calibrated': [127, 127, 127, 200],
+    'ok': [44, 160, 44, 200],
+    }
+# Seconds a loaded status is reused, the data freshness ages meanwhile
+STATUS_TTL_SECONDS = 600
+
+
+@st.cache_resource
+def get_status_store():
+    # Shared across sessions, the status tables live in the calibration history database
+    filepath = os.environ.get('SSTC_HISTORY_FILEPATH')
+    if not filepath:
+        return None
+    return StatusStore(filepath)
+
+def locations_df() -> pd.DataFrame:
+    df = pd.DataFrame.from_dict(SITES['locations'], orient='index')
+    df.index.name = 'location'
+    return df.reset_index()
+
+def research_stations_df() -> pd.DataFrame:
+    df = pd.DataFrame.from_dict(SITES['research_stations'], orient='index')
+    df.index = df.index.str.strip()
+    df.index.name = 'research_station'
+    return df.reset_index()
+
+@st.cache_data(ttl=STATUS_TTL_SECONDS, show_spinner=False)
+def load_status(version:tuple, max_data_age_days:float, max_calibration_age_days:float) -> tuple:
+    # `version` changes whenever a status row is written. The grid index is
+    # built from the returned rows, so its positions always match them
+    status = get_status_store().read()
+    coordinates = {}
+    for station in status['station'].unique():
+        try:
+            location = station_location(station)
+            coordinates[station] = (location['acronym'], location['latitude'], location['longitude'])
+        except ValueError:
+            coordinates[station] = (None, np.nan, np.nan)
+    located = pd.DataFrame.from_dict(
+        coordinates, orient='index', columns=['location', 'latitude', 'longitude'])
+    status = status.join(located, on='station')
+    status['state'] = channel_states(
+        status, max_data_age_days=max_data_age_days, max_calibration_age_days=max_calibration_age_days)
+    status['urgency'] = status['state'].map({s: i for i, s in enumerate(STATES)})
+    status = status.sort_values(['urgency', 'station', 'up', 'sensor']).reset_index(drop=True)
+    return status, GridIndex(status['latitude'], status['longitude'])
+
+def station_markers(channels:pd.DataFrame) -> pd.DataFrame:
+    # One marker per location, coloured by its most urgent channel state
+    if channels.empty:
+        return pd.DataFrame(columns=[
+            'location', 'station', 'latitude', 'longitude', 'n_channels', 'state', 'color', 'summary', 'radius'])
+    counts = pd.crosstab(channels['location'], channels['state']).reindex(columns=list(STATES), fill_value=0)
+    markers = channels.groupby('location').agg(
+        station=('station', 'first'),
+        latitude=('latitude', 'first'),
+        longitude=('longitude', 'first'),
+        n_channels=('up', 'size'),
+        urgency=('urgency', 'min'))
+    markers['state'] = [STATES[i] for i in markers['urgency']]
+    markers['color'] = markers['state'].map(STATE_COLORS)
+    markers['summary'] = [
+        ', '.join(f'{n} {state}' for state, n in row.items() if n) for _, row in counts.loc[markers.index].iterrows()]
+    markers['radius'] = 3000 + 800 * np.sqrt(markers['n_channels'])
+    return markers.reset_index()
+
+def show_map(locations:pd.DataFrame, markers:pd.DataFrame, bounds:tuple):
+    # pydeck is only loaded when the map is drawn
+    import pydeck as pdk
+
+    south, west, north, east = bounds
+    layers = [
+        pdk.Layer(
+            'ScatterplotLayer',
+            data=locations.assign(summary='', n_channels=0, state='location'),
+            get_position='[longitude, latitude]',
+            get_fill_color=[31, 119, 180, 160],
+            get_radius=2500,
+            pickable=True),
+        pdk.Layer(
+            'ScatterplotLayer',
+            data=markers,
+            get_position='[longitude, latitude]',
+            get_fill_color='color',
+            get_radius='radius',
+            pickable=True),
+        ]
+    view_state = pdk.ViewState(
+        latitude=(south + north) / 2,
+        longitude=(west + east) / 2,
+        zoom=max(2.0, min(10.0, 8.5 - np.log2(max(north - south, (east - west) / 2, 0.01)))))
+    st.pydeck_chart(pdk.Deck(
+        layers=layers,
+        initial_view_state=view_state,
+        map_style=None,
+        tooltip={'text': '{location} {description}\n{n_channels} channels: {summary}'}))
+
+def run():
+    st.title('Map')
+    st.divider()
+
+    locations = locations_df()
+    research_stations = research_stations_df()
+    store = get_status_store()
+    if store is None:
+        st.info('Set `SSTC_HISTORY_FILEPATH` to the calibration history database to show the sensor channels status.')
+
+    c0, c1, c2 = st.columns(3)
+    with c0:
+        stations = st.multiselect(
+            'Stations:', options=list(research_stations['acronym']),
+            format_func=lambda a: research_stations.set_index('acronym').loc[a, 'research_station'])
+        states = st.multiselect('Channel states:', options=list(STATES))
+    with c1:
+        latitude_range = st.slider('Latitude', min_value=54.0, max_value=70.0, value=(55.0, 69.0), step=0.1)
+        max_data_age_days = st.number_input('stale after (days without data)', min_value=0.1, value=2.0, step=1.0)
+    with c2:
+        longitude_range = st.slider('Longitude', min_value=10.0, max_value=25.0, value=(11.0, 21.5), step=0.1)
+        max_calibration_age_days = st.number_input(
+            'recalibrate after (days)', min_value=1, value=365, step=30)
+    bounds = (latitude_range[0], longitude_range[0], latitude_range[1], longitude_range[1])
+
+    in_view = (
+        locations['latitude'].between(latitude_range[0], latitude_range[1])
+        & locations['longitude'].between(longitude_range[0], longitude_range[1]))
+    if stations:
+        # Locations are filtered by research station, a station may have several (Abisko: ANS, STO)
+        names = research_stations.loc[research_stations['acronym'].isin(stations), 'research_station']
+        in_view &= locations['research_station'].str.strip().isin(names)
+    locations = locations[in_view]
+
+    channels = pd.DataFrame(columns=['location', 'station', 'latitude', 'longitude', 'sensor', 'up', 'state', 'urgency'])
+    if store is not None:
+        version = store.version()
+        status, index = load_status(version, max_data_age_days, max_calibration_age_days)
+        channels = status.iloc[index.query(*bounds)]
+        if stations:
+            channels = channels[channels['station'].isin(stations)]
+        if states:
+            channels = channels[channels['state'].isin(states)]
+
+    show_map(locations, station_markers(channels), bounds)
+
+    counts = channels['state'].value_counts()
+    for col, state in zip(st.columns(len(STATES)), STATES):
+        col.metric(state, int(counts.get(state, 0)))
+
+    st.dataframe(
+        channels.drop(columns=['urgency', 'latitude', 'longitude'], errors='ignore'),
+        hide_index=True)
+
 
-st.info('Now you can place your map here :) ')
+if __name__ == 'map':
+    run()
+else:
+    st.error('`map` failed initialization. Report issue to mantainers in github')
@@ -25,17 +25,17 @@ SITES = {
         'DEC': {'description': 'Decidious forest'}
     },
     'locations': {
-        'ANS': {'research_station': 'Abisko', 'description': 'Abisko'},
-        'STO': {'research_station': 'Abisko', 'description': 'Stordalen'},
-        'ASA': {'research_station': 'Asa', 'description': 'Asa'},
-        'BOL': {'research_station': 'Bolmen', 'description': 'Bolmen'},
-        'ERK': {'research_station': 'Erken', 'description': 'Erken'},
-        'GRI': {'research_station': 'Grimsö', 'description': 'Grimsö'},
-        'LON': {'research_station': 'Lönnstorp', 'description': 'Lönnstorp'},
-        'RBD': {'research_station': 'Röbacksalen', 'description': 'Röbacksdalen'},
-        'SKC': {'research_station': 'Skogaryd', 'description': 'Skogaryd'},
-        'SVB': {'research_station': 'Svartberget', 'description': 'Svartberget'},
-        'TRS': {'research_station': 'Tarfala', 'description': 'Tarfala'},
-        'LU' : {'research_station': 'SITES Spectral', 'description': 'SITES Spectral Thematic Center at Lund'},
+        'ANS': {'research_station': 'Abisko', 'description': 'Abisko', 'latitude': 68.354, 'longitude': 18.816},
+        'STO': {'research_station': 'Abisko', 'description': 'Stordalen', 'latitude': 68.356, 'longitude': 19.045},
+        'ASA': {'research_station': 'Asa', 'description': 'Asa', 'latitude': 57.164, 'longitude': 14.783},
+        'BOL': {'research_station': 'Bolmen', 'description': 'Bolmen', 'latitude': 56.997, 'longitude': 13.783},
+        'ERK': {'research_station': 'Erken', 'description': 'Erken', 'latitude': 59.884, 'longitude': 18.655},
+        'GRI': {'research_station': 'Grimsö', 'description': 'Grimsö', 'latitude': 59.728, 'longitude': 15.472},
+        'LON': {'research_station': 'Lönnstorp', 'description': 'Lönnstorp', 'latitude': 55.669, 'longitude': 13.108},
+        'RBD': {'research_station': 'Röbacksalen', 'description': 'Röbacksdalen', 'latitude': 63.806, 'longitude': 20.240},
+        'SKC': {'research_station': 'Skogaryd', 'description': 'Skogaryd', 'latitude': 58.363, 'longitude': 12.150},
+        'SVB': {'research_station': 'Svartberget', 'description': 'Svartberget', 'latitude': 64.256, 'longitude': 19.774},
+        'TRS': {'research_station': 'Tarfala', 'description': 'Tarfala', 'latitude': 67.912, 'longitude': 18.610},
+        'LU' : {'research_station': 'SITES Spectral', 'description': 'SITES Spectral Thematic Center at Lund', 'latitude': 55.712, 'longitude': 13.209},
     }
 }
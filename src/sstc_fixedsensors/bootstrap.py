@@ -0,0 +1,184 @@
+"""
+    Bootstrap confidence intervals of the calibration coefficients.
+
+    The retained samples of a fit are resampled with replacement. Replicates
+    are drawn in blocks: one `(block, n)` index matrix per block is reduced to
+    the number of times each sample is drawn in each replicate, the sums
+    `n, Sx, Sy, Sxx, Sxy, Syy` of the block are one product of these counts
+    with the sample features, and the least squares line of every replicate
+    is solved in closed form from them (see `calibration.solve_linear_sums`).
+
+    The uniform draws are about half of the cost: 1000 replicates of 100k
+    samples take about 1 s in one process, 10k replicates of 10k samples
+    under 1 s. Larger runs are spread across `processes`.
+
+    The outlier rejection is not repeated per replicate: the intervals are
+    those of the final least squares fit, conditional on its retained samples.
+
+    Every batch draws from its own child of `SeedSequence(seed)` and the batch
+    size does not depend on the number of processes, so the replicates are
+    the same whether they run in one process or spread across a pool.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from sstc_fixedsensors.calibration import solve_linear_sums
+
+
+# Indices drawn per batch, the unit of work and of seeding spread across processes
+BATCH_INDICES = 1 << 22
+
+# Indices drawn at once within a batch, their counts stay in the CPU cache
+BLOCK_INDICES = 1 << 18
+
+
+@dataclass
+class BootstrapResult:
+    """
+    Outcome of `bootstrap_fit()`.
+
+    `slope` and `intercept` are the fit of the full sample, `slopes` and
+    `intercepts` those of every replicate. The intervals are the percentile
+    intervals of the replicates at the `confidence` level.
+    """
+    slope: float
+    intercept: float
+    slope_se: float
+    intercept_se: float
+    slope_ci: tuple
+    intercept_ci: tuple
+    confidence: float
+    n_resamples: int
+    slopes: np.ndarray
+    intercepts: np.ndarray
+
+
+def _batch_sums(x: np.ndarray, y: np.ndarray, size: int, seed_sequence) -> np.ndarray:
+    # Sums of `size` replicates, shape (size, 6). A block of replicates is one
+    # (block, n) index draw, offset by `row * n` so that a single bincount gives
+    # the (block, n) draw counts, and their sums one matrix product
+    n = len(x)
+    rng = np.random.default_rng(seed_sequence)
+    features = np.column_stack([x, y, x * x, x * y, y * y])
+    block = max(1, min(size, BLOCK_INDICES // n))
+    offsets = np.arange(block, dtype=np.int64)[:, None] * n
+    sums = np.empty((size, 6))
+    sums[:, 0] = n
+    for start in range(0, size, block):
+        rows = min(block, size - start)
+        index = rng.integers(0, n, size=(rows, n), dtype=np.int64)
+        index += offsets[:rows]
+        counts = np.bincount(index.ravel(), minlength=rows * n).reshape(rows, n)
+        sums[start:start + rows, 1:] = counts @ features
+    return sums
+
+
+def _bootstrap_batches(x, y, sizes, seed_sequences, progress=None) -> np.ndarray:
+    # Process pool worker
+    sums = []
+    for i, (size, seed_sequence) in enumerate(zip(sizes, seed_sequences)):
+        sums.append(_batch_sums(x, y, size, seed_sequence))
+        if progress is not None:
+            progress((i + 1) / len(sizes), f'bootstrap: {sum(sizes[:i + 1])}/{sum(sizes)} resamples')
+    return np.concatenate(sums) if sums else np.empty((0, 6))
+
+
+def bootstrap_fit(
+        x: np.ndarray,
+        y: np.ndarray,
+        n_resamples: int = 1000,
+        confidence: float = 0.95,
+        seed=0,
+        batch_size: int = None,
+        processes: int = None,
+        progress=None) -> BootstrapResult:
+    """
+    Bootstrap the least squares line `y = slope * x + intercept`.
+
+    Parameters:
+    -----------
+        x, y: samples of the fit, non finite pairs are dropped.
+        n_resamples: number of bootstrap replicates.
+        confidence: level of the percentile intervals.
+        seed: seed of the `SeedSequence` the batches are spawned from.
+        batch_size: replicates per batch, `BATCH_INDICES // len(x)` if None.
+        processes: if set, the batches are split across a pool of this many
+            worker processes, the replicates do not change.
+        progress: optional `progress(fraction, message)` callback, called per
+            batch, or per worker with `processes`.
+
+    Returns:
+    --------
+        `BootstrapResult`, with NaN coefficients and intervals when fewer
+        than 2 samples are finite.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    finite = np.isfinite(x) & np.isfinite(y)
+    x, y = x[finite], y[finite]
+    n = len(x)
+    nan_pair = (np.nan, np.nan)
+    if n < 2:
+        return BootstrapResult(
+            np.nan, np.nan, np.nan, np.nan, nan_pair, nan_pair, confidence, 0, np.empty(0), np.empty(0))
+
+    # Centered data keeps the sums well conditioned, the offsets are added back by the solver
+    x0, y0 = x.mean(), y.mean()
+    x, y = x - x0, y - y0
+
+    if batch_size is None:
+        batch_size = max(1, BATCH_INDICES // n)
+    n_batches = -(-n_resamples // batch_size)
+    sizes = [batch_size] * (n_batches - 1) + [n_resamples - batch_size * (n_batches - 1)] if n_batches else []
+    seed_sequences = np.random.SeedSequence(seed).spawn(n_batches)
+
+    if processes is None or processes <= 1 or n_batches < 2:
+        sums = _bootstrap_batches(x, y, sizes, seed_sequences, progress=progress)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        chunks = np.array_split(np.arange(n_batches), min(processes, n_batches))
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [
+                executor.submit(
+                    _bootstrap_batches, x, y, [sizes[i] for i in c], [seed_sequences[i] for i in c])
+                for c in chunks]
+            parts = []
+            try:
+                for future in futures:
+                    parts.append(future.result())
+                    if progress is not None:
+                        progress(len(parts) / len(futures), f'bootstrap: {len(parts)}/{len(futures)} workers')
+            except BaseException:
+                # Aborted from `progress`, workers not started yet are dropped
+                for future in futures:
+                    future.cancel()
+                raise
+        sums = np.concatenate(parts)
+
+    slope, intercept, _ = solve_linear_sums(
+        np.array([n, 0.0, 0.0, x @ x, x @ y, y @ y]), x0=x0, y0=y0)
+    slopes, intercepts, _ = solve_linear_sums(sums, x0=x0, y0=y0)
+
+    alpha = (1 - confidence) / 2
+    if n_resamples:
+        slope_ci = tuple(np.nanquantile(slopes, [alpha, 1 - alpha]))
+        intercept_ci = tuple(np.nanquantile(intercepts, [alpha, 1 - alpha]))
+        slope_se, intercept_se = float(np.nanstd(slopes, ddof=1)), float(np.nanstd(intercepts, ddof=1))
+    else:
+        slope_ci = intercept_ci = nan_pair
+        slope_se = intercept_se = np.nan
+
+    return BootstrapResult(
+        slope=float(slope),
+        intercept=float(intercept),
+        slope_se=slope_se,
+        intercept_se=intercept_se,
+        slope_ci=slope_ci,
+        intercept_ci=intercept_ci,
+        confidence=confidence,
+        n_resamples=n_resamples,
+        slopes=slopes,
+        intercepts=intercepts,
+        )
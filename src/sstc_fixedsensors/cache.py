@@ -0,0 +1,142 @@
+"""
+    In-memory LRU cache for parsed datasets and calibration results.
+
+    Entries are keyed by the content hash of the uploaded file plus the
+    processing parameters, so a Streamlit rerun that does not change any input
+    is served from the cache. Least recently used entries are evicted when the
+    cache is full, optionally spilling them to disk instead of dropping them.
+"""
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _update(h, part):
+    if isinstance(part, (pd.DataFrame, pd.Series)):
+        h.update(repr(list(part.columns) if isinstance(part, pd.DataFrame) else part.name).encode())
+        h.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+    elif isinstance(part, np.ndarray):
+        h.update(repr((part.dtype.str, part.shape)).encode())
+        h.update(np.ascontiguousarray(part).tobytes())
+    elif isinstance(part, bytes):
+        h.update(part)
+    elif isinstance(part, (list, tuple)):
+        h.update(b'(')
+        for p in part:
+            _update(h, p)
+        h.update(b')')
+    elif isinstance(part, dict):
+        _update(h, sorted(part.items(), key=lambda kv: repr(kv[0])))
+    else:
+        h.update(repr(part).encode())
+    h.update(b'|')
+
+
+def make_key(*parts) -> str:
+    """
+    Stable key from hashable parts: strings, numbers, bytes, containers,
+    numpy arrays and pandas objects (hashed by content).
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        _update(h, part)
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    Thread safe LRU cache.
+
+    Parameters:
+    -----------
+        maxsize: maximum number of entries kept in memory.
+        spill_dirpath: if set, evicted entries are pickled to this directory
+            and loaded back on the next lookup instead of being recomputed.
+    """
+    def __init__(self, maxsize: int = 32, spill_dirpath: str = None):
+        self.maxsize = maxsize
+        self.spill_dirpath = spill_dirpath
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        if spill_dirpath is not None:
+            os.makedirs(spill_dirpath, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            if key in self._entries:
+                return True
+            filepath = self._spill_filepath(key)
+            return filepath is not None and os.path.exists(filepath)
+
+    def _spill_filepath(self, key: str) -> str:
+        if self.spill_dirpath is None:
+            return None
+        return os.path.join(self.spill_dirpath, f'{key}.pkl')
+
+    def _evict(self):
+        while len(self._entries) > self.maxsize:
+            key, value = self._entries.popitem(last=False)
+            filepath = self._spill_filepath(key)
+            if filepath is not None:
+                with open(filepath, 'wb') as f:
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+            filepath = self._spill_filepath(key)
+            if filepath is not None and os.path.exists(filepath):
+                with open(filepath, 'rb') as f:
+                    value = pickle.load(f)
+                os.remove(filepath)
+                self.hits += 1
+                self._entries[key] = value
+                self._evict()
+                return value
+
+            self.misses += 1
+            return default
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def get_or_compute(self, key: str, func, *args, **kwargs):
+        """
+        Returns the cached value of `key`, computing `func(*args, **kwargs)`
+        and storing it on a miss.
+        """
+        _missing = object()
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = func(*args, **kwargs)
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self.spill_dirpath is not None:
+                for filename in os.listdir(self.spill_dirpath):
+                    if filename.endswith('.pkl'):
+                        os.remove(os.path.join(self.spill_dirpath, filename))
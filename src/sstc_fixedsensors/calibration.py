@@ -0,0 +1,480 @@
+"""
+    Cross-calibration of Up/Dw channel pairs.
+
+    The sensors pair is fitted with a straight line `Dw = slope * Up + intercept`
+    and the samples deviating from the line are iteratively rejected.
+    Robust engines with a bounded cost (Huber, Theil–Sen, RANSAC) are
+    available through the `method` argument, see `sstc_fixedsensors.robust`.
+
+    The least squares solution is computed in closed form from the running sums
+    `n, Sx, Sy, Sxx, Sxy, Syy` of the retained samples. Rejected samples are
+    tracked with a boolean mask and their contribution is subtracted from the
+    sums, so the arrays are never copied nor reallocated between iterations.
+
+    Tolerance:
+    ----------
+    The closed-form solution is the exact ordinary least squares optimum that
+    `scipy.optimize.curve_fit` converges to for a linear model. Both routines
+    agree on slope and intercept within a relative tolerance of `1e-6` and
+    therefore reject the same samples, except for samples lying within that
+    tolerance of the `speed * Threshold` boundary.
+"""
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+from sstc_fixedsensors.qc import DEFAULT_REJECT, pair_flags, usable
+
+if TYPE_CHECKING:
+    from sstc_fixedsensors.bootstrap import BootstrapResult
+
+
+# Order of the sufficient statistics along the last axis.
+SUMS = ('n', 'sx', 'sy', 'sxx', 'sxy', 'syy')
+
+# Columns `calibrate_pairs()` appends when bootstrapping
+BOOTSTRAP_COLUMNS = (
+    'slope_se', 'slope_ci_low', 'slope_ci_high', 'intercept_se', 'intercept_ci_low', 'intercept_ci_high')
+
+
+@dataclass
+class CalibrationResult:
+    """
+    Outcome of `calibration()`.
+
+    `XX` and `YY` are the full input series (Dw already divided by `standard`),
+    `up_channel`, `dw_channel` and `yfit` hold only the samples kept after the
+    outlier rejection. `mask` flags the kept samples over the full series.
+    `converged` is False when the iteration budget ran out, the coefficients
+    are then those of the last iteration. `bootstrap` holds the confidence
+    intervals when asked for.
+    """
+    XX: pd.Series
+    YY: pd.Series
+    up_channel: np.ndarray
+    dw_channel: np.ndarray
+    yfit: np.ndarray
+    mask: np.ndarray
+    slope: float
+    intercept: float
+    r2: float
+    n_samples: int
+    iterations: int
+    converged: bool = True
+    method: str = 'iterative'
+    bootstrap: 'BootstrapResult' = None
+
+
+def linear_fit(x, a, b):
+    return a * x + b
+
+
+def linear_sums(x: np.ndarray, y: np.ndarray, mask: np.ndarray = None) -> np.ndarray:
+    """
+    Sufficient statistics of a linear least squares problem along the last axis.
+
+    Returns an array with the leading shape of `x` and a trailing axis of
+    length 6 ordered as `SUMS`. Samples where `mask` is False are ignored.
+    """
+    if mask is not None:
+        w = mask.astype(np.float64)
+        xw = np.where(mask, x, 0.0)
+        yw = np.where(mask, y, 0.0)
+    else:
+        w = np.ones_like(x, dtype=np.float64)
+        xw, yw = x, y
+
+    return np.stack([
+        w.sum(axis=-1),
+        xw.sum(axis=-1),
+        yw.sum(axis=-1),
+        (xw * xw).sum(axis=-1),
+        (xw * yw).sum(axis=-1),
+        (yw * yw).sum(axis=-1),
+        ], axis=-1)
+
+
+def solve_linear_sums(sums: np.ndarray, x0=0.0, y0=0.0):
+    """
+    Closed-form least squares line from the sums returned by `linear_sums`.
+
+    `x0` and `y0` are the offsets subtracted from the data before summing,
+    they are added back to the intercept. Works over any leading shape.
+
+    Returns:
+    --------
+        slope, intercept, r2
+    """
+    sums = np.asarray(sums, dtype=np.float64)
+    n, sx, sy, sxx, sxy, syy = np.moveaxis(sums, -1, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mx = sx / n
+        my = sy / n
+        cxx = sxx - sx * mx
+        cxy = sxy - sx * my
+        cyy = syy - sy * my
+        slope = cxy / cxx
+        intercept = my - slope * mx + y0 - slope * x0
+        r2 = cxy * cxy / (cxx * cyy)
+
+    return slope, intercept, r2
+
+
+def _calibrate_stack(X: np.ndarray, Y: np.ndarray, Threshold=0.03, Iter=100, speed=6, progress=None):
+    """
+    Iterative outlier rejection over stacked pairs of shape `(pairs, samples)`.
+
+    All pairs iterate in lockstep with the same `speed` schedule, a pair stops
+    being updated once its maximum error is below `Threshold`. `progress` is
+    called as `progress(fraction, message)` after every iteration.
+
+    Returns:
+    --------
+        dict of per-pair arrays: slope, intercept, r2, n_samples, iterations,
+        converged and the kept-samples mask of shape `(pairs, samples)`.
+    """
+    mask = np.isfinite(X) & np.isfinite(Y)
+    n_pairs = X.shape[0]
+
+    # Offsets keep the running sums well conditioned for large mV readings
+    n = mask.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x0 = np.where(mask, X, 0.0).sum(axis=1) / n
+        y0 = np.where(mask, Y, 0.0).sum(axis=1) / n
+    dX = np.where(mask, X - x0[:, None], 0.0)
+    dY = np.where(mask, Y - y0[:, None], 0.0)
+
+    sums = linear_sums(dX, dY)
+    sums[:, 0] = n
+    slope, intercept, r2 = solve_linear_sums(sums, x0, y0)
+
+    # Errors of rejected samples are kept at zero so they are never dropped twice
+    yfit = slope[:, None] * dX + (intercept + slope * x0)[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ME = np.where(mask, np.abs((yfit - dY - y0[:, None]) / yfit), 0.0)
+    del yfit
+    MaxME = ME.max(axis=1)
+
+    iterations = np.zeros(n_pairs, dtype=np.int64)
+    active = MaxME > Threshold
+    converged = ~active
+    counter = 0
+
+    while active.any():
+        idx = np.flatnonzero(active)
+        # Slices avoid copying the stacked arrays while every pair is active
+        rows = slice(None) if len(idx) == n_pairs else idx
+
+        r, c = np.nonzero(ME[rows] > speed * Threshold)
+        r = idx[r]
+        mask[r, c] = False
+        dx, dy = dX[r, c], dY[r, c]
+        for k, weights in enumerate((None, dx, dy, dx * dx, dx * dy, dy * dy)):
+            sums[:, k] -= np.bincount(r, weights=weights, minlength=n_pairs)
+
+        slope[idx], intercept[idx], r2[idx] = solve_linear_sums(sums[idx], x0[idx], y0[idx])
+        # mean(yfit) over the kept samples follows from the sums, in shifted coordinates
+        # the residual is slope * dX + shift - dY
+        shift = intercept[idx] + slope[idx] * x0[idx] - y0[idx]
+        mean_yfit = slope[idx] * (sums[idx, 1] / sums[idx, 0] + x0[idx]) + intercept[idx]
+        E = dX[rows] * slope[idx, None]
+        E += shift[:, None]
+        E -= dY[rows]
+        np.abs(E, out=E)
+        E /= mean_yfit[:, None]
+        E *= mask[rows]
+        ME[rows] = E
+        MaxME[idx] = E.max(axis=1)
+        speed -= 1
+        if speed < 1:
+            speed = 1
+        counter += 1
+        iterations[idx] = counter
+
+        done = MaxME[idx] <= Threshold
+        converged[idx[done]] = True
+        active[idx[done]] = False
+        if progress is not None:
+            progress(counter / (Iter + 1), f'iteration {counter}, {int(active.sum())} pairs left')
+        if counter > Iter:
+            break
+
+    return {
+        'slope': slope,
+        'intercept': intercept,
+        'r2': r2,
+        'n_samples': mask.sum(axis=1),
+        'iterations': iterations,
+        'converged': converged,
+        'mask': mask,
+        }
+
+
+def calibration(
+        up_channel: pd.Series,
+        dw_channel: pd.Series,
+        standard=1,
+        Threshold=0.03,
+        Iter=100,
+        speed=6,
+        method='iterative',
+        seed=0,
+        progress=None,
+        qc=None,
+        reject=DEFAULT_REJECT,
+        n_bootstrap=0,
+        confidence=0.95,
+        processes=None) -> CalibrationResult:
+    """
+    Fit `dw_channel` against `up_channel` rejecting outliers iteratively.
+
+    The first pass rejects samples whose relative error `|yfit - Dw| / yfit`
+    exceeds `speed * Threshold`, the following passes use the error relative
+    to the mean fitted value. `speed` decreases by one per iteration down to 1
+    and the loop stops once the maximum error is below `Threshold`.
+
+    Non finite samples are excluded from the fit.
+
+    `method` selects a robust engine of `sstc_fixedsensors.robust` instead
+    of the iterative rejection: 'huber', 'theil-sen' or 'ransac'. `speed`
+    only applies to 'iterative', `seed` to the randomized engines.
+
+    `progress`, if given, is called as `progress(fraction, message)` while
+    fitting, an exception raised by it aborts the fit (see `jobs.py`).
+
+    `qc` is an optional array of `QC` flags per sample of the pair (see
+    `qc.pair_flags()`), samples carrying any of the `reject` flags are left
+    out of the fit as non finite samples are.
+
+    `n_bootstrap` resamples of the retained samples give the confidence
+    intervals of slope and intercept at the `confidence` level (see
+    `sstc_fixedsensors.bootstrap`), spread across `processes` if set. With a
+    robust `method` they are the intervals of the least squares line of the
+    inliers.
+
+    Returns:
+    --------
+        `CalibrationResult`, check `converged` to know whether the fit met
+        its stopping criterion within `Iter` iterations.
+    """
+    if len(up_channel) != len(dw_channel):
+        raise ValueError('Must be two equal length arrays')
+
+    dw_channel = dw_channel / standard
+    XX, YY = up_channel.copy(), dw_channel.copy()
+
+    x = np.asarray(up_channel, dtype=np.float64)
+    y = np.asarray(dw_channel, dtype=np.float64)
+    if qc is not None:
+        x = np.where(usable(qc, reject), x, np.nan)
+    fit = _calibrate_chunk(
+        x[None, :], y[None, :], Threshold, Iter, speed, method=method, seeds=[seed], masks=True,
+        progress=progress)
+
+    mask = fit['mask'][0]
+    slope = float(fit['slope'][0])
+    intercept = float(fit['intercept'][0])
+
+    bootstrap = None
+    if n_bootstrap:
+        from sstc_fixedsensors.bootstrap import bootstrap_fit
+
+        bootstrap = bootstrap_fit(
+            x[mask], y[mask], n_bootstrap, confidence, seed=seed, processes=processes, progress=progress)
+
+    return CalibrationResult(
+        XX=XX,
+        YY=YY,
+        up_channel=x[mask],
+        dw_channel=y[mask],
+        yfit=slope * x[mask] + intercept,
+        mask=mask,
+        slope=slope,
+        intercept=intercept,
+        r2=float(fit['r2'][0]),
+        n_samples=int(fit['n_samples'][0]),
+        iterations=int(fit['iterations'][0]),
+        converged=bool(fit['converged'][0]),
+        method=method,
+        bootstrap=bootstrap,
+        )
+
+
+def _calibrate_chunk(
+        X, Y, Threshold, Iter, speed, method='iterative', seeds=None, masks=False, progress=None,
+        n_bootstrap=0, confidence=0.95):
+    # Process pool worker, masks are not sent back to the parent unless asked
+    if method == 'iterative':
+        fit = _calibrate_stack(X, Y, Threshold=Threshold, Iter=Iter, speed=speed, progress=progress)
+    else:
+        from sstc_fixedsensors.robust import robust_fit
+
+        fits = []
+        for i, (x, y, seed) in enumerate(zip(X, Y, seeds)):
+            fits.append(robust_fit(x, y, method, Threshold=Threshold, Iter=Iter, seed=seed))
+            if progress is not None:
+                progress((i + 1) / len(X), f'{method}: {i + 1}/{len(X)} pairs')
+        fit = {k: np.array([f[k] for f in fits]) for k in fits[0]}
+    if n_bootstrap:
+        from sstc_fixedsensors.bootstrap import bootstrap_fit
+
+        boots = []
+        for i, (x, y, mask, seed) in enumerate(zip(X, Y, fit['mask'], seeds)):
+            pair_progress = None if progress is None else (
+                lambda fraction, message, i=i: progress((i + fraction) / len(X), f'pair {i + 1}/{len(X)} {message}'))
+            boots.append(bootstrap_fit(x[mask], y[mask], n_bootstrap, confidence, seed=seed, progress=pair_progress))
+        fit['slope_se'] = np.array([b.slope_se for b in boots])
+        fit['slope_ci_low'] = np.array([b.slope_ci[0] for b in boots])
+        fit['slope_ci_high'] = np.array([b.slope_ci[1] for b in boots])
+        fit['intercept_se'] = np.array([b.intercept_se for b in boots])
+        fit['intercept_ci_low'] = np.array([b.intercept_ci[0] for b in boots])
+        fit['intercept_ci_high'] = np.array([b.intercept_ci[1] for b in boots])
+    if not masks:
+        fit.pop('mask')
+    return fit
+
+
+def calibrate_pairs(
+        cal_df: pd.DataFrame,
+        channels_df: pd.DataFrame,
+        standard=1,
+        Threshold=0.03,
+        Iter=100,
+        speed=6,
+        method='iterative',
+        seed=0,
+        processes: int = None,
+        progress=None,
+        qc: pd.DataFrame = None,
+        reject=DEFAULT_REJECT,
+        n_bootstrap: int = 0,
+        confidence: float = 0.95,
+        masks: bool = False):
+    """
+    Calibrate every Up/Down pair listed in `channels_df` in a single pass.
+
+    The pairs are stacked as 2-D arrays and fitted together with the same
+    rejection scheme as `calibration()`, or pair by pair with a robust
+    `method`. Rows of `channels_df` without an `Up` or `Down` channel are
+    skipped.
+
+    Parameters:
+    -----------
+        cal_df: calibration dataset with one column per channel.
+        channels_df: channels configuration from STEP 03, `Up` and `Down` columns.
+        method: 'iterative' or one of `sstc_fixedsensors.robust.METHODS`.
+        seed: seed of the randomized methods. Every pair draws from a
+            generator seeded with it, so each row equals the `calibration()`
+            of that pair whatever the number of `processes`.
+        processes: if set, the pairs are split across a pool of this many
+            worker processes. Worth it only for files with dozens of pairs.
+        progress: optional `progress(fraction, message)` callback, called per
+            iteration, or per chunk of pairs with `processes`.
+        qc: optional `QC` flags of `cal_df` as returned by `qc.screen()`,
+            samples where the Up or Dw channel carries any of the `reject`
+            flags are left out of the fit.
+        n_bootstrap: if set, resamples of the retained samples of every pair
+            give the `BOOTSTRAP_COLUMNS` at the `confidence` level, see
+            `calibration()`. Each pair is seeded with `seed`.
+        masks: if True, the kept-samples masks of the pairs are returned too,
+            see `pair_result()`.
+
+    Returns:
+    --------
+        `channels_df` rows with the columns slope, intercept, r2, n_samples,
+        iterations and converged appended, one row per pair, followed by the
+        `BOOTSTRAP_COLUMNS` with `n_bootstrap`. With `masks`, a tuple of
+        these coefficients and a boolean array `(pairs, samples)`.
+    """
+    pairs = channels_df.dropna(subset=['Up', 'Down'])
+    pairs = pairs[(pairs['Up'] != '') & (pairs['Down'] != '')]
+    coefficients = pairs.reset_index(drop=True)
+    columns = ['slope', 'intercept', 'r2', 'n_samples', 'iterations', 'converged']
+    if n_bootstrap:
+        columns += list(BOOTSTRAP_COLUMNS)
+    if pairs.empty:
+        coefficients = coefficients.assign(**{c: [] for c in columns})
+        return (coefficients, np.zeros((0, len(cal_df)), dtype=bool)) if masks else coefficients
+
+    # Always a copy, rejected samples are blanked in place and a single column may be a read-only view
+    X = np.array(cal_df[list(pairs['Up'])].to_numpy(dtype=np.float64).T, order='C')
+    Y = np.ascontiguousarray(cal_df[list(pairs['Down'])].to_numpy(dtype=np.float64).T) / standard
+    if qc is not None:
+        for i, (up, dw) in enumerate(zip(pairs['Up'], pairs['Down'])):
+            X[i, ~usable(pair_flags(qc, up, dw), reject)] = np.nan
+
+    seeds = [seed] * len(pairs)
+
+    if processes is None or processes <= 1 or len(pairs) < 2:
+        fit = _calibrate_chunk(
+            X, Y, Threshold, Iter, speed, method, seeds, masks=masks, progress=progress,
+            n_bootstrap=n_bootstrap, confidence=confidence)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        chunks = np.array_split(np.arange(len(pairs)), min(processes, len(pairs)))
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [
+                executor.submit(
+                    _calibrate_chunk, X[c], Y[c], Threshold, Iter, speed, method, [seeds[i] for i in c],
+                    masks=masks, n_bootstrap=n_bootstrap, confidence=confidence)
+                for c in chunks]
+            fits = []
+            try:
+                for future in futures:
+                    fits.append(future.result())
+                    if progress is not None:
+                        progress(len(fits) / len(futures), f'{len(fits)}/{len(futures)} chunks of pairs')
+            except BaseException:
+                # Aborted from `progress`, chunks not started yet are dropped
+                for future in futures:
+                    future.cancel()
+                raise
+        fit = {c: np.concatenate([f[c] for f in fits]) for c in columns + (['mask'] if masks else [])}
+
+    for c in columns:
+        coefficients[c] = fit[c]
+
+    if masks:
+        return coefficients, fit['mask']
+    return coefficients
+
+
+def pair_result(
+        cal_df: pd.DataFrame,
+        coefficients: pd.DataFrame,
+        masks: np.ndarray,
+        pair: int,
+        standard=1,
+        method='iterative') -> CalibrationResult:
+    """
+    `CalibrationResult` of one pair of `calibrate_pairs(..., masks=True)`.
+
+    Spares a second `calibration()` of the pair when its samples are needed,
+    e.g. to plot it. `pair` is an index label of `coefficients`, `standard`
+    and `method` those of the fit. `bootstrap` is left empty, the intervals
+    are the `BOOTSTRAP_COLUMNS` of the row.
+    """
+    row = coefficients.loc[pair]
+    mask = masks[coefficients.index.get_loc(pair)]
+    XX = cal_df[row['Up']].astype(float)
+    YY = cal_df[row['Down']].astype(float) / standard
+    x, y = XX.to_numpy()[mask], YY.to_numpy()[mask]
+    slope, intercept = float(row['slope']), float(row['intercept'])
+    return CalibrationResult(
+        XX=XX,
+        YY=YY,
+        up_channel=x,
+        dw_channel=y,
+        yfit=slope * x + intercept,
+        mask=mask,
+        slope=slope,
+        intercept=intercept,
+        r2=float(row['r2']),
+        n_samples=int(row['n_samples']),
+        iterations=int(row['iterations']),
+        converged=bool(row['converged']),
+        method=method,
+        )
@@ -0,0 +1,317 @@
+"""
+    `sstc-calibrate`: headless calibration of Campbell logger archives.
+
+    Usage example:
+    --------------
+        sstc-calibrate /data/ANS/2023 "/data/ASA/**/*.dat" \
+            --channels channels_configuration.dat --output results/ --workers 8
+
+    Every input file is calibrated with the channel pairs of the channels
+    configuration (the file downloaded in STEP 03 of the calibration activity)
+    and a `<file>_calibration.csv` with one row of coefficients per pair is
+    written to the output directory. Its first column is the pair index, as
+    in the coefficients downloaded in STEP 04, so the file can be given to
+    the data processing activity.
+
+    Files of the same name in different directories (`2023/Table1.dat`,
+    `2024/Table1.dat`) are told apart by their path relative to their
+    common directory: `2023_Table1_calibration.csv`, `2024_Table1_calibration.csv`.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from sstc_fixedsensors.calibration import calibrate_pairs
+from sstc_fixedsensors.dataset import file_hash
+from sstc_fixedsensors.history import CalibrationHistory
+from sstc_fixedsensors.qc import screen
+from sstc_fixedsensors.robust import METHODS
+from sstc_fixedsensors.status import StatusStore, channel_sensors
+from sstc_fixedsensors.store import write_dataset
+from sstc_fixedsensors.toa5 import TIMESTAMP, read_toa5
+from sstc_fixedsensors.app.schemas import SITES
+
+
+def station_acronyms() -> list:
+    return [s['acronym'] for s in SITES['research_stations'].values()]
+
+
+def expand_inputs(inputs: list) -> list:
+    """
+    Expand directories (recursively, `.dat` files) and glob patterns into a
+    sorted list of unique file paths.
+    """
+    files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            files.update(glob.glob(os.path.join(item, '**', '*.dat'), recursive=True))
+        else:
+            files.update(p for p in glob.glob(item, recursive=True) if os.path.isfile(p))
+    return sorted(files)
+
+
+def output_stems(filepaths: list) -> list:
+    """
+    Output file stem of every input file: its name without extension, or,
+    for files of the same name in different directories, its path relative
+    to their common directory with the separators replaced by `_`.
+
+    Raises:
+    -------
+        ValueError: if two files still map to the same stem.
+    """
+    stems = [os.path.splitext(os.path.basename(f))[0] for f in filepaths]
+    duplicated = {s for s in stems if stems.count(s) > 1}
+    if duplicated:
+        root = os.path.commonpath([os.path.dirname(os.path.abspath(f)) for f in filepaths])
+        stems = [
+            os.path.splitext(os.path.relpath(os.path.abspath(f), root))[0].replace(os.sep, '_')
+            if s in duplicated else s
+            for f, s in zip(filepaths, stems)]
+    clashes = sorted({s for s in stems if stems.count(s) > 1})
+    if clashes:
+        raise ValueError(f'Input files map to the same output names: {clashes}')
+    return stems
+
+
+def read_channels_configuration(filepath: str) -> pd.DataFrame:
+    # Written by `convert_df`, the first column is the dataframe index
+    channels_df = pd.read_csv(filepath, index_col=0)
+    missing = {'Up', 'Down'} - set(channels_df.columns)
+    if missing:
+        raise ValueError(f'channels configuration `{filepath}` misses the columns {sorted(missing)}')
+    return channels_df
+
+
+def read_logger_file(filepath: str, columns: list) -> pd.DataFrame:
+    return read_toa5(filepath, columns=columns)
+
+
+def process_file(
+        filepath: str,
+        channels_df: pd.DataFrame,
+        output_dirpath: str,
+        station: str = None,
+        store_dirpath: str = None,
+        qc: bool = False,
+        history_filepath: str = None,
+        stem: str = None,
+        **calibration_kwargs) -> dict:
+    """
+    Calibrate one logger file and write its coefficients. If `store_dirpath`
+    is set, the channels are also ingested into the Parquet dataset store.
+    With `qc` the samples flagged by `qc.screen()` are left out of the fits.
+    If `history_filepath` is set, the coefficients are recorded in that
+    calibration history database and the data freshness of the channels in
+    its status tables. `stem` names the outputs, the file name without
+    extension if None (see `output_stems()`).
+
+    Returns:
+    --------
+        summary dict with the keys file, output, rows, pairs, converged,
+        seconds and error (None on success).
+    """
+    start = time.perf_counter()
+    summary = {
+        'file': filepath,
+        'output': None,
+        'rows': 0,
+        'pairs': 0,
+        'converged': 0,
+        'seconds': 0.0,
+        'error': None,
+        }
+    try:
+        columns = list(channels_df['Up'].dropna()) + list(channels_df['Down'].dropna())
+        cal_df = read_logger_file(filepath, columns)
+        if qc:
+            calibration_kwargs['qc'] = screen(cal_df, columns=columns)
+        coefficients = calibrate_pairs(cal_df, channels_df, **calibration_kwargs)
+        coefficients.insert(0, 'file', os.path.basename(filepath))
+        if station is not None:
+            coefficients.insert(0, 'station', station)
+
+        stem = stem or os.path.splitext(os.path.basename(filepath))[0]
+        output_filepath = os.path.join(output_dirpath, f'{stem}_calibration.csv')
+        # Same layout as the STEP 04 download, read back with `index_col=0`
+        coefficients.to_csv(output_filepath)
+        if store_dirpath is not None:
+            write_dataset(
+                cal_df, channels_df, station, store_dirpath, name=stem, validated_only=False)
+        if history_filepath is not None:
+            start_time, end_time = cal_df[TIMESTAMP].min(), cal_df[TIMESTAMP].max()
+            with CalibrationHistory(history_filepath) as history:
+                history.record(
+                    coefficients, station, start_time, end_time,
+                    method=calibration_kwargs.get('method'), source=os.path.basename(filepath))
+            # Data freshness of the map activity, kept in the same database
+            keys = channel_sensors(channels_df)
+            with StatusStore(history_filepath) as status:
+                status.update_data(
+                    station, keys['channel'], start_time, end_time, len(cal_df), sensors=keys['sensor'])
+
+        summary.update(
+            output=output_filepath,
+            rows=len(cal_df),
+            pairs=len(coefficients),
+            converged=int(coefficients['converged'].sum()),
+            )
+    except Exception as e:
+        summary['error'] = f'{type(e).__name__}: {e}'
+
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='sstc-calibrate',
+        description='Calibrate Up/Dw channel pairs of Campbell logger files in bulk.')
+    parser.add_argument(
+        'inputs', nargs='+',
+        help='logger files, directories (searched recursively for .dat files) or glob patterns')
+    parser.add_argument(
+        '-c', '--channels', required=True,
+        help='channels configuration file written by STEP 03 of the calibration activity')
+    parser.add_argument(
+        '-o', '--output', default='.',
+        help='output directory for the coefficients files (default: current directory)')
+    parser.add_argument(
+        '-j', '--workers', type=int, default=os.cpu_count(),
+        help='number of worker processes (default: number of cores)')
+    parser.add_argument('-s', '--station', choices=station_acronyms(), help='station acronym')
+    parser.add_argument(
+        '--store',
+        help='ingest the channels into the Parquet dataset store at this directory (requires --station)')
+    parser.add_argument(
+        '--history',
+        help='record the coefficients in the calibration history database at this path (requires --station)')
+    parser.add_argument('--standard', type=float, default=1)
+    parser.add_argument('--threshold', type=float, default=0.03)
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--speed', type=int, default=6)
+    parser.add_argument(
+        '--method', default='iterative', choices=['iterative', *METHODS],
+        help='fitting engine (default: iterative outlier rejection)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the theil-sen, ransac and bootstrap draws')
+    parser.add_argument(
+        '--bootstrap', type=int, default=0, metavar='N',
+        help='add confidence intervals of slope and intercept from N bootstrap resamples')
+    parser.add_argument('--confidence', type=float, default=0.95, help='level of the bootstrap intervals')
+    parser.add_argument(
+        '--qc', action='store_true',
+        help='skip missing, sentinel, duplicate, low irradiance, saturated and stuck samples')
+    parser.add_argument(
+        '--state', metavar='NPZ',
+        help='absorb the files into the incremental calibrator checkpoint at this path, created if missing')
+    return parser
+
+
+def update_state(state_filepath: str, filepaths: list, channels_df: pd.DataFrame, qc: bool = False, **kwargs):
+    """
+    Absorb the logger files into an `IncrementalCalibrator` checkpoint. The
+    files are absorbed one by one in path order, so the accepted samples do
+    not depend on the number of workers. The checkpoint records the content
+    hash of every absorbed file, files already absorbed are skipped.
+
+    Returns:
+    --------
+        the current coefficients of the checkpoint and the skipped files.
+    """
+    from sstc_fixedsensors.incremental import IncrementalCalibrator
+
+    if os.path.isfile(state_filepath):
+        calibrator = IncrementalCalibrator.load(state_filepath)
+    else:
+        calibrator = IncrementalCalibrator(**kwargs)
+    columns = list(channels_df['Up'].dropna()) + list(channels_df['Down'].dropna())
+    absorbed = set(calibrator.sources)
+    skipped = []
+    for filepath in sorted(filepaths):
+        digest = file_hash(filepath)
+        if digest in absorbed:
+            skipped.append(filepath)
+            continue
+        cal_df = read_logger_file(filepath, columns)
+        calibrator.update_frame(
+            cal_df, channels_df, qc=screen(cal_df, columns=columns) if qc else None, source=digest)
+        absorbed.add(digest)
+    calibrator.save(state_filepath)
+    return calibrator.coefficients(), skipped
+
+
+def main(argv: list = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.store and not args.station:
+        parser.error('--store requires --station')
+    if args.history and not args.station:
+        parser.error('--history requires --station')
+
+    # The channels configuration may live next to the logger files
+    files = [
+        f for f in expand_inputs(args.inputs)
+        if os.path.abspath(f) != os.path.abspath(args.channels)]
+    if not files:
+        print('No input files found.', file=sys.stderr)
+        return 1
+
+    try:
+        stems = output_stems(files)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    channels_df = read_channels_configuration(args.channels)
+    os.makedirs(args.output, exist_ok=True)
+    calibration_kwargs = {
+        'standard': args.standard,
+        'Threshold': args.threshold,
+        'Iter': args.iterations,
+        'speed': args.speed,
+        'method': args.method,
+        'seed': args.seed,
+        'n_bootstrap': args.bootstrap,
+        'confidence': args.confidence,
+        }
+
+    workers = max(1, min(args.workers or 1, len(files)))
+    start = time.perf_counter()
+    summaries = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                process_file, f, channels_df, args.output, args.station, args.store, args.qc, args.history,
+                stem, **calibration_kwargs)
+            for f, stem in zip(files, stems)]
+        for future in as_completed(futures):
+            summary = future.result()
+            summaries.append(summary)
+            status = summary['error'] or f"{summary['converged']}/{summary['pairs']} pairs converged"
+            print(f"[{len(summaries)}/{len(files)}] {summary['file']}: {status} ({summary['seconds']:.2f} s)")
+
+    failed = [s for s in summaries if s['error'] is not None]
+    if args.state:
+        coefficients, skipped = update_state(
+            args.state, [s['file'] for s in summaries if s['error'] is None], channels_df, args.qc,
+            Threshold=args.threshold, standard=args.standard)
+        if skipped:
+            print(f'{args.state}: {len(skipped)} files already absorbed, skipped')
+        print(f'{args.state}: {len(coefficients)} pairs, {int(coefficients["n_samples"].sum())} samples absorbed')
+
+    elapsed = time.perf_counter() - start
+    rows = sum(s['rows'] for s in summaries)
+    print(
+        f'Processed {len(summaries) - len(failed)}/{len(files)} files, {rows} rows '
+        f'in {elapsed:.2f} s with {workers} workers ({rows / elapsed:,.0f} rows/s).')
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
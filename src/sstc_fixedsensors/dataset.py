@@ -0,0 +1,370 @@
+"""
+    Time-indexed dataset assembled from many TOA5 files of one station.
+
+    Logger downloads overlap: the same record is found in several files. The
+    assembler streams every file in chunks, drops the records whose
+    `TIMESTAMP` is already in the dataset and appends the new ones as a
+    Parquet segment. Memory use is bounded by the chunk size plus the index.
+
+        <root>/<ACRONYM>/manifest.json     ==> segments, ingested files and index file
+        <root>/<ACRONYM>/index-000003.npz  ==> sorted TIMESTAMP -> (segment, row)
+        <root>/<ACRONYM>/segments/000000.parquet
+
+    Every save writes a new index file and then replaces the manifest that
+    names it, so an interrupted ingest leaves the previous consistent state.
+
+    The index is kept sorted by timestamp, so a time window is located with
+    two binary searches and only the segments holding rows of that window are
+    read, decoding only the requested columns.
+
+    Usage:
+    ------
+        python -m sstc_fixedsensors.dataset /data/datasets ANS /data/ANS/**/*.dat
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from sstc_fixedsensors.store import station_acronym
+from sstc_fixedsensors.toa5 import RECORD, TIMESTAMP, read_header, read_toa5
+
+
+MANIFEST_FILENAME = 'manifest.json'
+SEGMENTS_DIRNAME = 'segments'
+
+
+def file_hash(filepath: str, blocksize: int = 1 << 20) -> str:
+    # Same digest as `cache.content_hash` of the file bytes, without loading them
+    h = hashlib.blake2b(digest_size=16)
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _merge_runs(runs: list) -> dict:
+    # Index entries of sorted `runs` with distinct timestamps, in one sorted
+    # index. The stable sort is a timsort, which merges presorted runs in linear time
+    merged = {k: np.concatenate([run[k] for run in runs]) for k in runs[0]}
+    order = np.argsort(merged['timestamp'], kind='stable')
+    return {k: v[order] for k, v in merged.items()}
+
+
+def _lookup(index: dict, timestamps: np.ndarray) -> tuple:
+    # Mask of the `timestamps` found in the sorted `index` and their positions there
+    known = index['timestamp']
+    positions = np.searchsorted(known, timestamps)
+    found = positions < len(known)
+    found[found] = known[positions[found]] == timestamps[found]
+    return found, positions[found]
+
+
+class StationDataset:
+    """
+    Deduplicated, time-sorted collection of the records of one station.
+
+    Parameters:
+    -----------
+        root_dirpath: root directory, the dataset lives in `<root>/<ACRONYM>`.
+        station: station name or acronym.
+    """
+    def __init__(self, root_dirpath: str, station: str):
+        self.station = station_acronym(station)
+        self.dirpath = os.path.join(root_dirpath, self.station)
+        os.makedirs(os.path.join(self.dirpath, SEGMENTS_DIRNAME), exist_ok=True)
+
+        manifest_filepath = os.path.join(self.dirpath, MANIFEST_FILENAME)
+        if os.path.exists(manifest_filepath):
+            with open(manifest_filepath) as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {'station': self.station, 'segments': [], 'files': {}}
+
+        if 'index' in self.manifest:
+            with np.load(os.path.join(self.dirpath, self.manifest['index'])) as npz:
+                self.index = {k: npz[k] for k in npz.files}
+        else:
+            self.index = {
+                'timestamp': np.empty(0, dtype=np.int64),
+                'record': np.empty(0, dtype=np.int64),
+                'segment': np.empty(0, dtype=np.int32),
+                'row': np.empty(0, dtype=np.int32),
+                }
+        # Sorted index entries of the file being ingested, merged into the index by `_save()`
+        self._pending = []
+
+    def __len__(self) -> int:
+        return len(self.index['timestamp'])
+
+    @property
+    def columns(self) -> list:
+        columns = {}
+        for segment in self.manifest['segments']:
+            columns.update(dict.fromkeys(segment['columns']))
+        return list(columns)
+
+    @property
+    def start(self) -> pd.Timestamp:
+        return pd.Timestamp(self.index['timestamp'][0]) if len(self) else None
+
+    @property
+    def end(self) -> pd.Timestamp:
+        return pd.Timestamp(self.index['timestamp'][-1]) if len(self) else None
+
+    def _segment_filepath(self, segment: int) -> str:
+        return os.path.join(self.dirpath, SEGMENTS_DIRNAME, self.manifest['segments'][segment]['filename'])
+
+    def _save(self):
+        # The manifest names the index file and is replaced last: until then
+        # the previous manifest, its index and segments stay consistent
+        if self._pending:
+            self.index = _merge_runs([self.index, *self._pending])
+            self._pending = []
+        previous = self.manifest.get('index')
+        generation = self.manifest.get('generation', 0) + 1
+        index_filename = f'index-{generation:06d}.npz'
+        index_filepath = os.path.join(self.dirpath, index_filename)
+        with open(index_filepath + '.tmp', 'wb') as f:
+            np.savez(f, **self.index)
+        os.replace(index_filepath + '.tmp', index_filepath)
+
+        manifest = dict(self.manifest, index=index_filename, generation=generation)
+        manifest_filepath = os.path.join(self.dirpath, MANIFEST_FILENAME)
+        with open(manifest_filepath + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(manifest_filepath + '.tmp', manifest_filepath)
+        self.manifest = manifest
+
+        if previous is not None and previous != index_filename:
+            os.remove(os.path.join(self.dirpath, previous))
+
+    def _append_chunk(self, chunk: pd.DataFrame, source: str) -> dict:
+        """
+        Write the rows of `chunk` with a new timestamp as a segment.
+
+        Returns:
+        --------
+            dict with the number of rows added, duplicates dropped,
+            conflicts (duplicate timestamp with a different RECORD) and
+            invalid rows (missing TIMESTAMP), dropped too.
+        """
+        timestamps = chunk[TIMESTAMP].to_numpy(dtype='datetime64[ns]').view(np.int64)
+        records = chunk[RECORD].to_numpy(dtype=np.int64) if RECORD in chunk.columns \
+            else np.full(len(chunk), -1, dtype=np.int64)
+
+        valid = timestamps != np.iinfo(np.int64).min
+        # First occurrence within the chunk, then not yet in the dataset
+        _, first, inverse = np.unique(timestamps[valid], return_index=True, return_inverse=True)
+        candidates = np.flatnonzero(valid)[first]
+        # Repeated timestamps within the chunk with another RECORD than the first
+        conflicts = int(np.count_nonzero(records[valid] != records[candidates][inverse]))
+
+        # Already in the dataset, or in an earlier chunk of the file
+        in_index = np.zeros(len(candidates), dtype=bool)
+        for index in (self.index, *self._pending):
+            found, positions = _lookup(index, timestamps[candidates])
+            conflicts += int(np.count_nonzero(index['record'][positions] != records[candidates[found]]))
+            in_index |= found
+        new_rows = candidates[~in_index]
+
+        n_valid = int(np.count_nonzero(valid))
+        stats = {
+            'added': len(new_rows),
+            'duplicates': n_valid - len(new_rows),
+            'conflicts': conflicts,
+            'invalid': len(chunk) - n_valid,
+            }
+        if not len(new_rows):
+            return stats
+
+        segment = len(self.manifest['segments'])
+        filename = f'{segment:06d}.parquet'
+        data = chunk.iloc[new_rows]
+        arrays = {TIMESTAMP: pa.array(data[TIMESTAMP].to_numpy(dtype='datetime64[ns]'))}
+        arrays[RECORD] = pa.array(records[new_rows])
+        for c in data.columns:
+            if c in (TIMESTAMP, RECORD):
+                continue
+            if pd.api.types.is_numeric_dtype(data[c]):
+                arrays[c] = pa.array(data[c].to_numpy(dtype=np.float64))
+            else:
+                # String fields of the TOA5 table (status, sensor ID, ...)
+                arrays[c] = pa.array(data[c].astype(object).where(data[c].notna(), None), type=pa.string())
+        pq.write_table(pa.table(arrays), os.path.join(self.dirpath, SEGMENTS_DIRNAME, filename), compression='zstd')
+
+        self.manifest['segments'].append({
+            'filename': filename,
+            'source': source,
+            'rows': len(new_rows),
+            'columns': [c for c in arrays if c not in (TIMESTAMP, RECORD)],
+            })
+        # `new_rows` are sorted by timestamp. A run is merged with the previous
+        # one while not smaller, so a file of many chunks keeps a logarithmic
+        # number of runs to search and every entry is merged O(log chunks) times
+        self._pending.append({
+            'timestamp': timestamps[new_rows],
+            'record': records[new_rows],
+            'segment': np.full(len(new_rows), segment, dtype=np.int32),
+            'row': np.arange(len(new_rows), dtype=np.int32),
+            })
+        runs = self._pending
+        while len(runs) > 1 and len(runs[-2]['timestamp']) <= len(runs[-1]['timestamp']):
+            runs[-2:] = [_merge_runs(runs[-2:])]
+        return stats
+
+    def add_file(self, filepath: str, chunksize: int = 100_000) -> dict:
+        """
+        Stream a TOA5 file into the dataset. A file with the same content
+        hash as an already ingested one is skipped.
+
+        Returns:
+        --------
+            dict with the keys file, rows, added, duplicates, conflicts,
+            invalid and skipped.
+        """
+        digest = file_hash(filepath)
+        summary = {
+            'file': filepath, 'rows': 0, 'added': 0, 'duplicates': 0, 'conflicts': 0, 'invalid': 0,
+            'skipped': False}
+        if digest in self.manifest['files']:
+            summary['skipped'] = True
+            return summary
+
+        header = read_header(filepath)
+        if TIMESTAMP not in header.fields:
+            raise KeyError(f'`{TIMESTAMP}` column not found in {filepath}')
+
+        for chunk in read_toa5(filepath, chunksize=chunksize, header=header):
+            stats = self._append_chunk(chunk, os.path.basename(filepath))
+            summary['rows'] += len(chunk)
+            for k, v in stats.items():
+                summary[k] += v
+
+        self.manifest['files'][digest] = {
+            'filename': os.path.basename(filepath),
+            'rows': summary['rows'],
+            'added': summary['added'],
+            }
+        self._save()
+        return summary
+
+    def add_files(self, filepaths: list, chunksize: int = 100_000) -> pd.DataFrame:
+        """
+        Ingest files one after the other, see `add_file()`.
+        """
+        return pd.DataFrame([self.add_file(f, chunksize=chunksize) for f in filepaths])
+
+    def locate(self, start=None, end=None) -> slice:
+        """
+        Index positions of the records with `start <= TIMESTAMP <= end`.
+        """
+        timestamps = self.index['timestamp']
+        lo = 0 if start is None else int(np.searchsorted(
+            timestamps, pd.Timestamp(start).as_unit('ns').value, side='left'))
+        hi = len(timestamps) if end is None else int(np.searchsorted(
+            timestamps, pd.Timestamp(end).as_unit('ns').value, side='right'))
+        return slice(lo, hi)
+
+    def window(self, start=None, end=None, columns: list = None) -> pd.DataFrame:
+        """
+        Records between `start` and `end` (inclusive) sorted by `TIMESTAMP`.
+
+        Only the segments holding rows of the window are opened and only
+        `columns` (all if None) are decoded. Columns absent from a segment
+        are NaN for its rows, string columns are returned as object.
+        """
+        positions = self.locate(start, end)
+        segments = self.index['segment'][positions]
+        rows = self.index['row'][positions]
+        columns = self.columns if columns is None else list(columns)
+        n = len(segments)
+
+        values = {c: np.full(n, np.nan) for c in columns}
+        for segment in np.unique(segments):
+            where = np.flatnonzero(segments == segment)
+            available = [c for c in columns if c in self.manifest['segments'][segment]['columns']]
+            if not available:
+                continue
+            table = pq.read_table(self._segment_filepath(segment), columns=available, memory_map=True)
+            take = rows[where]
+            for c in available:
+                column = table.column(c).to_numpy()
+                if column.dtype.kind not in 'fiu' and values[c].dtype != object:
+                    values[c] = values[c].astype(object)
+                values[c][where] = column[take]
+
+        df = pd.DataFrame({
+            TIMESTAMP: self.index['timestamp'][positions].view('datetime64[ns]'),
+            RECORD: self.index['record'][positions],
+            })
+        for c in columns:
+            df[c] = values[c]
+        return df
+
+    def gaps(self, interval=None, tolerance: float = 1.5) -> pd.DataFrame:
+        """
+        Gaps between consecutive records longer than `tolerance` times the
+        logging `interval` (a Timedelta or string, the median spacing if None).
+
+        Returns:
+        --------
+            DataFrame with the columns start, end, duration and missing
+            (number of records expected in the gap).
+        """
+        timestamps = self.index['timestamp']
+        columns = ['start', 'end', 'duration', 'missing']
+        if len(timestamps) < 2:
+            return pd.DataFrame(columns=columns)
+
+        spacing = np.diff(timestamps)
+        step = int(np.median(spacing)) if interval is None else pd.Timedelta(interval).value
+        where = np.flatnonzero(spacing > tolerance * step)
+        return pd.DataFrame({
+            'start': timestamps[where].view('datetime64[ns]'),
+            'end': timestamps[where + 1].view('datetime64[ns]'),
+            'duration': pd.to_timedelta(spacing[where], unit='ns'),
+            'missing': spacing[where] // step - 1,
+            }, columns=columns)
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description='Merge TOA5 files of a station into one time-indexed dataset.')
+    parser.add_argument('root', help='root directory of the datasets')
+    parser.add_argument('station', help='station name or acronym')
+    parser.add_argument('inputs', nargs='+', help='TOA5 files or glob patterns')
+    parser.add_argument('--chunksize', type=int, default=100_000)
+    parser.add_argument(
+        '--status', metavar='DB',
+        help='update the data freshness of the station channels in this status database')
+    args = parser.parse_args(argv)
+
+    filepaths = []
+    for pattern in args.inputs:
+        filepaths.extend(sorted(glob.glob(pattern, recursive=True)) or [pattern])
+
+    dataset = StationDataset(args.root, args.station)
+    summary = dataset.add_files(filepaths, chunksize=args.chunksize)
+    print(summary.to_string(index=False))
+    print(f'\n{dataset.station}: {len(dataset)} records from {dataset.start} to {dataset.end}')
+    if args.status and len(dataset):
+        from sstc_fixedsensors.status import StatusStore
+
+        with StatusStore(args.status) as status:
+            status.update_data(dataset.station, dataset.columns, dataset.start, dataset.end, len(dataset))
+    gaps = dataset.gaps()
+    if len(gaps):
+        print(f'{len(gaps)} gaps:')
+        print(gaps.to_string(index=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+    Decimation of long series to a pixel budget for plotting.
+
+    Only the indices of the samples to draw are computed, so the same
+    selection applies to every column of a DataFrame:
+
+        minmax_indices: first minimum and maximum of each bin, keeps the
+                        envelope of noisy series and every spike.
+        grid_indices:   one sample per occupied cell of a pixel grid, for
+                        scatter plots.
+
+    `LODTiles` precomputes min/max levels of detail, each level halving the
+    bin width of the previous one, so a zoomed view is served with about the
+    same number of points as the full view.
+"""
+import math
+
+import numpy as np
+
+
+def minmax_indices(y, n_bins: int) -> np.ndarray:
+    """
+    Sorted indices of the minimum and maximum of `y` in `n_bins` equal bins.
+
+    `y` is a 1-D series or a 2-D array of shape `(series, samples)`, in which
+    case the union of the extrema of every series is returned. Non finite
+    samples are never selected.
+    """
+    y = np.atleast_2d(np.asarray(y, dtype=np.float64))
+    n = y.shape[1]
+    if n <= 2 * n_bins:
+        return np.flatnonzero(np.isfinite(y).any(axis=0))
+
+    size = math.ceil(n / n_bins)
+    n_bins = math.ceil(n / size)
+    padded = np.full((y.shape[0], n_bins * size), np.nan)
+    padded[:, :n] = y
+    bins = padded.reshape(y.shape[0], n_bins, size)
+
+    finite = np.isfinite(bins)
+    offsets = np.arange(n_bins) * size
+    lo = np.where(finite, bins, np.inf).argmin(axis=2) + offsets
+    hi = np.where(finite, bins, -np.inf).argmax(axis=2) + offsets
+    indices = np.concatenate([lo.ravel(), hi.ravel()])
+    indices = indices[np.isfinite(padded[:, indices]).any(axis=0)]
+    return np.unique(indices)
+
+
+def grid_indices(x, y, width: int = 300, height: int = 200, groups=None) -> np.ndarray:
+    """
+    Sorted indices of one sample per occupied cell of a `width` x `height` grid.
+
+    `groups` is an optional integer label per sample (e.g. kept / rejected),
+    each group is thinned on its own grid so none hides another.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    if len(valid) == 0:
+        return valid
+
+    xv, yv = x[valid], y[valid]
+    cells = np.zeros(len(valid), dtype=np.int64)
+    for values, n_cells in ((xv, width), (yv, height)):
+        low, high = values.min(), values.max()
+        span = high - low if high > low else 1.0
+        cell = ((values - low) * ((n_cells - 1) / span)).astype(np.int64)
+        cells = cells * n_cells + cell
+    if groups is not None:
+        cells += np.asarray(groups, dtype=np.int64)[valid] * (width * height)
+
+    _, first = np.unique(cells, return_index=True)
+    return valid[np.sort(first)]
+
+
+class LODTiles:
+    """
+    Min/max levels of detail of series sharing a monotonic `x` axis.
+
+    Level `k` splits the samples in `2**k` tiles of `points_per_tile` bins
+    each, down to the level where a tile holds no more samples than its
+    budget and is kept raw. A view is served from the finest level whose
+    tiles are at least as wide as the view, so it overlaps at most two tiles
+    and returns about `points_per_tile / 2` to `2 * points_per_tile` points
+    per series.
+    """
+    __slots__ = ('x', 'n_samples', 'points_per_tile', 'levels')
+
+    def __init__(self, x, y, points_per_tile: int = 1000):
+        self.x = np.asarray(x)
+        y = np.atleast_2d(np.asarray(y, dtype=np.float64))
+        self.n_samples = y.shape[1]
+        self.points_per_tile = points_per_tile
+
+        bins_per_tile = max(1, points_per_tile // 2)
+        self.levels = []
+        n_tiles = 1
+        while True:
+            self.levels.append(minmax_indices(y, n_tiles * bins_per_tile))
+            if self.n_samples / n_tiles <= points_per_tile:
+                break
+            n_tiles *= 2
+
+    @property
+    def n_levels(self) -> int:
+        return len(self.levels)
+
+    def level_for(self, start: int, stop: int) -> int:
+        span = max(stop - start, 1)
+        level = int(math.floor(math.log2(max(self.n_samples / span, 1))))
+        return min(level, self.n_levels - 1)
+
+    def view(self, x_start=None, x_stop=None) -> np.ndarray:
+        """
+        Sorted sample indices to draw between `x_start` and `x_stop`
+        (inclusive), one sample beyond each end keeps the lines continuous.
+        """
+        start = 0 if x_start is None else int(np.searchsorted(self.x, x_start, side='left'))
+        stop = self.n_samples if x_stop is None else int(np.searchsorted(self.x, x_stop, side='right'))
+        indices = self.levels[self.level_for(start, stop)]
+        lo = max(int(np.searchsorted(indices, start, side='left')) - 1, 0)
+        hi = int(np.searchsorted(indices, stop, side='left')) + 1
+        return indices[lo:hi]
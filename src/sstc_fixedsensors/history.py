@@ -0,0 +1,375 @@
+"""
+    Calibration history of the sensor channels of every station.
+
+    The coefficients of each calibration campaign are appended to a local
+    SQLite database, one row per channel pair, keyed by station acronym,
+    sensor, serial, channel pair and wavelength, with the fit diagnostics and
+    the time window of the calibration dataset:
+
+        history = CalibrationHistory('/data/calibration_history.sqlite')
+        history.record(coefficients, station='ANS', start=..., end=..., serial='SN54105')
+        history.needs_recalibration()
+
+    Recording the same channel and window again replaces the previous row.
+    Drift and step changes are computed over the coefficient series of every
+    channel at once: the series are read sorted by channel and time in one
+    query, and the per-channel regressions are `np.add.reduceat` sums solved
+    with `calibration.solve_linear_sums`.
+"""
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from sstc_fixedsensors.calibration import solve_linear_sums
+from sstc_fixedsensors.status import create_tables, refresh_channel_status, sensor_names
+from sstc_fixedsensors.store import station_acronym
+
+
+CHANNEL_KEY = ['station', 'sensor', 'serial', 'up', 'down']
+
+COEFFICIENT_COLUMNS = [
+    'slope', 'intercept', 'r2', 'n_samples', 'iterations', 'converged',
+    'slope_se', 'slope_ci_low', 'slope_ci_high', 'intercept_se', 'intercept_ci_low', 'intercept_ci_high']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calibrations (
+    id INTEGER PRIMARY KEY,
+    station TEXT NOT NULL,
+    sensor TEXT NOT NULL,
+    serial TEXT NOT NULL DEFAULT '',
+    up TEXT NOT NULL,
+    down TEXT NOT NULL,
+    wavelength_nm REAL,
+    sensor_model TEXT,
+    window_start TEXT NOT NULL,
+    window_end TEXT NOT NULL,
+    recorded_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now')),
+    method TEXT NOT NULL DEFAULT 'iterative',
+    slope REAL,
+    intercept REAL,
+    r2 REAL,
+    n_samples INTEGER,
+    iterations INTEGER,
+    converged INTEGER,
+    slope_se REAL,
+    slope_ci_low REAL,
+    slope_ci_high REAL,
+    intercept_se REAL,
+    intercept_ci_low REAL,
+    intercept_ci_high REAL,
+    source TEXT,
+    UNIQUE (station, sensor, serial, up, down, window_start, window_end, method)
+);
+CREATE INDEX IF NOT EXISTS calibrations_channel
+    ON calibrations (station, sensor, serial, up, down, window_end);
+CREATE INDEX IF NOT EXISTS calibrations_wavelength ON calibrations (wavelength_nm, window_end);
+CREATE INDEX IF NOT EXISTS calibrations_end ON calibrations (window_end);
+"""
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+NS_PER_YEAR = 365.25 * 86400 * 10**9
+
+
+def _time_text(value) -> str:
+    return None if value is None else pd.Timestamp(value).strftime(TIME_FORMAT)
+
+
+class CalibrationHistory:
+    """
+    SQLite backed history of calibration coefficients.
+
+    Parameters:
+    -----------
+        filepath: database file, created if missing. Several processes may
+            record into the same file, writers wait up to `timeout` seconds.
+    """
+    def __init__(self, filepath: str, timeout: float = 30.0):
+        self.filepath = filepath
+        dirpath = os.path.dirname(os.path.abspath(filepath))
+        os.makedirs(dirpath, exist_ok=True)
+        self._connection = sqlite3.connect(filepath, timeout=timeout, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.executescript(SCHEMA)
+        create_tables(self._connection)
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._connection.execute('SELECT COUNT(*) FROM calibrations').fetchone()[0]
+
+    def record(
+            self,
+            coefficients: pd.DataFrame,
+            station: str,
+            start,
+            end,
+            serial: str = None,
+            method: str = None,
+            source: str = None) -> int:
+        """
+        Append the coefficients of one calibration campaign.
+
+        Parameters:
+        -----------
+            coefficients: output of `calibrate_pairs()`, with the channels
+                configuration columns (`sensor_sites_named`, `sensor_model`,
+                `center_wavelength_nm`) when available.
+            station: station name or acronym.
+            start, end: time window of the calibration dataset.
+            serial: sensor serial number, e.g. the STEP 03 `sensor_type`.
+            method: fitting method, 'iterative' if None.
+            source: free text, e.g. the calibration file name.
+
+        Returns:
+        --------
+            number of rows written.
+        """
+        df = coefficients.dropna(subset=['Up', 'Down'])
+        if df.empty:
+            return 0
+
+        def column(name, default=None):
+            return df[name].astype(object).where(df[name].notna(), default) if name in df.columns \
+                else pd.Series(default, index=df.index, dtype=object)
+
+        rows = pd.DataFrame({
+            'station': station_acronym(station),
+            'sensor': sensor_names(df),
+            'serial': '' if serial is None else str(serial),
+            'up': df['Up'].astype(str),
+            'down': df['Down'].astype(str),
+            'wavelength_nm': pd.to_numeric(column('center_wavelength_nm'), errors='coerce'),
+            'sensor_model': column('sensor_model'),
+            'window_start': _time_text(start),
+            'window_end': _time_text(end),
+            'method': method or 'iterative',
+            'source': source,
+            })
+        for c in COEFFICIENT_COLUMNS:
+            rows[c] = pd.to_numeric(column(c), errors='coerce')
+        rows['converged'] = rows['converged'].astype('Int64')
+        rows = rows.astype(object).where(rows.notna(), None)
+
+        names = list(rows.columns)
+        sql = (
+            f"INSERT OR REPLACE INTO calibrations ({', '.join(names)}) "
+            f"VALUES ({', '.join('?' * len(names))})")
+        with self._connection:
+            self._connection.executemany(sql, rows.itertuples(index=False, name=None))
+            # Status of the recorded channels only, age is judged when the status is read
+            series = self._series(rows[CHANNEL_KEY].drop_duplicates())
+            refresh_channel_status(self._connection, needs_recalibration(series, max_age_days=np.inf))
+        return len(rows)
+
+    def _series(self, keys: pd.DataFrame) -> pd.DataFrame:
+        # Calibrations of the channels in `keys`, read through the channel index
+        placeholders = ', '.join('?' * len(keys))
+        df = pd.read_sql_query(
+            f"SELECT * FROM calibrations WHERE station = ? AND serial = ? AND up IN ({placeholders}) "
+            f"ORDER BY {', '.join(CHANNEL_KEY)}, window_end, window_start",
+            self._connection,
+            params=[keys['station'].iloc[0], keys['serial'].iloc[0], *keys['up']])
+        df = df.merge(keys, on=CHANNEL_KEY)
+        for c in ('window_start', 'window_end', 'recorded_at'):
+            df[c] = pd.to_datetime(df[c], format=TIME_FORMAT)
+        return df
+
+    def query(
+            self,
+            station: str = None,
+            sensor: str = None,
+            channel: str = None,
+            wavelength_nm: float = None,
+            start=None,
+            end=None) -> pd.DataFrame:
+        """
+        Calibrations sorted by channel and `window_end`. Every argument
+        narrows the selection: `channel` matches the Up or Down column name,
+        `wavelength_nm` the nominal wavelength to the nm, `start` and `end`
+        the calibration windows ending in that period.
+        """
+        where, params = [], []
+        if station is not None:
+            where.append('station = ?')
+            params.append(station_acronym(station))
+        if sensor is not None:
+            where.append('sensor = ?')
+            params.append(sensor)
+        if channel is not None:
+            where.append('(up = ? OR down = ?)')
+            params.extend([channel, channel])
+        if wavelength_nm is not None:
+            where.append('wavelength_nm >= ? AND wavelength_nm < ?')
+            params.extend([round(wavelength_nm) - 0.5, round(wavelength_nm) + 0.5])
+        if start is not None:
+            where.append('window_end >= ?')
+            params.append(_time_text(start))
+        if end is not None:
+            where.append('window_end <= ?')
+            params.append(_time_text(end))
+
+        sql = 'SELECT * FROM calibrations'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += f" ORDER BY {', '.join(CHANNEL_KEY)}, window_end, window_start"
+        df = pd.read_sql_query(sql, self._connection, params=params)
+        for c in ('window_start', 'window_end', 'recorded_at'):
+            df[c] = pd.to_datetime(df[c], format=TIME_FORMAT)
+        return df
+
+    def latest(self, station: str = None) -> pd.DataFrame:
+        """
+        Most recent calibration of every channel.
+        """
+        return latest(self.query(station=station))
+
+    def drift(self, station: str = None, **kwargs) -> pd.DataFrame:
+        """
+        Drift and step statistics of every channel, see `drift()`.
+        """
+        return drift(self.query(station=station), **kwargs)
+
+    def needs_recalibration(self, station: str = None, **kwargs) -> pd.DataFrame:
+        """
+        Channels due for a recalibration, see `needs_recalibration()`.
+        """
+        return needs_recalibration(self.query(station=station), **kwargs)
+
+
+def _series_starts(history: pd.DataFrame) -> np.ndarray:
+    # First row of every channel of a history sorted by CHANNEL_KEY and window_end
+    if history.empty:
+        return np.empty(0, dtype=np.int64)
+    channel = history.groupby(CHANNEL_KEY, sort=False, dropna=False).ngroup().to_numpy()
+    return np.flatnonzero(np.r_[True, channel[1:] != channel[:-1]])
+
+
+def latest(history: pd.DataFrame) -> pd.DataFrame:
+    """
+    Last row of every channel of a `CalibrationHistory.query()` result.
+    """
+    starts = _series_starts(history)
+    return history.iloc[np.r_[starts[1:], len(history)][:len(starts)] - 1].reset_index(drop=True)
+
+
+def drift(history: pd.DataFrame, step_threshold: float = 0.05) -> pd.DataFrame:
+    """
+    Drift and step changes of the slope series of every channel.
+
+    Parameters:
+    -----------
+        history: `CalibrationHistory.query()` result, sorted by channel and time.
+        step_threshold: relative slope change between consecutive
+            calibrations counted as a step. When both calibrations have
+            bootstrap intervals, the intervals must not overlap either.
+
+    Returns:
+    --------
+        One row per channel with the latest calibration and the columns
+        n_calibrations, slope_change (relative to the first calibration),
+        drift_per_year (relative slope change per year, least squares over
+        the series), last_step (relative change from the previous
+        calibration), n_steps and last_step_at.
+    """
+    starts = _series_starts(history)
+    counts = np.diff(np.r_[starts, len(history)])
+    summary = latest(history)
+    if history.empty:
+        for c in ('n_calibrations', 'slope_change', 'drift_per_year', 'last_step', 'n_steps', 'last_step_at'):
+            summary[c] = []
+        return summary
+
+    channel = np.repeat(np.arange(len(starts)), counts)
+    slope = history['slope'].to_numpy(dtype=np.float64)
+    t = history['window_end'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Slopes relative to the first calibration of their channel, time in years since it
+        relative = slope / slope[starts][channel]
+        years = (t - t[starts][channel]) / NS_PER_YEAR
+
+        valid = np.isfinite(relative)
+        x, y = np.where(valid, years, 0.0), np.where(valid, relative - 1, 0.0)
+        sums = np.stack([
+            np.add.reduceat(valid.astype(np.float64), starts),
+            np.add.reduceat(x, starts),
+            np.add.reduceat(y, starts),
+            np.add.reduceat(x * x, starts),
+            np.add.reduceat(x * y, starts),
+            np.add.reduceat(y * y, starts),
+            ], axis=-1)
+        drift_per_year, _, _ = solve_linear_sums(sums)
+
+        previous = np.r_[np.nan, slope[:-1]]
+        previous[starts] = np.nan
+        step = np.abs(slope - previous) / np.abs(previous)
+    is_step = step > step_threshold
+    if {'slope_ci_low', 'slope_ci_high'} <= set(history.columns):
+        low = history['slope_ci_low'].to_numpy(dtype=np.float64)
+        high = history['slope_ci_high'].to_numpy(dtype=np.float64)
+        previous_low, previous_high = np.r_[np.nan, low[:-1]], np.r_[np.nan, high[:-1]]
+        overlap = (low <= previous_high) & (previous_low <= high)
+        is_step &= ~overlap
+
+    ends = np.r_[starts[1:], len(history)] - 1
+    step_rows = np.where(is_step, np.arange(len(history)), -1)
+    last_step_row = np.maximum.reduceat(step_rows, starts)
+
+    summary['n_calibrations'] = counts
+    summary['slope_change'] = relative[ends] - 1
+    summary['drift_per_year'] = np.where(counts > 1, drift_per_year, np.nan)
+    summary['last_step'] = step[ends]
+    summary['n_steps'] = np.add.reduceat(is_step.astype(np.int64), starts)
+    summary['last_step_at'] = pd.Series(
+        history['window_end'].to_numpy()[np.maximum(last_step_row, 0)]).where(last_step_row >= 0)
+    return summary
+
+
+def needs_recalibration(
+        history: pd.DataFrame,
+        max_age_days: float = 365,
+        max_drift_per_year: float = 0.02,
+        max_change: float = 0.05,
+        min_r2: float = 0.9,
+        step_threshold: float = 0.05,
+        now=None) -> pd.DataFrame:
+    """
+    Decide which channels need a recalibration.
+
+    A channel is due when its latest calibration is older than
+    `max_age_days`, did not converge, fits worse than `min_r2`, its slope
+    drifts faster than `max_drift_per_year` or moved more than `max_change`
+    since the first calibration, or its latest calibration is a step.
+
+    Returns:
+    --------
+        `drift()` summary with the columns age_days, reasons (comma separated)
+        and needs_recalibration, the channels due first.
+    """
+    summary = drift(history, step_threshold=step_threshold)
+    now = pd.Timestamp.now() if now is None else pd.Timestamp(now)
+    summary['age_days'] = (now - summary['window_end']).dt.total_seconds() / 86400
+
+    checks = {
+        'age': summary['age_days'] > max_age_days,
+        'not converged': summary['converged'].fillna(1) == 0,
+        'r2': summary['r2'] < min_r2,
+        'drift': summary['drift_per_year'].abs() > max_drift_per_year,
+        'change': summary['slope_change'].abs() > max_change,
+        'step': summary['last_step_at'].notna() & (summary['last_step_at'] == summary['window_end']),
+        }
+    names = np.array(list(checks))
+    due = np.column_stack([c.to_numpy(dtype=bool) for c in checks.values()]) if len(summary) \
+        else np.empty((0, len(names)), dtype=bool)
+    summary['reasons'] = [', '.join(names[row]) for row in due]
+    summary['needs_recalibration'] = due.any(axis=1)
+    return summary.sort_values(['needs_recalibration', 'age_days'], ascending=[False, False]).reset_index(drop=True)
@@ -0,0 +1,148 @@
+"""
+    Import-time profiling report.
+
+    Every module is imported in a fresh interpreter with `python -X importtime`
+    so the numbers reflect a cold start, as paid by each new app container.
+
+    Usage:
+    ------
+        python -m sstc_fixedsensors.importtime                 # top-level imports of the app and its activities
+        python -m sstc_fixedsensors.importtime pandas pyarrow --top 20
+"""
+import argparse
+import ast
+import glob
+import os
+import subprocess
+import sys
+
+import pandas as pd
+
+
+PACKAGE_DIRPATH = os.path.dirname(os.path.abspath(__file__))
+APP_DIRPATH = os.path.join(PACKAGE_DIRPATH, 'app')
+
+
+def top_level_imports(filepath: str) -> list:
+    """
+    Modules imported by the module-level statements of a source file, in
+    order. Imports inside functions are deferred and left out, so are the
+    standard library modules.
+
+    The app directory is on `sys.path` when the app runs, its modules (e.g.
+    `schemas`) are named within `sstc_fixedsensors.app`. For `from package
+    import name` of this package, `name` is listed when it is a submodule.
+    """
+    with open(filepath, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=filepath)
+
+    def package_module(name):
+        path = os.path.join(os.path.dirname(PACKAGE_DIRPATH), *name.split('.'))
+        return os.path.isfile(path + '.py') or os.path.isfile(os.path.join(path, '__init__.py'))
+
+    modules = []
+    for node in _module_level(tree.body):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+            if node.module.split('.')[0] == 'sstc_fixedsensors':
+                submodules = [f'{node.module}.{a.name}' for a in node.names]
+                names = [m for m in submodules if package_module(m)] or names
+        else:
+            continue
+        for name in names:
+            root = name.split('.')[0]
+            if root in sys.stdlib_module_names or root == '__future__':
+                continue
+            if os.path.isfile(os.path.join(APP_DIRPATH, f'{root}.py')):
+                name = f'sstc_fixedsensors.app.{name}'
+            if name not in modules:
+                modules.append(name)
+    return modules
+
+
+def _module_level(statements: list):
+    # Statements run on import: the module body and the blocks of its if/try/with
+    for node in statements:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        yield node
+        for field in ('body', 'orelse', 'finalbody', 'handlers'):
+            yield from _module_level(getattr(node, field, []))
+
+
+def app_modules(app_dirpath: str = APP_DIRPATH) -> list:
+    """
+    Modules imported when the app starts and its activities are opened, read
+    from the top-level imports of `streamlit_app.py` and `activities/*.py`.
+    """
+    filepaths = [os.path.join(app_dirpath, 'streamlit_app.py')]
+    filepaths += sorted(glob.glob(os.path.join(app_dirpath, 'activities', '*.py')))
+    modules = []
+    for filepath in filepaths:
+        modules.extend(m for m in top_level_imports(filepath) if m not in modules)
+    return modules
+
+
+def profile_import(module: str) -> pd.DataFrame:
+    """
+    Self and cumulative import time (µs) of every module loaded by
+    `import <module>` in a fresh interpreter.
+    """
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise ImportError(completed.stderr.strip().splitlines()[-1])
+
+    records = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        records.append({
+            'module': name.strip(),
+            'depth': (len(name) - len(name.lstrip()) - 1) // 2,
+            'self_us': int(self_us),
+            'cumulative_us': int(cumulative_us),
+            })
+    return pd.DataFrame(records, columns=['module', 'depth', 'self_us', 'cumulative_us'])
+
+
+def report(modules: list, top: int = 10) -> pd.DataFrame:
+    """
+    Cumulative import time of each module and its slowest dependencies.
+    """
+    rows = []
+    for module in modules:
+        try:
+            profile = profile_import(module)
+        except ImportError as e:
+            print(f'{module}: {e}', file=sys.stderr)
+            continue
+        total = profile.loc[profile['module'] == module, 'cumulative_us'].max()
+        rows.append({'module': module, 'cumulative_ms': total / 1e3, 'modules_loaded': len(profile)})
+
+        print(f'\n{module}: {total / 1e3:.1f} ms, {len(profile)} modules loaded')
+        slowest = profile[profile['module'] != module].nlargest(top, 'self_us')
+        for r in slowest.itertuples():
+            print(f'    {r.self_us / 1e3:>8.1f} ms self {r.cumulative_us / 1e3:>8.1f} ms cumulative  {r.module}')
+
+    return pd.DataFrame(rows, columns=['module', 'cumulative_ms', 'modules_loaded'])
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description='Cold start import-time report.')
+    parser.add_argument('modules', nargs='*', help='modules to profile, those of the app if none')
+    parser.add_argument('--top', type=int, default=10, help='slowest dependencies listed per module')
+    args = parser.parse_args(argv)
+
+    summary = report(args.modules or app_modules(), top=args.top)
+    print()
+    print(summary.to_string(index=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+    Incremental calibration of Up/Dw channel pairs.
+
+    Instead of refitting the whole history, the calibrator keeps the sufficient
+    statistics `n, Sx, Sy, Sxx, Sxy, Syy` of every channel pair. New records are
+    absorbed and rejected records retracted in O(batch) time, the coefficients
+    are available at any moment and the state can be checkpointed to disk.
+
+    Nightly job example:
+    --------------------
+        calibrator = IncrementalCalibrator.load('ANS_state.npz')
+        calibrator.update_frame(read_toa5('ANS_today.dat'), channels_df)
+        calibrator.save('ANS_state.npz')
+        calibrator.coefficients()
+
+    `sstc-calibrate --state ANS_state.npz` runs the same update over the
+    files it calibrates.
+"""
+import numpy as np
+import pandas as pd
+
+from sstc_fixedsensors.calibration import SUMS, _calibrate_stack, linear_sums, solve_linear_sums
+from sstc_fixedsensors.qc import DEFAULT_REJECT, pair_flags, usable
+
+
+class IncrementalCalibrator:
+    """
+    Running least squares fit of every channel pair seen so far.
+
+    Parameters:
+    -----------
+        Threshold: once a pair has `min_samples` samples, new samples whose error
+            `|yfit - Dw| / mean(yfit)` exceeds `Threshold` are rejected, the same
+            acceptance criterion as the last pass of `calibration()`.
+        min_samples: until a pair holds this many samples, a batch is screened
+            on its own with the iterative outlier rejection of `calibration()`,
+            so a large first batch is not absorbed unchecked.
+        standard: Dw channels are divided by `standard`.
+    """
+    def __init__(self, Threshold=0.03, min_samples=100, standard=1):
+        self.Threshold = Threshold
+        self.min_samples = min_samples
+        self.standard = standard
+        self._pairs = []
+        self._index = {}
+        self._sums = np.zeros((0, len(SUMS)))
+        self._offsets = np.zeros((0, 2))
+        self._sources = []
+
+    @property
+    def pairs(self) -> list:
+        return list(self._pairs)
+
+    @property
+    def sources(self) -> list:
+        """
+        Identifiers (e.g. file content hashes) of the datasets absorbed with
+        `update_frame(..., source=...)`, in absorption order.
+        """
+        return list(self._sources)
+
+    def _pair_index(self, pair: tuple, x: np.ndarray, y: np.ndarray) -> int:
+        pair = tuple(pair)
+        if pair not in self._index:
+            # Offsets of the first batch keep the sums well conditioned
+            finite = np.isfinite(x) & np.isfinite(y)
+            x0 = x[finite].mean() if finite.any() else 0.0
+            y0 = y[finite].mean() if finite.any() else 0.0
+            self._index[pair] = len(self._pairs)
+            self._pairs.append(pair)
+            self._sums = np.vstack([self._sums, np.zeros(len(SUMS))])
+            self._offsets = np.vstack([self._offsets, [x0, y0]])
+        return self._index[pair]
+
+    def _accepted(self, i: int, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        accepted = np.isfinite(x) & np.isfinite(y)
+        sums = self._sums[i]
+        if sums[0] < self.min_samples:
+            # No reliable running fit yet, seed it from a batch fit of these samples
+            return _calibrate_stack(x[None, :], y[None, :], self.Threshold)['mask'][0]
+
+        x0, y0 = self._offsets[i]
+        slope, intercept, _ = solve_linear_sums(sums, x0, y0)
+        mean_yfit = slope * (sums[1] / sums[0] + x0) + intercept
+        with np.errstate(invalid='ignore'):
+            ME = np.abs(slope * x + intercept - y) / mean_yfit
+            accepted &= ME <= self.Threshold
+        return accepted
+
+    def update(self, up_channel, dw_channel, pair: tuple, reject: bool = True) -> np.ndarray:
+        """
+        Absorb new samples of a channel pair.
+
+        Returns:
+        --------
+            boolean mask of the accepted samples.
+        """
+        x = np.asarray(up_channel, dtype=np.float64)
+        y = np.asarray(dw_channel, dtype=np.float64) / self.standard
+        if x.shape != y.shape:
+            raise ValueError('Must be two equal length arrays')
+
+        i = self._pair_index(pair, x, y)
+        accepted = self._accepted(i, x, y) if reject else np.isfinite(x) & np.isfinite(y)
+        x0, y0 = self._offsets[i]
+        self._sums[i] += linear_sums(x - x0, y - y0, accepted)
+        return accepted
+
+    def retract(self, up_channel, dw_channel, pair: tuple, accepted: np.ndarray = None):
+        """
+        Remove samples previously absorbed with `update`, e.g. records flagged
+        as outliers afterwards.
+
+        `accepted` is the mask `update` returned for these samples, only
+        those are subtracted. Without it the acceptance test is applied again
+        with the current fit, which may differ from the fit they were
+        absorbed with, so keep the mask when possible.
+        """
+        pair = tuple(pair)
+        if pair not in self._index:
+            raise KeyError(f'Unknown channel pair {pair}')
+        x = np.asarray(up_channel, dtype=np.float64)
+        y = np.asarray(dw_channel, dtype=np.float64) / self.standard
+        if x.shape != y.shape:
+            raise ValueError('Must be two equal length arrays')
+
+        i = self._index[pair]
+        if accepted is None:
+            accepted = self._accepted(i, x, y)
+        else:
+            accepted = np.asarray(accepted, dtype=bool)
+            if accepted.shape != x.shape:
+                raise ValueError('`accepted` must have the shape of the channels')
+            accepted = accepted & np.isfinite(x) & np.isfinite(y)
+        x0, y0 = self._offsets[i]
+        retracted = linear_sums(x - x0, y - y0, accepted)
+        if retracted[0] > self._sums[i, 0]:
+            raise ValueError(f'Cannot retract more samples than absorbed for {pair}')
+        self._sums[i] -= retracted
+        return accepted
+
+    def update_frame(
+            self,
+            cal_df: pd.DataFrame,
+            channels_df: pd.DataFrame,
+            reject: bool = True,
+            qc: pd.DataFrame = None,
+            reject_flags=DEFAULT_REJECT,
+            source: str = None) -> pd.Series:
+        """
+        Absorb the records of a dataset for every Up/Down pair of `channels_df`.
+
+        `qc` are optional `QC` flags of `cal_df` (see `qc.screen()`), samples
+        carrying any of the `reject_flags` are skipped as in `calibrate_pairs()`.
+
+        `source` identifies the dataset, e.g. the content hash of its file. It
+        is kept in `sources` and checkpointed, absorbing the same source twice
+        raises so the same records are not counted twice.
+
+        Returns:
+        --------
+            number of accepted samples per pair.
+        """
+        if source is not None and source in self._sources:
+            raise ValueError(f'Source `{source}` already absorbed')
+        pairs = channels_df.dropna(subset=['Up', 'Down'])
+        # All pairs or none: a failure partway restores the state, so the
+        # source is not recorded with some of its pairs missing
+        state = (list(self._pairs), dict(self._index), self._sums.copy(), self._offsets.copy())
+        accepted = {}
+        try:
+            for up, dw in zip(pairs['Up'], pairs['Down']):
+                x = cal_df[up].to_numpy(dtype=np.float64)
+                if qc is not None:
+                    x = np.where(usable(pair_flags(qc, up, dw), reject_flags), x, np.nan)
+                accepted[(up, dw)] = int(self.update(x, cal_df[dw], (up, dw), reject=reject).sum())
+        except BaseException:
+            self._pairs, self._index, self._sums, self._offsets = state
+            raise
+        if source is not None:
+            self._sources.append(source)
+        return pd.Series(accepted, name='accepted', dtype=np.int64)
+
+    def coefficients(self) -> pd.DataFrame:
+        """
+        Current slope, intercept, R² and sample count of every pair.
+        """
+        slope, intercept, r2 = solve_linear_sums(
+            self._sums, self._offsets[:, 0], self._offsets[:, 1])
+        return pd.DataFrame({
+            'Up': [p[0] for p in self._pairs],
+            'Down': [p[1] for p in self._pairs],
+            'slope': slope,
+            'intercept': intercept,
+            'r2': r2,
+            'n_samples': self._sums[:, 0].astype(np.int64),
+            })
+
+    def save(self, filepath: str):
+        """
+        Checkpoint the state as a `.npz` file.
+        """
+        # Written through a file object so numpy does not append `.npz`
+        with open(filepath, 'wb') as f:
+            np.savez(
+                f,
+                pairs=np.array(self._pairs, dtype=str).reshape(-1, 2),
+                sums=self._sums,
+                offsets=self._offsets,
+                sources=np.array(self._sources, dtype=str),
+                parameters=np.array([self.Threshold, self.min_samples, self.standard], dtype=np.float64),
+                )
+
+    @classmethod
+    def load(cls, filepath: str) -> 'IncrementalCalibrator':
+        with np.load(filepath, allow_pickle=False) as state:
+            Threshold, min_samples, standard = state['parameters']
+            calibrator = cls(Threshold=float(Threshold), min_samples=int(min_samples), standard=float(standard))
+            calibrator._pairs = [tuple(p) for p in state['pairs'].tolist()]
+            calibrator._index = {p: i for i, p in enumerate(calibrator._pairs)}
+            calibrator._sums = state['sums'].copy()
+            calibrator._offsets = state['offsets'].copy()
+            calibrator._sources = state['sources'].tolist()
+        return calibrator
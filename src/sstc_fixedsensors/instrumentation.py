@@ -0,0 +1,211 @@
+"""
+    Lightweight timing and memory instrumentation of the workflow stages.
+
+        profiler = Profiler()
+        with profiler.stage('step01'):
+            ...
+
+        @timed('calibration', profiler)
+        def fit(...): ...
+
+    Every stage aggregates its call count and total, min, max and last wall
+    time. With `trace_memory` the peak memory allocated during the stage is
+    recorded with `tracemalloc`, which is process wide: peaks of stages
+    running at the same time in other sessions are mixed, and tracing slows
+    Python allocations down, so it is meant for debugging only.
+
+    `tracemalloc` has a single peak per process. Before a stage resets it,
+    the peak reached so far is carried over to every open stage, so nested
+    stages (a step and the functions it calls) each get their own peak.
+    Tracing runs while at least one profiler traces memory.
+
+    A disabled profiler hands out a shared `nullcontext`, the cost of an
+    instrumented stage is then one attribute lookup.
+"""
+import contextlib
+import functools
+import json
+import threading
+import time
+import tracemalloc
+import weakref
+
+import pandas as pd
+
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+STAGE_FIELDS = ['count', 'total_s', 'min_s', 'max_s', 'last_s', 'peak_bytes']
+
+# Open traced stages of the process, each one a [carried peak] cell
+_open_stages = []
+# Profilers tracing memory, tracemalloc stops when the last one stops
+_tracers = weakref.WeakSet()
+_tracing_started = False
+_trace_lock = threading.Lock()
+
+
+def _reset_peak() -> list:
+    # Carry the peak reached so far over to the open stages, then reset it
+    with _trace_lock:
+        peak = tracemalloc.get_traced_memory()[1]
+        for cell in _open_stages:
+            cell[0] = max(cell[0], peak)
+        tracemalloc.reset_peak()
+        cell = [0]
+        _open_stages.append(cell)
+        return cell
+
+
+def _close_peak(cell: list) -> int:
+    # Peak of the stage of `cell` since it opened
+    with _trace_lock:
+        _open_stages.remove(cell)
+        return max(cell[0], tracemalloc.get_traced_memory()[1])
+
+
+class Profiler:
+    """
+    Per-stage timing aggregates of one session.
+
+    Parameters:
+    -----------
+        enabled: record the stages, a disabled profiler has no overhead.
+        trace_memory: also record the peak memory of every stage.
+    """
+    def __init__(self, enabled: bool = True, trace_memory: bool = False):
+        self.enabled = enabled
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._trace_memory = False
+        self.trace_memory = trace_memory
+
+    @property
+    def trace_memory(self) -> bool:
+        return self._trace_memory
+
+    @trace_memory.setter
+    def trace_memory(self, value: bool):
+        global _tracing_started
+        with _trace_lock:
+            if value:
+                _tracers.add(self)
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    _tracing_started = True
+            else:
+                _tracers.discard(self)
+                # Tracing started outside (e.g. PYTHONTRACEMALLOC) is left on
+                if not _tracers and _tracing_started and tracemalloc.is_tracing():
+                    tracemalloc.stop()
+                    _tracing_started = False
+            self._trace_memory = bool(value)
+
+    def record(self, name: str, seconds: float, peak_bytes: int = 0):
+        with self._lock:
+            s = self.stages.get(name)
+            if s is None:
+                s = self.stages[name] = {
+                    'count': 0, 'total_s': 0.0, 'min_s': float('inf'), 'max_s': 0.0,
+                    'last_s': 0.0, 'peak_bytes': 0}
+            s['count'] += 1
+            s['total_s'] += seconds
+            s['min_s'] = min(s['min_s'], seconds)
+            s['max_s'] = max(s['max_s'], seconds)
+            s['last_s'] = seconds
+            s['peak_bytes'] = max(s['peak_bytes'], int(peak_bytes))
+
+    @contextlib.contextmanager
+    def _stage(self, name: str):
+        trace = self.trace_memory and tracemalloc.is_tracing()
+        if trace:
+            baseline = tracemalloc.get_traced_memory()[0]
+            cell = _reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak = _close_peak(cell) - baseline if trace else 0
+            self.record(name, seconds, peak)
+
+    def stage(self, name: str):
+        """
+        Context manager timing the enclosed block as stage `name`.
+        """
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._stage(name)
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+
+    def stop_memory_tracing(self):
+        # Tracing goes on while other profilers of the process trace memory
+        self.trace_memory = False
+
+    def summary(self) -> pd.DataFrame:
+        """
+        One row per stage, sorted by total time.
+        """
+        with self._lock:
+            df = pd.DataFrame.from_dict(self.stages, orient='index', columns=STAGE_FIELDS)
+        df['mean_s'] = df['total_s'] / df['count']
+        df.index.name = 'stage'
+        return df.sort_values('total_s', ascending=False)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {name: dict(s) for name, s in self.stages.items()}
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps({'stages': self.to_dict()}, **kwargs)
+
+    def to_prometheus(self, prefix: str = 'sstc', labels: dict = None) -> str:
+        """
+        Stages in the Prometheus text exposition format, one `stage` label
+        per stage plus the optional `labels`.
+        """
+        def fmt(stage: str) -> str:
+            items = dict(labels or {}, stage=stage)
+            escaped = {k: str(v).replace('\\', '\\\\').replace('"', '\\"') for k, v in items.items()}
+            return ','.join(f'{k}="{v}"' for k, v in escaped.items())
+
+        metrics = [
+            ('stage_calls_total', 'counter', 'Number of times the stage ran', 'count'),
+            ('stage_seconds_total', 'counter', 'Total wall time of the stage', 'total_s'),
+            ('stage_seconds_max', 'gauge', 'Longest wall time of the stage', 'max_s'),
+            ('stage_seconds_last', 'gauge', 'Wall time of the last run of the stage', 'last_s'),
+            ('stage_peak_bytes', 'gauge', 'Peak traced memory of the stage', 'peak_bytes'),
+            ]
+        stages = self.to_dict()
+        lines = []
+        for name, kind, help_text, field in metrics:
+            metric = f'{prefix}_{name}'
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for stage, s in stages.items():
+                lines.append(f'{metric}{{{fmt(stage)}}} {s[field]}')
+        return '\n'.join(lines) + '\n'
+
+
+def timed(name: str = None, profiler=None):
+    """
+    Decorator recording every call of the function as a stage.
+
+    `profiler` is a `Profiler` or a callable returning the profiler to use
+    at call time (e.g. the one of the current session), None disables.
+    """
+    def decorator(func):
+        stage_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            p = profiler() if callable(profiler) and not isinstance(profiler, Profiler) else profiler
+            if p is None or not p.enabled:
+                return func(*args, **kwargs)
+            with p.stage(stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,231 @@
+"""
+    Background execution of calibration jobs.
+
+    Fits are submitted to a shared `JobQueue` instead of running inline in the
+    Streamlit script, the session polls the `Job` for its progress and result.
+
+    - Jobs run on a thread pool of `max_workers`, the NumPy kernels of the fits
+      release the GIL so the threads use separate cores.
+    - At most `max_queued` jobs wait for a worker, further submissions raise
+      `QueueFull`.
+    - Each owner (a session, a user) has at most `max_per_user` jobs queued or
+      running, which bounds the cores one user can take.
+    - Jobs are keyed by the hash of their inputs: submitting a key that is
+      already queued or running returns the existing job, and a key found in
+      the result cache returns a finished job without running anything.
+    - Every owner submitting a key subscribes to its job, `cancel(key, owner)`
+      unsubscribes the owner and cancels the job once nobody waits for it.
+
+    The job function receives a `progress(fraction, message)` callback as
+    keyword argument. It raises `JobCancelled` once the job is cancelled, so
+    the function stops at its next progress report.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class QueueFull(Exception):
+    pass
+
+
+class UserLimitReached(Exception):
+    pass
+
+
+class Job:
+    """
+    State of a submitted job, updated by the worker thread.
+    """
+    __slots__ = (
+        'key', 'owner', 'label', 'status', 'progress', 'message', 'result', 'error',
+        'submitted', 'started', 'finished', 'subscribers', '_cancel', '_future')
+
+    def __init__(self, key: str, owner: str, label: str = None):
+        self.key = key
+        self.owner = owner
+        self.label = label or key
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = ''
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.subscribers = {owner}
+        self._cancel = threading.Event()
+        self._future = None
+
+    def __repr__(self) -> str:
+        return f'Job({self.label!r}, status={self.status!r}, progress={self.progress:.2f})'
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def report(self, fraction: float, message: str = ''):
+        """
+        Progress callback handed to the job function.
+        """
+        if self._cancel.is_set():
+            raise JobCancelled(self.label)
+        self.progress = min(max(float(fraction), 0.0), 1.0)
+        self.message = message
+
+    def cancel(self) -> bool:
+        """
+        Cancel a queued job at once, a running one at its next progress report.
+        """
+        if self.done:
+            return False
+        self._cancel.set()
+        if self._future is not None and self._future.cancel():
+            self.status = CANCELLED
+            self.finished = time.time()
+        return True
+
+
+class JobQueue:
+    """
+    Bounded thread pool with per-owner limits and deduplication by key.
+
+    Parameters:
+    -----------
+        max_workers: jobs running at the same time.
+        max_queued: jobs waiting for a worker.
+        max_per_user: jobs queued or running per owner.
+        cache: optional `ResultCache`, results of finished jobs are stored
+            under the job key and served from it on the next submission.
+        max_finished: finished jobs kept for polling before the oldest are
+            forgotten.
+    """
+    def __init__(
+            self,
+            max_workers: int = 2,
+            max_queued: int = 16,
+            max_per_user: int = 1,
+            cache=None,
+            max_finished: int = 64):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.max_per_user = max_per_user
+        self.cache = cache
+        self.max_finished = max_finished
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sstc-job')
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def get(self, key: str) -> Job:
+        return self._jobs.get(key)
+
+    def jobs(self, owner: str = None, active: bool = False) -> list:
+        with self._lock:
+            return [
+                job for job in self._jobs.values()
+                if (owner is None or job.owner == owner) and not (active and job.done)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {status: statuses.count(status) for status in (QUEUED, RUNNING) + FINISHED}
+
+    def submit(self, key: str, owner: str, func, *args, label: str = None, **kwargs) -> Job:
+        """
+        Queue `func(*args, progress=job.report, **kwargs)` under `key`.
+
+        Returns the job already registered for `key` unless it failed or was
+        cancelled, in which case it is submitted again.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.status not in (FAILED, CANCELLED):
+                job.subscribers.add(owner)
+                return job
+
+            _missing = object()
+            cached = _missing if self.cache is None else self.cache.get(key, _missing)
+            if cached is not _missing:
+                job = Job(key, owner, label)
+                job.status, job.progress, job.result = DONE, 1.0, cached
+                job.started = job.finished = time.time()
+                self._register(job)
+                return job
+
+            active = [j for j in self._jobs.values() if not j.done]
+            if sum(j.status == QUEUED for j in active) >= self.max_queued:
+                raise QueueFull(f'{self.max_queued} jobs already waiting')
+            if sum(j.owner == owner for j in active) >= self.max_per_user:
+                raise UserLimitReached(f'{owner} already has {self.max_per_user} jobs queued or running')
+
+            job = Job(key, owner, label)
+            self._register(job)
+            job._future = self._executor.submit(self._run, job, func, args, kwargs)
+            return job
+
+    def _register(self, job: Job):
+        self._jobs[job.key] = job
+        finished = [j for j in self._jobs.values() if j.done]
+        for old in sorted(finished, key=lambda j: j.finished)[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[old.key]
+
+    def _run(self, job: Job, func, args, kwargs):
+        if job._cancel.is_set():
+            job.status, job.finished = CANCELLED, time.time()
+            return
+        job.status, job.started = RUNNING, time.time()
+        try:
+            result = func(*args, progress=job.report, **kwargs)
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.status, job.error = FAILED, e
+        else:
+            if self.cache is not None:
+                self.cache.set(job.key, result)
+            job.result, job.progress, job.status = result, 1.0, DONE
+        job.finished = time.time()
+
+    def cancel(self, key: str, owner: str = None) -> bool:
+        """
+        Unsubscribe `owner` from the job of `key` and cancel the job if no
+        other owner waits for it. Without `owner` the job is cancelled for
+        every subscriber.
+
+        Returns True if the job was cancelled.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                return False
+            if owner is not None:
+                job.subscribers.discard(owner)
+                if job.subscribers:
+                    return False
+            return job.cancel()
+
+    def shutdown(self, wait: bool = True):
+        for job in self.jobs(active=True):
+            job.cancel()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,208 @@
+"""
+    Data quality screening of logger channels before fitting.
+
+    Every sample gets a `uint8` bitmask of `QC` flags computed in one
+    vectorized pass over the `(channels, rows)` array of a file. Flags of the
+    timestamp (duplicates, non monotonic, missing) apply to every channel of
+    the row. Samples are not deleted: the calibration engine is given the
+    flags and ignores the samples carrying any of the `reject` flags.
+
+        flags = screen(cal_df, up_columns=['Up_650'])
+        calibrate_pairs(cal_df, channels_df, qc=flags)
+"""
+import enum
+import warnings
+
+import numpy as np
+import pandas as pd
+
+
+class QC(enum.IntFlag):
+    MISSING = 1                 # NaN, or missing timestamp
+    SENTINEL = 2                # logger error values such as -7999
+    DUPLICATE_TIMESTAMP = 4     # timestamp already seen in an earlier row
+    NONMONOTONIC_TIMESTAMP = 8  # timestamp earlier than a previous row
+    NIGHT = 16                  # sun too low, or Up channel below the low irradiance threshold
+    SATURATED = 32              # sensor clipped at its maximum reading
+    STUCK = 64                  # same value repeated over `stuck_samples` rows
+
+
+# Campbell loggers write -7999 (older OS) or NAN on sensor errors
+SENTINELS = (-7999.0, 7999.0, -9999.0)
+
+# Flags rejected by default. Cross-calibration needs good illumination, so low sun
+# and low irradiance (NIGHT) samples are left out as well
+DEFAULT_REJECT = (
+    QC.MISSING | QC.SENTINEL | QC.DUPLICATE_TIMESTAMP | QC.NONMONOTONIC_TIMESTAMP
+    | QC.NIGHT | QC.SATURATED | QC.STUCK)
+
+
+def timestamp_flags(timestamps) -> np.ndarray:
+    """
+    MISSING, DUPLICATE_TIMESTAMP and NONMONOTONIC_TIMESTAMP flags per row.
+    """
+    t = pd.to_datetime(pd.Series(timestamps)).to_numpy(dtype='datetime64[ns]').view(np.int64)
+    flags = np.zeros(len(t), dtype=np.uint8)
+    missing = t == np.iinfo(np.int64).min
+    flags[missing] |= np.uint8(QC.MISSING)
+
+    valid = np.flatnonzero(~missing)
+    tv = t[valid]
+    _, first = np.unique(tv, return_index=True)
+    duplicate = np.ones(len(tv), dtype=bool)
+    duplicate[first] = False
+    flags[valid[duplicate]] |= np.uint8(QC.DUPLICATE_TIMESTAMP)
+
+    if len(tv) > 1:
+        previous_max = np.maximum.accumulate(tv)[:-1]
+        backwards = np.r_[False, tv[1:] < previous_max]
+        flags[valid[backwards]] |= np.uint8(QC.NONMONOTONIC_TIMESTAMP)
+    return flags
+
+
+def _runs(values: np.ndarray) -> np.ndarray:
+    # Length of the run of equal consecutive values each sample belongs to, along the last axis
+    change = np.ones(values.shape, dtype=bool)
+    change[:, 1:] = values[:, 1:] != values[:, :-1]
+    run_id = np.cumsum(change.ravel()) - 1
+    return np.bincount(run_id)[run_id].reshape(values.shape)
+
+
+def channel_flags(
+        values: np.ndarray,
+        sentinels=SENTINELS,
+        saturation=None,
+        saturation_count: int = 3,
+        stuck_samples: int = 30) -> np.ndarray:
+    """
+    MISSING, SENTINEL, SATURATED and STUCK flags of a `(channels, rows)` array.
+
+    Parameters:
+    -----------
+        saturation: reading (scalar or one per channel) at and above which a
+            sample is saturated. If None, the maximum of a channel counts as
+            saturation when it is reached by at least `saturation_count` samples.
+        stuck_samples: minimum run of identical consecutive readings flagged
+            as STUCK, 0 disables the check.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    flags = np.zeros(values.shape, dtype=np.uint8)
+
+    finite = np.isfinite(values)
+    flags[~finite] |= np.uint8(QC.MISSING)
+    sentinel = np.isin(values, np.asarray(sentinels, dtype=np.float64))
+    flags[sentinel] |= np.uint8(QC.SENTINEL)
+    usable = finite & ~sentinel
+    clean = np.where(usable, values, np.nan)
+
+    if saturation is None:
+        # All-NaN channels warn and give NaN, which flags nothing
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            maximum = np.nanmax(clean, axis=1)
+        at_max = clean == maximum[:, None]
+        clipped = at_max.sum(axis=1) >= saturation_count
+        saturated = at_max & clipped[:, None]
+    else:
+        with np.errstate(invalid='ignore'):
+            saturated = clean >= np.reshape(np.asarray(saturation, dtype=np.float64), (-1, 1))
+    flags[saturated] |= np.uint8(QC.SATURATED)
+
+    if stuck_samples:
+        stuck = usable & (_runs(np.where(usable, values, np.inf)) >= stuck_samples)
+        flags[stuck] |= np.uint8(QC.STUCK)
+    return flags
+
+
+def night_flags(up_values: np.ndarray, threshold=None, fraction: float = 0.05) -> np.ndarray:
+    """
+    NIGHT flags of Up channels reading below `threshold` (scalar or one per
+    channel). If None, the threshold is `fraction` of the 99th percentile of
+    each channel, a robust stand-in for its clear-sky noon level.
+    """
+    up_values = np.atleast_2d(np.asarray(up_values, dtype=np.float64))
+    if threshold is None:
+        # All-NaN channels warn and give NaN, which flags nothing
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            threshold = fraction * np.nanpercentile(up_values, 99, axis=1)
+    threshold = np.reshape(np.asarray(threshold, dtype=np.float64), (-1, 1))
+    with np.errstate(invalid='ignore'):
+        night = up_values < threshold
+    return np.where(night, np.uint8(QC.NIGHT), np.uint8(0))
+
+
+def screen(
+        cal_df: pd.DataFrame,
+        columns: list = None,
+        up_columns: list = None,
+        timestamp_col: str = 'TIMESTAMP',
+        night_threshold=None,
+        solar_zenith=None,
+        max_zenith: float = 80.0,
+        **channel_kwargs) -> pd.DataFrame:
+    """
+    QC flags of every channel of a calibration dataset.
+
+    Parameters:
+    -----------
+        columns: channels to screen, every numeric column but `RECORD` if None.
+        up_columns: channels measuring incoming light, used for the NIGHT
+            flag. The `Up_` prefixed columns if None.
+        night_threshold: see `night_flags()`.
+        solar_zenith: optional solar zenith angle per row (see `solar.py`),
+            rows with a zenith angle above `max_zenith` degrees (sun low or
+            below the horizon) are NIGHT for every channel and the Up
+            channels irradiance is not used.
+        channel_kwargs: passed to `channel_flags()`.
+
+    Returns:
+    --------
+        DataFrame of `uint8` flags with the index of `cal_df` and one column
+        per channel.
+    """
+    if columns is None:
+        columns = [
+            c for c in cal_df.select_dtypes('number').columns
+            if c not in ('RECORD', timestamp_col)]
+    if up_columns is None:
+        up_columns = [c for c in columns if str(c).startswith('Up')]
+
+    values = np.ascontiguousarray(cal_df[columns].to_numpy(dtype=np.float64).T)
+    flags = channel_flags(values, **channel_kwargs)
+    if timestamp_col in cal_df.columns:
+        flags |= timestamp_flags(cal_df[timestamp_col])
+
+    if solar_zenith is not None:
+        with np.errstate(invalid='ignore'):
+            low_sun = ~(np.asarray(solar_zenith, dtype=np.float64) <= max_zenith)
+        flags[:, low_sun] |= np.uint8(QC.NIGHT)
+    else:
+        up_rows = [columns.index(c) for c in up_columns if c in columns]
+        if up_rows:
+            flags[up_rows] |= night_flags(values[up_rows], night_threshold)
+
+    return pd.DataFrame(flags.T, index=cal_df.index, columns=columns, copy=False)
+
+
+def pair_flags(qc: pd.DataFrame, up: str, dw: str) -> np.ndarray:
+    """
+    Flags of an Up/Dw pair, a sample carries the flags of both channels.
+    """
+    return qc[up].to_numpy() | qc[dw].to_numpy()
+
+
+def usable(flags, reject=DEFAULT_REJECT) -> np.ndarray:
+    """
+    True where a sample carries none of the `reject` flags.
+    """
+    return (np.asarray(flags) & np.uint8(reject)) == 0
+
+
+def summary(qc: pd.DataFrame) -> pd.DataFrame:
+    """
+    Number of samples carrying each flag, one row per channel.
+    """
+    values = qc.to_numpy()
+    counts = {flag.name: ((values & np.uint8(flag)) != 0).sum(axis=0) for flag in QC}
+    return pd.DataFrame(counts, index=qc.columns)
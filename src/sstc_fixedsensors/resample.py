@@ -0,0 +1,315 @@
+"""
+    Aggregation of channel time series to regular windows.
+
+    Windows:
+    --------
+        10min, hourly, daily: fixed length windows aligned on UTC (or logger
+            time) midnight, labelled by their start.
+        midday: one window per day around local solar noon, solar time being
+            the timestamp shifted by `longitude / 15` hours (mean solar time).
+
+    Rows are assigned an integer window label, the labels of time-sorted rows
+    are sorted too, so the windows are contiguous runs of rows. Sums, counts
+    and extrema are then one `ufunc.reduceat` over the run starts and medians
+    and quantiles are read from one `lexsort` by (window, value) per channel.
+
+    `Resampler` streams over time-sorted chunks: the rows of the last window
+    of a chunk, which may continue in the next one, are carried over, so a
+    multi-year 1 minute record is aggregated with the memory of one chunk.
+"""
+import numpy as np
+import pandas as pd
+
+
+NS_PER_HOUR = 3600 * 10**9
+NS_PER_DAY = 24 * NS_PER_HOUR
+
+WINDOWS = {
+    '10min': 10 * 60 * 10**9,
+    'hourly': NS_PER_HOUR,
+    'daily': NS_PER_DAY,
+    'midday': NS_PER_DAY,
+    }
+
+STATS = ('mean', 'median', 'min', 'max', 'std', 'count')
+
+
+def window_labels(
+        timestamps: np.ndarray,
+        window: str = '10min',
+        longitude: float = None,
+        midday_hours: tuple = (11, 13),
+        utc_offset: float = 0) -> tuple:
+    """
+    Window label (start of the window, int64 ns) of every timestamp.
+
+    For the midday window, timestamps are in the logger time, `utc_offset`
+    hours ahead of UTC, and labels are the start of the solar day.
+
+    Returns:
+    --------
+        (labels, keep) where `keep` is False for missing timestamps and, for
+        the midday window, for rows outside `midday_hours` of solar time.
+    """
+    if window not in WINDOWS:
+        raise ValueError(f"Unknown window '{window}', expected one of {list(WINDOWS)}")
+    t = np.asarray(timestamps)
+    if np.issubdtype(t.dtype, np.datetime64):
+        t = t.astype('datetime64[ns]').view(np.int64)
+    keep = t != np.iinfo(np.int64).min
+    step = WINDOWS[window]
+
+    if window != 'midday':
+        return t - np.remainder(t, step), keep
+
+    if longitude is None:
+        raise ValueError('The midday window needs the station longitude')
+    solar = t + int(round((longitude / 15 - utc_offset) * NS_PER_HOUR))
+    hour_of_day = np.remainder(solar, NS_PER_DAY)
+    keep &= (hour_of_day >= midday_hours[0] * NS_PER_HOUR) & (hour_of_day < midday_hours[1] * NS_PER_HOUR)
+    return solar - hour_of_day, keep
+
+
+def aggregate(
+        labels: np.ndarray,
+        values: np.ndarray,
+        stats: tuple = ('mean', 'median', 'count'),
+        quantiles: tuple = ()) -> tuple:
+    """
+    Statistics of `values` of shape `(channels, rows)` per window of sorted `labels`.
+
+    Non finite values are ignored, windows without valid values get NaN and
+    a count of 0.
+
+    Returns:
+    --------
+        (window labels, {stat: array of shape (channels, windows)}) with the
+        quantiles keyed as `q<percent>`, e.g. `q25`. The valid `count` is
+        always included.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    if len(labels) == 0:
+        empty = np.empty((values.shape[0], 0))
+        keys = list(stats) + [f'q{q * 100:g}' for q in quantiles] + ['count']
+        return labels[:0], {k: empty for k in keys}
+
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    sizes = np.diff(np.r_[starts, len(labels)])
+    finite = np.isfinite(values)
+    count = np.add.reduceat(finite.astype(np.int64), starts, axis=1)
+
+    results = {}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if 'mean' in stats or 'std' in stats:
+            clean = np.where(finite, values, 0.0)
+            mean = np.add.reduceat(clean, starts, axis=1) / count
+            if 'mean' in stats:
+                results['mean'] = mean
+            if 'std' in stats:
+                squares = np.add.reduceat(clean * clean, starts, axis=1)
+                variance = (squares - count * mean * mean) / (count - 1)
+                results['std'] = np.sqrt(np.maximum(variance, 0.0))
+        if 'min' in stats:
+            results['min'] = np.minimum.reduceat(np.where(finite, values, np.inf), starts, axis=1)
+            results['min'][count == 0] = np.nan
+        if 'max' in stats:
+            results['max'] = np.maximum.reduceat(np.where(finite, values, -np.inf), starts, axis=1)
+            results['max'][count == 0] = np.nan
+
+    levels = ([0.5] if 'median' in stats else []) + list(quantiles)
+    if levels:
+        window = np.repeat(np.arange(len(starts)), sizes)
+        ordered = {q: np.empty((values.shape[0], len(starts))) for q in levels}
+        for c in range(values.shape[0]):
+            # NaN sorts last within each window, the first `count` values are valid
+            v = values[c][np.lexsort((values[c], window))]
+            n = count[c]
+            for q in levels:
+                position = starts + q * np.maximum(n - 1, 0)
+                lo = np.floor(position).astype(np.int64)
+                hi = np.ceil(position).astype(np.int64)
+                with np.errstate(invalid='ignore'):
+                    ordered[q][c] = np.where(n > 0, v[lo] + (position - lo) * (v[hi] - v[lo]), np.nan)
+        if 'median' in stats:
+            results['median'] = ordered[0.5]
+        for q in quantiles:
+            results[f'q{q * 100:g}'] = ordered[q]
+
+    results['count'] = count
+    return labels[starts], results
+
+
+class Resampler:
+    """
+    Streaming aggregation of time-sorted chunks to regular windows.
+
+    Parameters:
+    -----------
+        window: one of `WINDOWS`.
+        columns: channels to aggregate, every numeric column of the first
+            chunk but `RECORD` if None.
+        stats: subset of `STATS`.
+        quantiles: extra quantiles in [0, 1], e.g. (0.25, 0.75).
+        longitude: station longitude, required by the midday window.
+        midday_hours: solar time span of the midday window.
+        utc_offset: hours the logger time is ahead of UTC, for the midday window.
+        interval: logging interval (Timedelta or string), inferred from the
+            first chunk if None. Sets the `expected` samples per window.
+        min_coverage: windows of a channel with fewer valid values than
+            this fraction of `expected` get NaN statistics (count is kept).
+        fill_gaps: emit empty windows (count 0) for windows without rows.
+        timestamp_col: name of the timestamp column.
+    """
+    def __init__(
+            self,
+            window: str = '10min',
+            columns: list = None,
+            stats: tuple = ('mean', 'median', 'count'),
+            quantiles: tuple = (),
+            longitude: float = None,
+            midday_hours: tuple = (11, 13),
+            utc_offset: float = 0,
+            interval=None,
+            min_coverage: float = 0.0,
+            fill_gaps: bool = False,
+            timestamp_col: str = 'TIMESTAMP'):
+        unknown = set(stats) - set(STATS)
+        if unknown:
+            raise ValueError(f'Unknown statistics {sorted(unknown)}, expected a subset of {STATS}')
+        if window == 'midday' and longitude is None:
+            raise ValueError('The midday window needs the station longitude')
+        self.window = window
+        self.columns = None if columns is None else list(columns)
+        self.stats = tuple(stats)
+        self.quantiles = tuple(quantiles)
+        self.longitude = longitude
+        self.midday_hours = midday_hours
+        self.utc_offset = utc_offset
+        self.interval = None if interval is None else pd.Timedelta(interval).value
+        self.min_coverage = min_coverage
+        self.fill_gaps = fill_gaps
+        self.timestamp_col = timestamp_col
+        self.late_rows = 0
+        self._carry = None
+        self._last_label = None
+        self._seen = np.empty(0, dtype=np.int64)
+
+    @property
+    def expected(self) -> float:
+        # Samples a complete window holds at the logging interval
+        if not self.interval:
+            return np.nan
+        if self.window == 'midday':
+            length = (self.midday_hours[1] - self.midday_hours[0]) * NS_PER_HOUR
+        else:
+            length = WINDOWS[self.window]
+        return length / self.interval
+
+    def _prepare(self, chunk: pd.DataFrame) -> tuple:
+        if self.columns is None:
+            self.columns = [
+                c for c in chunk.select_dtypes('number').columns
+                if c not in ('RECORD', self.timestamp_col)]
+
+        t = pd.to_datetime(chunk[self.timestamp_col]).to_numpy(dtype='datetime64[ns]').view(np.int64)
+        if self.interval is None:
+            # Chunks too short to show a spacing are joined to the rows seen before
+            valid = np.sort(np.r_[self._seen, t[t != np.iinfo(np.int64).min]])
+            spacing = np.diff(valid)
+            spacing = spacing[spacing > 0]
+            if len(spacing):
+                self.interval = int(np.median(spacing))
+            else:
+                self._seen = valid[-1:]
+
+        labels, keep = window_labels(
+            t, self.window, self.longitude, self.midday_hours, self.utc_offset)
+        values = chunk[self.columns].to_numpy(dtype=np.float64).T
+        labels, values = labels[keep], values[:, keep]
+        order = np.argsort(labels, kind='stable')
+        return labels[order], values[:, order]
+
+    def _emit(self, labels: np.ndarray, values: np.ndarray) -> pd.DataFrame:
+        window_starts, results = aggregate(labels, values, self.stats, self.quantiles)
+        expected = self.expected
+
+        counts = results['count'] if 'count' in self.stats else results.pop('count')
+        if self.min_coverage > 0 and np.isfinite(expected):
+            sparse = counts < self.min_coverage * expected
+            for stat, array in results.items():
+                if stat != 'count':
+                    array[sparse] = np.nan
+
+        columns = {}
+        for c, channel in enumerate(self.columns or []):
+            for stat, array in results.items():
+                columns[f'{channel}_{stat}'] = array[c]
+        index = pd.DatetimeIndex(window_starts.view('datetime64[ns]'), name=self.timestamp_col)
+        df = pd.DataFrame(columns, index=index)
+        df['expected'] = expected
+
+        if self.fill_gaps and len(window_starts):
+            step = WINDOWS[self.window]
+            first = window_starts[0] if self._last_label is None else self._last_label + step
+            # Integer count, `np.arange` over ~1e18 ns bounds rounds its length in float
+            n_windows = max((int(window_starts[-1]) - int(first)) // step + 1, 0)
+            full = pd.DatetimeIndex(
+                (first + step * np.arange(n_windows, dtype=np.int64)).view('datetime64[ns]'),
+                name=self.timestamp_col)
+            df = df.reindex(full)
+            df['expected'] = expected
+            for column in df.columns:
+                if column.endswith('_count'):
+                    df[column] = df[column].fillna(0).astype(np.int64)
+        if len(window_starts):
+            self._last_label = int(window_starts[-1])
+        return df
+
+    def update(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """
+        Aggregate a chunk, returns the windows that are complete: every
+        window but the last one, which is carried over to the next chunk.
+        """
+        labels, values = self._prepare(chunk)
+        if self._carry is not None:
+            labels = np.concatenate([self._carry[0], labels])
+            values = np.concatenate([self._carry[1], values], axis=1)
+            order = np.argsort(labels, kind='stable')
+            labels, values = labels[order], values[:, order]
+
+        if self._last_label is not None:
+            # Rows of windows already emitted cannot be merged anymore
+            late = labels <= self._last_label
+            self.late_rows += int(late.sum())
+            labels, values = labels[~late], values[:, ~late]
+
+        if len(labels) == 0:
+            self._carry = None
+            return self._emit(labels, values)
+
+        split = int(np.searchsorted(labels, labels[-1], side='left'))
+        self._carry = (labels[split:], values[:, split:])
+        return self._emit(labels[:split], values[:, :split])
+
+    def flush(self) -> pd.DataFrame:
+        """
+        Aggregate the carried over window, call once after the last chunk.
+        """
+        if self._carry is None:
+            return self._emit(np.empty(0, dtype=np.int64), np.empty((len(self.columns or []), 0)))
+        labels, values = self._carry
+        self._carry = None
+        return self._emit(labels, values)
+
+
+def resample(chunks, **kwargs) -> pd.DataFrame:
+    """
+    Aggregate a DataFrame, or an iterable of time-sorted DataFrame chunks
+    (e.g. `read_toa5(..., chunksize=...)`), see `Resampler` for the options.
+    """
+    if isinstance(chunks, pd.DataFrame):
+        chunks = [chunks]
+    resampler = Resampler(**kwargs)
+    parts = [resampler.update(chunk) for chunk in chunks]
+    parts.append(resampler.flush())
+    return pd.concat([p for p in parts if len(p)] or parts[-1:])
@@ -0,0 +1,246 @@
+"""
+    Robust line fitting engines for the Up/Dw cross-calibration.
+
+    Alternatives to the iterative outlier rejection of `calibration()` with a
+    bounded cost on large inputs:
+
+        huber:     iteratively reweighted least squares with Huber weights,
+                   at most `Iter` passes over the samples.
+        theil-sen: median of pairwise slopes, computed over at most `n_slopes`
+                   pairs drawn at random when the data has more.
+        ransac:    consensus of lines through two random samples, a fixed
+                   budget of `max_trials` candidates scored on at most
+                   `max_score_samples` samples.
+
+    Every engine returns the same diagnostics as the iterative rejection:
+    slope, intercept, r2, n_samples, iterations, converged and the inliers
+    mask over the input samples. A sample is an inlier when its residual
+    relative to the mean fitted value is below `Threshold`, the acceptance
+    criterion of `calibration()`. `r2` and `n_samples` refer to the inliers.
+
+    Random draws come from `numpy.random.default_rng(seed)`, the same seed
+    always gives the same result.
+"""
+import numpy as np
+
+from sstc_fixedsensors.calibration import linear_sums, solve_linear_sums
+
+
+# Normal consistency constant of the median absolute deviation
+MAD_SCALE = 1.4826
+
+
+def _finite(x, y) -> tuple:
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if x.shape != y.shape or x.ndim != 1:
+        raise ValueError('Must be two equal length 1-D arrays')
+    finite = np.isfinite(x) & np.isfinite(y)
+    return x, y, finite
+
+
+def _result(x, y, finite, slope, intercept, Threshold, iterations, converged) -> dict:
+    # Inliers and their r2 for the fitted line, over the full input series
+    yfit = slope * x + intercept
+    mean_yfit = abs(np.mean(yfit[finite])) if finite.any() else np.nan
+    with np.errstate(invalid='ignore'):
+        mask = finite & (np.abs(yfit - y) <= Threshold * mean_yfit)
+    x0 = x[mask].mean() if mask.any() else 0.0
+    y0 = y[mask].mean() if mask.any() else 0.0
+    _, _, r2 = solve_linear_sums(linear_sums(x[mask] - x0, y[mask] - y0))
+
+    return {
+        'slope': float(slope),
+        'intercept': float(intercept),
+        'r2': float(r2),
+        'n_samples': int(mask.sum()),
+        'iterations': int(iterations),
+        'converged': bool(converged),
+        'mask': mask,
+        }
+
+
+def _ols(x: np.ndarray, y: np.ndarray, w: np.ndarray = None) -> tuple:
+    # (Weighted) least squares line in coordinates centered on the means
+    if w is None:
+        x0, y0 = x.mean(), y.mean()
+        sums = linear_sums(x - x0, y - y0)
+    else:
+        sw = w.sum()
+        x0, y0 = (w * x).sum() / sw, (w * y).sum() / sw
+        dx, dy = x - x0, y - y0
+        wdx = w * dx
+        sums = np.array([sw, wdx.sum(), (w * dy).sum(), (wdx * dx).sum(), (wdx * dy).sum(), 0.0])
+    slope, intercept, _ = solve_linear_sums(sums, x0, y0)
+    return float(slope), float(intercept)
+
+
+def huber(x, y, Threshold=0.03, Iter=100, delta=1.345, tol=1e-8) -> dict:
+    """
+    Huber regression by iteratively reweighted least squares.
+
+    Residuals within `delta` robust standard deviations (MAD) keep their full
+    weight, larger ones are downweighted by `delta * scale / |residual|`.
+    Starts from the ordinary least squares line and stops when the relative
+    change of slope and intercept is below `tol`, or after `Iter` passes.
+    """
+    x, y, finite = _finite(x, y)
+    xf, yf = x[finite], y[finite]
+    if len(xf) < 2:
+        return _result(x, y, finite, np.nan, np.nan, Threshold, 0, False)
+
+    slope, intercept = _ols(xf, yf)
+    converged = False
+    iterations = 0
+    w = np.empty_like(xf)
+    for iterations in range(1, Iter + 1):
+        r = yf - (slope * xf + intercept)
+        scale = MAD_SCALE * np.median(np.abs(r - np.median(r)))
+        if scale == 0:
+            converged = True
+            break
+
+        np.abs(r, out=w)
+        with np.errstate(divide='ignore'):
+            np.divide(delta * scale, w, out=w)
+        np.minimum(w, 1.0, out=w)
+        new_slope, new_intercept = _ols(xf, yf, w)
+
+        change = max(
+            abs(new_slope - slope) / max(abs(slope), tol),
+            abs(new_intercept - intercept) / max(abs(intercept), abs(new_slope * xf.mean()), tol))
+        slope, intercept = new_slope, new_intercept
+        if change < tol:
+            converged = True
+            break
+
+    return _result(x, y, finite, slope, intercept, Threshold, iterations, converged)
+
+
+def theil_sen(x, y, Threshold=0.03, n_slopes=100_000, seed=0) -> dict:
+    """
+    Theil–Sen estimator: median of the slopes between pairs of samples.
+
+    All pairs are used when there are at most `n_slopes` of them, otherwise
+    `n_slopes` pairs are drawn at random, so the cost is bounded by
+    `O(n_slopes + samples)`. The intercept is the median of `y - slope * x`.
+    """
+    x, y, finite = _finite(x, y)
+    xf, yf = x[finite], y[finite]
+    m = len(xf)
+    if m < 2:
+        return _result(x, y, finite, np.nan, np.nan, Threshold, 0, False)
+
+    if m * (m - 1) // 2 <= n_slopes:
+        i, j = np.triu_indices(m, k=1)
+    else:
+        rng = np.random.default_rng(seed)
+        i, j = rng.integers(0, m, size=(2, n_slopes))
+
+    dx = xf[j] - xf[i]
+    valid = dx != 0
+    if not valid.any():
+        return _result(x, y, finite, np.nan, np.nan, Threshold, 1, False)
+
+    slope = np.median((yf[j][valid] - yf[i][valid]) / dx[valid])
+    intercept = np.median(yf - slope * xf)
+    return _result(x, y, finite, slope, intercept, Threshold, 1, True)
+
+
+def ransac(
+        x,
+        y,
+        Threshold=0.03,
+        max_trials=1000,
+        probability=0.99,
+        max_score_samples=100_000,
+        seed=0) -> dict:
+    """
+    RANSAC line fit with a fixed budget of `max_trials` candidate lines.
+
+    Each candidate passes through two random samples and is scored by its
+    number of inliers. Candidates are evaluated in vectorized blocks and the
+    search stops early once enough trials were drawn to find an all-inlier
+    pair with `probability`, given the best inlier ratio so far; `converged`
+    tells whether that happened within the budget. Scoring uses a random
+    subsample of at most `max_score_samples`, the final line is the least
+    squares fit of the inliers of the best candidate over all the samples.
+    """
+    x, y, finite = _finite(x, y)
+    xf, yf = x[finite], y[finite]
+    m = len(xf)
+    if m < 2:
+        return _result(x, y, finite, np.nan, np.nan, Threshold, 0, False)
+
+    rng = np.random.default_rng(seed)
+    if m > max_score_samples:
+        subset = np.sort(rng.choice(m, size=max_score_samples, replace=False))
+        xs, ys = xf[subset], yf[subset]
+    else:
+        xs, ys = xf, yf
+
+    # Candidates per block keep the residual matrix around 32 MiB
+    block = max(1, min(max_trials, (1 << 22) // len(xs)))
+    best_count, best_line = -1, (np.nan, np.nan)
+    required = max_trials
+    trials = 0
+    while trials < min(max_trials, required):
+        size = min(block, max_trials - trials)
+        i, j = rng.integers(0, m, size=(2, size))
+        trials += size
+
+        dx = xf[j] - xf[i]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slopes = (yf[j] - yf[i]) / dx
+        intercepts = yf[i] - slopes * xf[i]
+        valid = np.isfinite(slopes)
+        if not valid.any():
+            continue
+        slopes, intercepts = slopes[valid], intercepts[valid]
+
+        residuals = np.multiply.outer(slopes, xs)
+        residuals += intercepts[:, None]
+        tolerance = Threshold * np.abs(slopes * xs.mean() + intercepts)
+        residuals -= ys
+        np.abs(residuals, out=residuals)
+        counts = (residuals <= tolerance[:, None]).sum(axis=1)
+        del residuals
+
+        k = int(np.argmax(counts))
+        if counts[k] > best_count:
+            best_count = int(counts[k])
+            best_line = (slopes[k], intercepts[k])
+            inlier_ratio = best_count / len(xs)
+            if inlier_ratio >= 1:
+                required = 0
+            elif inlier_ratio > 0:
+                required = int(np.ceil(np.log(1 - probability) / np.log(1 - inlier_ratio ** 2)))
+
+    slope, intercept = best_line
+    converged = best_count >= 2 and trials >= required
+    if best_count >= 2:
+        yfit = slope * xf + intercept
+        inliers = np.abs(yfit - yf) <= Threshold * abs(yfit.mean())
+        if inliers.sum() >= 2:
+            slope, intercept = _ols(xf[inliers], yf[inliers])
+
+    return _result(x, y, finite, slope, intercept, Threshold, trials, converged)
+
+
+METHODS = {
+    'huber': huber,
+    'theil-sen': theil_sen,
+    'ransac': ransac,
+    }
+
+
+def robust_fit(x, y, method: str, Threshold=0.03, Iter=100, seed=0) -> dict:
+    """
+    Fit with one of `METHODS`. `Iter` bounds the Huber passes, `seed` the
+    random draws of Theil–Sen and RANSAC.
+    """
+    if method == 'huber':
+        return huber(x, y, Threshold=Threshold, Iter=Iter)
+    if method in METHODS:
+        return METHODS[method](x, y, Threshold=Threshold, seed=seed)
+    raise ValueError(f"Unknown method '{method}', expected 'iterative' or one of {list(METHODS)}")
@@ -1,2 +1,17 @@
 # Decagon sensors always 2 channels RED (630nm) & NIR (800 nm)
 # Spectral reflectance sensor for NDVI [https://www.metergroup.co.jp/product/pdf/SRS-N%20Integrators%20Guide.pdf]
+
+
+# Center wavelength and bandwidth (FWHM) of the SRS sensors, in nm
+SRS_NDVI_BANDS = {
+    'red': (650.0, 10.0),
+    'nir': (810.0, 10.0),
+    }
+
+SRS_PRI_BANDS = {
+    '531': (532.0, 10.0),
+    '570': (570.0, 10.0),
+    }
+
+# Center wavelengths (nm) offered for Decagon sensors in the channels configuration
+NOMINAL_CENTER_WAVELENGTHS_NM = [531, 532, 570, 650, 800, 810, 830]
@@ -0,0 +1,218 @@
+"""
+    Spectral harmonization of sensor bands.
+
+    Bands of the same nominal wavelength are not comparable across brands: a
+    Skye 643.3 nm channel 50.5 nm wide integrates a different part of the
+    spectrum than a Decagon 650 nm channel 10 nm wide. Every band is modelled
+    by a Gaussian spectral response function (SRF) with the datasheet center
+    and bandwidth (FWHM) of the registry, `DEFAULT_FWHM_NM` when the datasheet
+    gives none, sampled on the shared `WAVELENGTH_GRID_NM`.
+
+    The SRFs of a set of bands are the rows of a weight matrix normalized to a
+    unit sum, so the band values of many spectra are one matrix multiply:
+
+        W = response_matrix(centers, fwhms)         # (bands, grid)
+        band_values = spectra @ W.T                  # (spectra, bands)
+
+    Adjustment factors map each channel to a target band (by default the
+    Decagon SRS bands) from reference spectra, e.g. canopy reflectances of a
+    spectral library. Applying them to a station-year of channels is a
+    broadcast multiply of the `(channels, timestamps)` array.
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from sstc_fixedsensors.sensors.decagon import SRS_NDVI_BANDS, SRS_PRI_BANDS
+from sstc_fixedsensors.sensors.registry import get_registry
+
+
+# Shared wavelength grid, 1 nm steps over the bands of the registry
+WAVELENGTH_GRID_NM = np.arange(350.0, 1801.0, 1.0)
+
+# FWHM assumed for bands without a datasheet bandwidth
+DEFAULT_FWHM_NM = 10.0
+
+# Bands the channels are harmonized to by default: {name: (center, FWHM)} in nm
+TARGET_BANDS = {
+    'red': SRS_NDVI_BANDS['red'],
+    'nir': SRS_NDVI_BANDS['nir'],
+    '531': SRS_PRI_BANDS['531'],
+    '570': SRS_PRI_BANDS['570'],
+    }
+
+FWHM_TO_SIGMA = 1.0 / (2.0 * np.sqrt(2.0 * np.log(2.0)))
+
+
+def response_matrix(
+        centers_nm,
+        fwhms_nm,
+        grid_nm: np.ndarray = WAVELENGTH_GRID_NM,
+        weights: np.ndarray = None) -> np.ndarray:
+    """
+    Gaussian SRFs of the bands sampled on `grid_nm`, shape `(bands, grid)`.
+
+    Parameters:
+    -----------
+        centers_nm, fwhms_nm: center and full width at half maximum of every
+            band, NaN widths are replaced by `DEFAULT_FWHM_NM`.
+        weights: optional spectral weighting on the grid, e.g. the incoming
+            irradiance for band reflectances `sum(SRF * E * R) / sum(SRF * E)`.
+
+    Returns:
+    --------
+        Rows normalized to a unit sum, so `spectra @ W.T` are band averages.
+    """
+    centers = np.atleast_1d(np.asarray(centers_nm, dtype=np.float64))
+    fwhms = np.broadcast_to(np.asarray(fwhms_nm, dtype=np.float64), centers.shape)
+    fwhms = np.where(np.isfinite(fwhms) & (fwhms > 0), fwhms, DEFAULT_FWHM_NM)
+
+    sigma = fwhms[:, None] * FWHM_TO_SIGMA
+    W = np.exp(-0.5 * ((grid_nm[None, :] - centers[:, None]) / sigma) ** 2)
+    if weights is not None:
+        W *= np.asarray(weights, dtype=np.float64)[None, :]
+    W /= W.sum(axis=1, keepdims=True)
+    return W
+
+
+def resample_spectra(wavelengths_nm, spectra, grid_nm: np.ndarray = WAVELENGTH_GRID_NM) -> np.ndarray:
+    """
+    Spectra of shape `(spectra, wavelengths)` interpolated to `grid_nm`,
+    zero outside the measured range.
+    """
+    wavelengths = np.asarray(wavelengths_nm, dtype=np.float64)
+    spectra = np.atleast_2d(np.asarray(spectra, dtype=np.float64))
+    order = np.argsort(wavelengths)
+    wavelengths, spectra = wavelengths[order], spectra[:, order]
+
+    # Linear interpolation weights shared by every spectrum, then one gather
+    i = np.clip(np.searchsorted(wavelengths, grid_nm) - 1, 0, len(wavelengths) - 2)
+    frac = (grid_nm - wavelengths[i]) / (wavelengths[i + 1] - wavelengths[i])
+    out = spectra[:, i] * (1 - frac) + spectra[:, i + 1] * frac
+    out[:, (grid_nm < wavelengths[0]) | (grid_nm > wavelengths[-1])] = 0.0
+    return out
+
+
+def band_values(spectra: np.ndarray, W: np.ndarray) -> np.ndarray:
+    """
+    Band values `(spectra, bands)` of grid spectra `(spectra, grid)`.
+    """
+    return np.atleast_2d(spectra) @ W.T
+
+
+def channel_responses(channels_df: pd.DataFrame, serial: int = None) -> pd.DataFrame:
+    """
+    Center and FWHM of the band of every channel of a channels configuration.
+
+    The registry band is looked up by `serial` (nearest center of that
+    sensor within `2 * DEFAULT_FWHM_NM`, for the channels of its brand, e.g.
+    the Skye 643.3 nm band for an `Up_650` channel), else by the nominal
+    wavelength and the `sensor_model` brand. The first band with a datasheet
+    bandwidth wins. A band of another nominal wavelength is never taken for
+    a sensor of unknown serial: the remaining channels get their nominal
+    wavelength and `DEFAULT_FWHM_NM` with a warning, their harmonization is
+    approximate.
+
+    Returns:
+    --------
+        DataFrame with the index of `channels_df` and the columns Up,
+        center_wavelength_nm and fwhm_nm.
+    """
+    registry = get_registry()
+    serial_bands = registry.by_serial(serial) if serial is not None else ()
+    centers, fwhms, unresolved = [], [], []
+    for _, row in channels_df.iterrows():
+        wavelength = row.get('center_wavelength_nm')
+        if wavelength is None or pd.isna(wavelength):
+            bands = registry.match_channel(row['Up'])
+            wavelength = bands[0].nominal_wavelength_nm if bands else np.nan
+        wavelength = float(wavelength)
+
+        brand = row.get('sensor_model')
+        if brand is not None and pd.isna(brand):
+            brand = None
+        candidates = []
+        own_bands = [b for b in serial_bands if brand is None or b.brand == brand]
+        if own_bands and np.isfinite(wavelength):
+            nearest = min(own_bands, key=lambda b: abs(b.center_wavelength_nm - wavelength))
+            if abs(nearest.center_wavelength_nm - wavelength) <= 2 * DEFAULT_FWHM_NM:
+                candidates = [nearest]
+        if not candidates and np.isfinite(wavelength):
+            candidates = [
+                b for b in registry.by_wavelength(wavelength)
+                if brand is None or b.brand == brand]
+        with_bandwidth = [b for b in candidates if np.isfinite(b.bandwidth_nm)]
+        band = with_bandwidth[0] if with_bandwidth else None
+        if band is None:
+            unresolved.append(row['Up'])
+        centers.append(band.center_wavelength_nm if band else wavelength)
+        fwhms.append(band.bandwidth_nm if band else DEFAULT_FWHM_NM)
+
+    if unresolved:
+        warnings.warn(
+            f'No datasheet bandwidth for the channels {unresolved}, '
+            f'a {DEFAULT_FWHM_NM} nm FWHM is assumed', stacklevel=2)
+    return pd.DataFrame(
+        {'Up': channels_df['Up'], 'center_wavelength_nm': centers, 'fwhm_nm': fwhms},
+        index=channels_df.index)
+
+
+def adjustment_factors(
+        source: pd.DataFrame,
+        reference_spectra: np.ndarray,
+        targets: dict = TARGET_BANDS,
+        grid_nm: np.ndarray = WAVELENGTH_GRID_NM,
+        weights: np.ndarray = None) -> pd.DataFrame:
+    """
+    Factors bringing every source band to the nearest target band.
+
+    For each source band the factor is the least squares ratio through the
+    origin `sum(t * s) / sum(s * s)` of the target `t` and source `s` band
+    values of the reference spectra.
+
+    Parameters:
+    -----------
+        source: `channel_responses()` output, or any DataFrame with the
+            columns center_wavelength_nm and fwhm_nm.
+        reference_spectra: spectra `(spectra, grid)` on `grid_nm`, see
+            `resample_spectra()`.
+        targets: {name: (center, FWHM)} of the target bands.
+        weights: optional spectral weighting, see `response_matrix()`.
+
+    Returns:
+    --------
+        `source` with the columns target, target_center_nm, factor and
+        factor_std (spread of the per-spectrum ratios).
+    """
+    names = list(targets)
+    target_centers = np.array([targets[n][0] for n in names], dtype=np.float64)
+    target_fwhms = np.array([targets[n][1] for n in names], dtype=np.float64)
+    source_centers = source['center_wavelength_nm'].to_numpy(dtype=np.float64)
+
+    nearest = np.abs(source_centers[:, None] - target_centers[None, :]).argmin(axis=1)
+    W_source = response_matrix(source_centers, source['fwhm_nm'].to_numpy(dtype=np.float64), grid_nm, weights)
+    W_target = response_matrix(target_centers[nearest], target_fwhms[nearest], grid_nm, weights)
+
+    # Both band sets in one multiply: (spectra, 2 * bands)
+    values = band_values(reference_spectra, np.vstack([W_source, W_target]))
+    s, t = values[:, :len(source)], values[:, len(source):]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factor = (t * s).sum(axis=0) / (s * s).sum(axis=0)
+        ratio_std = np.nanstd(t / s, axis=0)
+
+    result = source.copy()
+    result['target'] = [names[i] for i in nearest]
+    result['target_center_nm'] = target_centers[nearest]
+    result['factor'] = factor
+    result['factor_std'] = ratio_std
+    return result
+
+
+def harmonize(values: np.ndarray, factors, out: np.ndarray = None) -> np.ndarray:
+    """
+    Channels `(channels, timestamps)` multiplied by one factor per channel.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    factors = np.asarray(factors, dtype=np.float64)
+    return np.multiply(values, factors.reshape(factors.shape + (1,) * (values.ndim - factors.ndim)), out=out)
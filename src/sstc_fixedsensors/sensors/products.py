@@ -0,0 +1,205 @@
+"""
+    Reflectance and spectral indices from calibrated Up/Dw channel pairs.
+
+    The Up channel is brought to the Dw channel scale with the calibration
+    coefficients, the reflectance of the band is then
+
+        R = Dw / (slope * Up + intercept)
+
+    and the indices are normalized differences of band reflectances:
+
+        NDVI = (R_nir - R_red) / (R_nir + R_red)
+        PRI  = (R_531 - R_570) / (R_531 + R_570)
+
+    Every function works on whole arrays, 1-D time series or 2-D arrays of
+    shape `(channels, timestamps)`, and accepts preallocated `out` buffers.
+"""
+import numpy as np
+import pandas as pd
+
+from sstc_fixedsensors.sensors.decagon import SRS_NDVI_BANDS, SRS_PRI_BANDS
+from sstc_fixedsensors.sensors.skye import SKR1850_CHANNELS
+
+
+_SKYE_CENTERS_NM = [c for channels in SKR1850_CHANNELS.values() for c, _ in channels.values()]
+
+
+def _span(centers: list, margin: float) -> tuple:
+    return min(centers) - margin, max(centers) + margin
+
+
+# Center wavelength ranges (nm) accepted for the bands of each index, spanning
+# the Decagon SRS and Skye SKR1850 band definitions with a margin
+INDEX_BANDS_NM = {
+    'NDVI': {
+        'red': _span([SRS_NDVI_BANDS['red'][0]] + [c for c in _SKYE_CENTERS_NM if 600 < c < 700], 30),
+        'nir': _span([SRS_NDVI_BANDS['nir'][0]] + [c for c in _SKYE_CENTERS_NM if c > 750], 30),
+        },
+    'PRI': {
+        '531': _span([SRS_PRI_BANDS['531'][0]] + [c for c in _SKYE_CENTERS_NM if 525 < c < 540], 5),
+        '570': _span([SRS_PRI_BANDS['570'][0]] + [c for c in _SKYE_CENTERS_NM if 560 < c < 580], 5),
+        },
+    }
+
+
+def _expand(coefficient, ndim: int) -> np.ndarray:
+    # Per-channel coefficients broadcast along the time axis
+    coefficient = np.asarray(coefficient, dtype=np.float64)
+    return coefficient.reshape(coefficient.shape + (1,) * (ndim - coefficient.ndim))
+
+
+def reflectance(up_channel, dw_channel, slope, intercept, out: np.ndarray = None) -> np.ndarray:
+    """
+    Band reflectance `Dw / (slope * Up + intercept)`.
+
+    `slope` and `intercept` are scalars or one value per channel when the
+    channels are 2-D arrays of shape `(channels, timestamps)`.
+    """
+    up = np.asarray(up_channel, dtype=np.float64)
+    dw = np.asarray(dw_channel, dtype=np.float64)
+    if out is None:
+        out = np.empty(np.broadcast_shapes(up.shape, dw.shape), dtype=np.float64)
+
+    np.multiply(up, _expand(slope, up.ndim), out=out)
+    out += _expand(intercept, up.ndim)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(dw, out, out=out)
+    return out
+
+
+def normalized_difference(a, b, out: np.ndarray = None, work: np.ndarray = None) -> np.ndarray:
+    """
+    `(a - b) / (a + b)`, `work` is an optional scratch buffer of the output shape.
+    """
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    shape = np.broadcast_shapes(a.shape, b.shape)
+    if out is None:
+        out = np.empty(shape, dtype=np.float64)
+    if work is None:
+        work = np.empty(shape, dtype=np.float64)
+
+    np.add(a, b, out=work)
+    np.subtract(a, b, out=out)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(out, work, out=out)
+    return out
+
+
+def ndvi(red, nir, out: np.ndarray = None, work: np.ndarray = None) -> np.ndarray:
+    return normalized_difference(nir, red, out=out, work=work)
+
+
+def pri(r531, r570, out: np.ndarray = None, work: np.ndarray = None) -> np.ndarray:
+    return normalized_difference(r531, r570, out=out, work=work)
+
+
+INDICES = {
+    'NDVI': (ndvi, ('red', 'nir')),
+    'PRI': (pri, ('531', '570')),
+    }
+
+
+def _channel_wavelength(row: pd.Series) -> float:
+    wavelength = row.get('center_wavelength_nm')
+    if wavelength is not None and pd.notna(wavelength):
+        return float(wavelength)
+    # Naming convention: Up_<wavelength>[_<pair>]
+    parts = str(row['Up']).split('_')
+    try:
+        return float(parts[1])
+    except (IndexError, ValueError):
+        raise ValueError(
+            f"Cannot infer the wavelength of channel `{row['Up']}`: name it `Up_<wavelength>[_<pair>]` "
+            f"or give its `center_wavelength_nm`") from None
+
+
+def _channel_suffix(up: str) -> str:
+    # `Up_650_1` => `650_1`, `_1` identifies the sensor pair set
+    parts = str(up).split('_')
+    return '_'.join(parts[1:]) if len(parts) > 1 else str(up)
+
+
+def _pair_set(up: str) -> str:
+    parts = str(up).split('_')
+    return '_'.join(parts[2:])
+
+
+def match_index_bands(coefficients: pd.DataFrame) -> dict:
+    """
+    Channel rows of `coefficients` used by each index.
+
+    Pairs are grouped by their set suffix (`Up_650_1` belongs to set `1`),
+    an index is computed for every set that has all its bands.
+
+    Returns:
+    --------
+        {index column name: (index name, {band: row position})}
+    """
+    wavelengths = [_channel_wavelength(row) for _, row in coefficients.iterrows()]
+    sets = [_pair_set(up) for up in coefficients['Up']]
+
+    matches = {}
+    for pair_set in dict.fromkeys(sets):
+        for index, (_, bands) in INDICES.items():
+            positions = {}
+            for band in bands:
+                low, high = INDEX_BANDS_NM[index][band]
+                candidates = [
+                    i for i, (w, s) in enumerate(zip(wavelengths, sets))
+                    if s == pair_set and low <= w <= high]
+                if candidates:
+                    positions[band] = candidates[0]
+            if len(positions) == len(bands):
+                name = f'{index}_{pair_set}' if pair_set else index
+                matches[name] = (index, positions)
+    return matches
+
+
+def compute_products(
+        cal_df: pd.DataFrame,
+        coefficients: pd.DataFrame,
+        timestamp_col: str = 'TIMESTAMP',
+        dtype=np.float64) -> pd.DataFrame:
+    """
+    Reflectance of every calibrated pair and the indices their bands allow.
+
+    Parameters:
+    -----------
+        cal_df: dataset with one column per channel.
+        coefficients: output of `calibrate_pairs()`, columns Up, Down, slope,
+            intercept and optionally center_wavelength_nm.
+
+    Returns:
+    --------
+        DataFrame with `timestamp_col` (if present), one `R_<wavelength>` column
+        per pair and one column per index (`NDVI`, `PRI`, `NDVI_1`, ...).
+    """
+    pairs = coefficients.dropna(subset=['Up', 'Down', 'slope', 'intercept']).reset_index(drop=True)
+    matches = match_index_bands(pairs)
+    n_pairs, n_samples = len(pairs), len(cal_df)
+
+    # One preallocated block holds every output row, columns are views into it
+    block = np.empty((n_pairs + len(matches), n_samples), dtype=np.float64)
+    work = np.empty(n_samples, dtype=np.float64)
+
+    up = np.ascontiguousarray(cal_df[list(pairs['Up'])].to_numpy(dtype=np.float64).T)
+    dw = np.ascontiguousarray(cal_df[list(pairs['Down'])].to_numpy(dtype=np.float64).T)
+    reflectance(up, dw, pairs['slope'].to_numpy(), pairs['intercept'].to_numpy(), out=block[:n_pairs])
+    del up, dw
+
+    columns = {}
+    if timestamp_col in cal_df.columns:
+        columns[timestamp_col] = cal_df[timestamp_col].to_numpy()
+    for i, up_name in enumerate(pairs['Up']):
+        columns[f'R_{_channel_suffix(up_name)}'] = block[i]
+
+    for k, (name, (index, positions)) in enumerate(matches.items()):
+        func, bands = INDICES[index]
+        func(*(block[positions[b]] for b in bands), out=block[n_pairs + k], work=work)
+        columns[name] = block[n_pairs + k]
+
+    products = pd.DataFrame(columns, index=cal_df.index, copy=False)
+    if dtype != np.float64:
+        products = products.astype({c: dtype for c in columns if c != timestamp_col})
+    return products
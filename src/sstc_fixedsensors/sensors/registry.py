@@ -0,0 +1,144 @@
+"""
+    Registry of sensor bands.
+
+    Every band known from the datasheets (`decagon.py`, `skye.py`) is an
+    immutable `Band`. The registry indexes them by serial number and by center
+    wavelength rounded to the nm, so matching an `Up_650_1` column to its band
+    is a dict lookup. It is built once per process with `get_registry()` and
+    shared by every session.
+"""
+import math
+from dataclasses import dataclass
+from functools import lru_cache
+
+import pandas as pd
+
+from sstc_fixedsensors.sensors import decagon, skye
+
+
+@dataclass(frozen=True, slots=True)
+class Band:
+    brand: str
+    model: str
+    center_wavelength_nm: float
+    bandwidth_nm: float = math.nan
+    serial: int = None
+    channel: int = None
+    looking: str = None
+
+    @property
+    def nominal_wavelength_nm(self) -> int:
+        return int(round(self.center_wavelength_nm))
+
+
+class SensorRegistry:
+    """
+    Immutable collection of `Band` with O(1) lookup by serial and wavelength.
+    """
+    __slots__ = ('bands', '_by_serial', '_by_wavelength', '_brands')
+
+    def __init__(self, bands):
+        by_serial, by_wavelength, brands = {}, {}, {}
+        for band in bands:
+            if band.serial is not None:
+                by_serial.setdefault(band.serial, []).append(band)
+            by_wavelength.setdefault(band.nominal_wavelength_nm, []).append(band)
+            brands.setdefault(band.brand, set()).add(band.nominal_wavelength_nm)
+
+        self.bands = tuple(bands)
+        self._by_serial = {k: tuple(v) for k, v in by_serial.items()}
+        self._by_wavelength = {k: tuple(v) for k, v in by_wavelength.items()}
+        self._brands = {k: tuple(sorted(v)) for k, v in brands.items()}
+
+    @property
+    def brands(self) -> tuple:
+        return tuple(self._brands)
+
+    @property
+    def center_wavelengths_nm(self) -> list:
+        return sorted(self._by_wavelength)
+
+    def brand_wavelengths_nm(self, brand: str) -> tuple:
+        return self._brands.get(brand, ())
+
+    def by_serial(self, serial: int) -> tuple:
+        return self._by_serial.get(int(serial), ())
+
+    def by_wavelength(self, wavelength_nm: float) -> tuple:
+        return self._by_wavelength.get(int(round(float(wavelength_nm))), ())
+
+    def band(self, serial: int, channel: int) -> Band:
+        for band in self.by_serial(serial):
+            if band.channel == channel:
+                return band
+        raise KeyError(f'No channel {channel} for serial {serial}')
+
+    def match_channel(self, column: str) -> tuple:
+        """
+        Bands matching a channel column named `Up_<wavelength>[_<pair>]`.
+        """
+        parts = str(column).split('_')
+        if len(parts) < 2:
+            return ()
+        try:
+            return self.by_wavelength(float(parts[1]))
+        except ValueError:
+            return ()
+
+    def auto_match(self, channels_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Fill the channels configuration from the column names.
+
+        For every `Up` channel the `Down` channel with the same suffix is
+        paired, `center_wavelength_nm` is set when the wavelength is known and
+        `sensor_model` when a single brand offers that wavelength. Values
+        already set are kept.
+        """
+        channels_df = channels_df.copy()
+        downs = {
+            '_'.join(str(d).split('_')[1:]): d
+            for d in channels_df['Down'].dropna() if '_' in str(d)}
+
+        for i, up in channels_df['Up'].items():
+            if pd.isna(up):
+                continue
+            suffix = '_'.join(str(up).split('_')[1:])
+            if suffix in downs:
+                channels_df.loc[i, 'Down'] = downs[suffix]
+
+            bands = self.match_channel(up)
+            if not bands:
+                continue
+            if 'center_wavelength_nm' in channels_df.columns and pd.isna(channels_df.loc[i, 'center_wavelength_nm']):
+                channels_df.loc[i, 'center_wavelength_nm'] = bands[0].nominal_wavelength_nm
+            brands = {b.brand for b in bands}
+            if 'sensor_model' in channels_df.columns and len(brands) == 1 \
+                    and pd.isna(channels_df.loc[i, 'sensor_model']):
+                channels_df.loc[i, 'sensor_model'] = brands.pop()
+        return channels_df
+
+
+def _datasheet_bands() -> list:
+    bands = []
+    for serial, channels in skye.SKR1850_CHANNELS.items():
+        for channel, (center, bandwidth) in channels.items():
+            bands.append(Band(
+                'Skye', 'SKR1850', center, bandwidth,
+                serial=serial, channel=channel, looking=skye.SKR1850_LOOKING.get(serial)))
+
+    for model, definition in (('SRS-NDVI', decagon.SRS_NDVI_BANDS), ('SRS-PRI', decagon.SRS_PRI_BANDS)):
+        for channel, (center, bandwidth) in enumerate(definition.values(), start=1):
+            bands.append(Band('Decagon', model, center, bandwidth, channel=channel))
+
+    # Nominal wavelengths without a datasheet bandwidth
+    for brand, module in (('Skye', skye), ('Decagon', decagon)):
+        known = {b.nominal_wavelength_nm for b in bands if b.brand == brand}
+        for center in module.NOMINAL_CENTER_WAVELENGTHS_NM:
+            if center not in known:
+                bands.append(Band(brand, None, float(center)))
+    return bands
+
+
+@lru_cache(maxsize=None)
+def get_registry() -> SensorRegistry:
+    return SensorRegistry(_datasheet_bands())
@@ -16,3 +16,17 @@
 #    'Channel 3: 531.9 nm Bandwidth: 11.9 nm
 #    'Channel 4: 570.8 nm Bandwidth: 9.6 nm
 
+
+# SKR1850 4-channel sensors: {serial: {channel: (center wavelength, bandwidth)}}, in nm
+SKR1850_CHANNELS = {
+    44732: {1: (643.3, 50.5), 2: (857.4, 36.3), 3: (531.6, 11.9), 4: (569.9, 9.7)},
+    44735: {1: (643.3, 50.8), 2: (856.9, 38.9), 3: (531.9, 11.9), 4: (570.8, 9.6)},
+    }
+
+SKR1850_LOOKING = {
+    44732: 'Up',
+    44735: 'Dw',
+    }
+
+# Center wavelengths (nm) offered for Skye sensors in the channels configuration
+NOMINAL_CENTER_WAVELENGTHS_NM = [469, 530, 531, 532, 552, 570, 640, 644, 645, 650, 704, 740, 810, 856, 858, 860, 1636, 1640]
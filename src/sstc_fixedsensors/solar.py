@@ -0,0 +1,200 @@
+"""
+    Solar position at the SITES stations.
+
+    Zenith and azimuth angles follow the NOAA solar calculator equations
+    (Meeus, Astronomical Algorithms), accurate to a fraction of a degree for
+    the stations latitudes. Coordinates are those of `SITES['locations']`.
+
+    Positions are tabulated once per station and day at a 1 minute step and
+    kept in an LRU memo, timestamps are then answered by interpolating the
+    tables. Filtering a year of 1 minute records builds 365 tables in one
+    vectorized pass, later calls over the same days only gather from them.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from sstc_fixedsensors.app.schemas import SITES
+
+
+MINUTES_PER_DAY = 1440
+NS_PER_MINUTE = 60 * 10**9
+NS_PER_DAY = MINUTES_PER_DAY * NS_PER_MINUTE
+
+# Station days kept in memory, 2 x 1441 float64 each (~23 kB)
+MEMO_MAXSIZE = 4096
+
+
+def station_location(station: str) -> dict:
+    """
+    Location record (with `latitude` and `longitude`) of a research station
+    name, station acronym or location acronym.
+    """
+    locations = SITES['locations']
+    research_stations = SITES['research_stations']
+    acronym = research_stations[station]['acronym'] if station in research_stations else station
+    if acronym in locations:
+        return {'acronym': acronym, **locations[acronym]}
+
+    # Stations without a location of the same acronym, e.g. SSTC -> LU
+    for name, s in research_stations.items():
+        if s['acronym'] == acronym:
+            for location_acronym, location in locations.items():
+                if location['research_station'].strip() == name.strip():
+                    return {'acronym': location_acronym, **location}
+    raise ValueError(f'No coordinates for station `{station}`. Valid acronyms: {sorted(locations)}')
+
+
+def solar_position(timestamps, latitude: float, longitude: float) -> tuple:
+    """
+    Zenith and azimuth angles (degrees, azimuth clockwise from north) of the
+    sun at UTC `timestamps` (datetime64 or int64 nanoseconds since epoch).
+    """
+    t = np.asarray(timestamps)
+    if np.issubdtype(t.dtype, np.datetime64):
+        t = t.astype('datetime64[ns]').view(np.int64)
+    t = t.astype(np.int64)
+
+    jd = t / 86400e9 + 2440587.5
+    jc = (jd - 2451545.0) / 36525.0
+
+    mean_long = np.remainder(280.46646 + jc * (36000.76983 + jc * 0.0003032), 360.0)
+    mean_anom = np.radians(357.52911 + jc * (35999.05029 - 0.0001537 * jc))
+    eccent = 0.016708634 - jc * (0.000042037 + 0.0000001267 * jc)
+    center = (
+        np.sin(mean_anom) * (1.914602 - jc * (0.004817 + 0.000014 * jc))
+        + np.sin(2 * mean_anom) * (0.019993 - 0.000101 * jc)
+        + np.sin(3 * mean_anom) * 0.000289)
+    omega = np.radians(125.04 - 1934.136 * jc)
+    apparent_long = np.radians(mean_long + center - 0.00569 - 0.00478 * np.sin(omega))
+    mean_obliq = 23 + (26 + (21.448 - jc * (46.815 + jc * (0.00059 - jc * 0.001813))) / 60) / 60
+    obliq = np.radians(mean_obliq + 0.00256 * np.cos(omega))
+    declination = np.arcsin(np.sin(obliq) * np.sin(apparent_long))
+
+    y = np.tan(obliq / 2) ** 2
+    mean_long = np.radians(mean_long)
+    equation_of_time = 4 * np.degrees(
+        y * np.sin(2 * mean_long)
+        - 2 * eccent * np.sin(mean_anom)
+        + 4 * eccent * y * np.sin(mean_anom) * np.cos(2 * mean_long)
+        - 0.5 * y * y * np.sin(4 * mean_long)
+        - 1.25 * eccent * eccent * np.sin(2 * mean_anom))
+
+    minutes = np.remainder(t, NS_PER_DAY) / NS_PER_MINUTE
+    true_solar_time = np.remainder(minutes + equation_of_time + 4 * longitude, MINUTES_PER_DAY)
+    hour_angle = np.radians(true_solar_time / 4 - 180)
+
+    lat = np.radians(latitude)
+    cos_zenith = np.sin(lat) * np.sin(declination) + np.cos(lat) * np.cos(declination) * np.cos(hour_angle)
+    zenith = np.arccos(np.clip(cos_zenith, -1, 1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cos_azimuth = (np.sin(lat) * np.cos(zenith) - np.sin(declination)) / (np.cos(lat) * np.sin(zenith))
+    azimuth = np.degrees(np.arccos(np.clip(np.nan_to_num(cos_azimuth), -1, 1)))
+    azimuth = np.where(hour_angle > 0, np.remainder(azimuth + 180, 360), np.remainder(540 - azimuth, 360))
+    return np.degrees(zenith), azimuth
+
+
+class _DayTables:
+    """
+    LRU memo of 1 minute zenith/azimuth tables keyed by (location, day).
+    """
+    def __init__(self, maxsize: int = MEMO_MAXSIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, location: dict, days: np.ndarray) -> np.ndarray:
+        """
+        Array of shape `(2, len(days), 1441)` with the zenith and azimuth
+        from 00:00 to 24:00 UTC of every day (days since epoch).
+        """
+        acronym = location['acronym']
+        with self._lock:
+            missing = [d for d in days.tolist() if (acronym, d) not in self._tables]
+            self.misses += len(missing)
+            self.hits += len(days) - len(missing)
+
+        if missing:
+            # Every missing day in one vectorized evaluation
+            minutes = np.arange(MINUTES_PER_DAY + 1, dtype=np.int64) * NS_PER_MINUTE
+            t = (np.asarray(missing, dtype=np.int64)[:, None] * NS_PER_DAY + minutes).ravel()
+            zenith, azimuth = solar_position(t, location['latitude'], location['longitude'])
+            tables = np.stack([zenith, azimuth]).reshape(2, len(missing), -1)
+            tables.flags.writeable = False
+
+        with self._lock:
+            for i, d in enumerate(missing):
+                self._tables[(acronym, d)] = tables[:, i]
+            result = np.empty((2, len(days), MINUTES_PER_DAY + 1))
+            for i, d in enumerate(days.tolist()):
+                key = (acronym, d)
+                if key in self._tables:
+                    self._tables.move_to_end(key)
+                    result[:, i] = self._tables[key]
+                else:
+                    # Evicted by a concurrent caller between both locked sections
+                    result[:, i] = solar_position(
+                        d * NS_PER_DAY + np.arange(MINUTES_PER_DAY + 1) * NS_PER_MINUTE,
+                        location['latitude'], location['longitude'])
+            while len(self._tables) > self.maxsize:
+                self._tables.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+
+
+_DAY_TABLES = _DayTables()
+
+
+def station_solar_position(station: str, timestamps, utc_offset: float = 0) -> pd.DataFrame:
+    """
+    Zenith and azimuth at a station for logger `timestamps`.
+
+    Parameters:
+    -----------
+        station: research station name, station or location acronym.
+        timestamps: datetimes in the logger time, `utc_offset` hours ahead
+            of UTC (1 for loggers kept on Swedish standard time).
+
+    Returns:
+    --------
+        DataFrame with the columns `solar_zenith` and `solar_azimuth`
+        (degrees), NaN where the timestamp is missing.
+    """
+    location = station_location(station)
+    t = pd.to_datetime(pd.Series(timestamps)).to_numpy(dtype='datetime64[ns]').view(np.int64)
+    valid = t != np.iinfo(np.int64).min
+    t = t - int(utc_offset * 3600 * 10**9)
+
+    days = np.floor_divide(t[valid], NS_PER_DAY)
+    unique_days, day_index = np.unique(days, return_inverse=True)
+    tables = _DAY_TABLES.get(location, unique_days)
+
+    minute = np.remainder(t[valid], NS_PER_DAY) / NS_PER_MINUTE
+    i = np.minimum(minute.astype(np.int64), MINUTES_PER_DAY - 1)
+    frac = minute - i
+    zenith0, zenith1 = tables[0, day_index, i], tables[0, day_index, i + 1]
+    azimuth0, azimuth1 = tables[1, day_index, i], tables[1, day_index, i + 1]
+
+    zenith = np.full(len(t), np.nan)
+    azimuth = np.full(len(t), np.nan)
+    zenith[valid] = zenith0 + frac * (zenith1 - zenith0)
+    # Shortest way around the circle, the azimuth wraps at north
+    azimuth[valid] = np.remainder(azimuth0 + frac * (np.remainder(azimuth1 - azimuth0 + 180, 360) - 180), 360)
+    index = timestamps.index if isinstance(timestamps, pd.Series) else None
+    return pd.DataFrame({'solar_zenith': zenith, 'solar_azimuth': azimuth}, index=index)
+
+
+def daylight(station: str, timestamps, max_zenith: float = 80.0, utc_offset: float = 0) -> np.ndarray:
+    """
+    True where the sun is higher than `90 - max_zenith` degrees.
+    """
+    zenith = station_solar_position(station, timestamps, utc_offset)['solar_zenith'].to_numpy()
+    with np.errstate(invalid='ignore'):
+        return zenith <= max_zenith
@@ -0,0 +1,95 @@
+"""
+    Grid spatial index of points given by latitude and longitude.
+
+    Points are bucketed in square cells of `cell_deg` degrees. The buckets are
+    stored CSR-like: point ids sorted by cell and the cell keys with their
+    offsets, so a bounding box query visits only the cells overlapping the
+    box, each one a slice of the sorted ids, and then filters the visited
+    points exactly.
+
+        index = GridIndex(df['latitude'], df['longitude'])
+        rows = index.query(south=55, west=12, north=60, east=16)
+
+    Longitudes are taken modulo 360 degrees (190 is -170), a box with
+    `west > east` crosses the antimeridian.
+"""
+import numpy as np
+
+
+def wrap_longitude(longitude):
+    """
+    Longitudes in degrees wrapped to [-180, 180).
+    """
+    return (np.asarray(longitude, dtype=np.float64) + 180) % 360 - 180
+
+
+class GridIndex:
+    """
+    Bounding box queries over fixed points.
+
+    Parameters:
+    -----------
+        latitude, longitude: point coordinates in degrees, NaN points are
+            never returned.
+        cell_deg: cell size, a few cells per typical query is a good size.
+    """
+    def __init__(self, latitude, longitude, cell_deg: float = 0.5):
+        self.latitude = np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.asarray(longitude, dtype=np.float64)
+        self.cell_deg = cell_deg
+        self._columns = int(np.ceil(360 / cell_deg))
+
+        valid = np.flatnonzero(np.isfinite(self.latitude) & np.isfinite(self.longitude))
+        rows, cols = self._cell(self.latitude[valid], self.longitude[valid])
+        keys = self._key(rows, cols)
+        order = np.argsort(keys, kind='stable')
+        self._ids = valid[order]
+        self._keys, starts = np.unique(keys[order], return_index=True)
+        self._offsets = np.r_[starts, len(order)]
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _cell(self, latitude, longitude) -> tuple:
+        cols = np.floor((wrap_longitude(longitude) + 180) / self.cell_deg).astype(np.int64)
+        return (
+            np.floor((np.asarray(latitude) + 90) / self.cell_deg).astype(np.int64),
+            np.minimum(cols, self._columns - 1))
+
+    def _key(self, rows, cols):
+        # Row-major cell id
+        return rows * self._columns + cols
+
+    def query(self, south: float, west: float, north: float, east: float) -> np.ndarray:
+        """
+        Sorted positions of the points inside the box (bounds included). A
+        box with `west > east` (after wrapping) spans the antimeridian.
+        """
+        if not len(self._ids) or south > north:
+            return np.empty(0, dtype=np.int64)
+        if east - west >= 360:
+            spans = [(-180.0, 180.0)]
+        else:
+            west, east = float(wrap_longitude(west)), float(wrap_longitude(east))
+            spans = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+        return np.unique(np.concatenate([self._query_span(south, west, north, east) for west, east in spans]))
+
+    def _query_span(self, south: float, west: float, north: float, east: float) -> np.ndarray:
+        # `west <= east`, both within [-180, 180]
+        row0, row1 = self._cell([south, north], [0.0, 0.0])[0]
+        col0 = int(np.floor((west + 180) / self.cell_deg))
+        col1 = min(int(np.floor((east + 180) / self.cell_deg)), self._columns - 1)
+        rows = np.arange(row0, row1 + 1)
+        cols = np.arange(col0, col1 + 1)
+        keys = self._key(rows[:, None], cols[None, :]).ravel()
+
+        # Cells of the box holding points, a missing key lands on a neighbour
+        found = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+        found = found[self._keys[found] == keys]
+        if not len(found):
+            return np.empty(0, dtype=np.int64)
+        ids = np.concatenate([self._ids[self._offsets[i]:self._offsets[i + 1]] for i in found])
+
+        lat, lon = self.latitude[ids], wrap_longitude(self.longitude[ids])
+        inside = (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
+        return ids[inside]
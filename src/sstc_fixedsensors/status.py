@@ -0,0 +1,243 @@
+"""
+    Latest calibration and data freshness of every sensor channel.
+
+    Two summary tables live next to the calibration history, in the same
+    SQLite database:
+
+        channel_status  ==> latest calibration of every channel with its
+                            drift diagnostics, refreshed for the recorded
+                            channels only by `CalibrationHistory.record()`
+        data_status     ==> last timestamp and record count of every channel
+                            of a sensor, upserted when files are ingested
+
+    Both are keyed by sensor and serial, so channels of the same name on two
+    sensors of a station (two `Up_650`) are kept apart. Files ingested without
+    a channels configuration (station datasets) record their channels with an
+    empty sensor: their freshness applies to every sensor of the station with
+    that channel and no freshness of its own.
+
+    Readers such as the map activity load both tables with two indexed queries
+    instead of rescanning the history or the logger files.
+"""
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS channel_status (
+    station TEXT NOT NULL,
+    sensor TEXT NOT NULL,
+    serial TEXT NOT NULL DEFAULT '',
+    up TEXT NOT NULL,
+    down TEXT NOT NULL,
+    wavelength_nm REAL,
+    sensor_model TEXT,
+    window_end TEXT,
+    method TEXT,
+    slope REAL,
+    intercept REAL,
+    r2 REAL,
+    converged INTEGER,
+    n_calibrations INTEGER,
+    drift_per_year REAL,
+    slope_change REAL,
+    reasons TEXT,
+    updated_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now')),
+    PRIMARY KEY (station, sensor, serial, up, down)
+);
+CREATE TABLE IF NOT EXISTS data_status (
+    station TEXT NOT NULL,
+    sensor TEXT NOT NULL DEFAULT '',
+    serial TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    first_data TEXT,
+    last_data TEXT,
+    n_records INTEGER,
+    updated_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now')),
+    PRIMARY KEY (station, sensor, serial, channel)
+);
+CREATE INDEX IF NOT EXISTS channel_status_updated ON channel_status (updated_at);
+CREATE INDEX IF NOT EXISTS data_status_updated ON data_status (updated_at);
+"""
+
+CHANNEL_STATUS_COLUMNS = [
+    'station', 'sensor', 'serial', 'up', 'down', 'wavelength_nm', 'sensor_model', 'window_end', 'method',
+    'slope', 'intercept', 'r2', 'converged', 'n_calibrations', 'drift_per_year', 'slope_change', 'reasons']
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Channel states, from the most to the least urgent
+STATES = ('recalibrate', 'stale', 'no data', 'not calibrated', 'ok')
+
+
+def create_tables(connection: sqlite3.Connection):
+    connection.executescript(SCHEMA)
+
+
+def sensor_names(channels_df: pd.DataFrame) -> pd.Series:
+    """
+    Sensor of every row of a channels configuration: `sensor_sites_named`,
+    else `sensor_model`, else 'unknown'.
+    """
+    def column(name):
+        return channels_df[name].astype(object) if name in channels_df.columns \
+            else pd.Series(None, index=channels_df.index, dtype=object)
+
+    sensor = column('sensor_sites_named')
+    sensor = sensor.where(sensor.notna(), column('sensor_model'))
+    return sensor.where(sensor.notna(), 'unknown').astype(str)
+
+
+def channel_sensors(channels_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Up and Down channels of a channels configuration with their sensor, the
+    `channels` and `sensors` of `StatusStore.update_data()`.
+    """
+    sensor = sensor_names(channels_df)
+    keys = pd.concat([
+        pd.DataFrame({'channel': channels_df[c], 'sensor': sensor}) for c in ('Up', 'Down')],
+        ignore_index=True)
+    return keys.dropna(subset=['channel']).drop_duplicates().reset_index(drop=True)
+
+
+def refresh_channel_status(connection: sqlite3.Connection, summary: pd.DataFrame):
+    """
+    Upsert the `history.needs_recalibration()` summary rows of the channels
+    of one recording. Call within the transaction of the recording.
+    """
+    rows = summary.reindex(columns=CHANNEL_STATUS_COLUMNS).copy()
+    rows['window_end'] = pd.to_datetime(rows['window_end']).dt.strftime(TIME_FORMAT)
+    rows['reasons'] = rows['reasons'].replace('', None)
+    rows = rows.astype(object).where(rows.notna(), None)
+    names = ', '.join(CHANNEL_STATUS_COLUMNS)
+    updates = ', '.join(f'{c} = excluded.{c}' for c in CHANNEL_STATUS_COLUMNS[5:])
+    connection.executemany(
+        f"INSERT INTO channel_status ({names}) VALUES ({', '.join('?' * len(CHANNEL_STATUS_COLUMNS))}) "
+        f"ON CONFLICT (station, sensor, serial, up, down) DO UPDATE SET {updates}, "
+        f"updated_at = strftime('%Y-%m-%d %H:%M:%S', 'now')",
+        rows.itertuples(index=False, name=None))
+
+
+class StatusStore:
+    """
+    Reader and data freshness writer of the status tables.
+
+    Parameters:
+    -----------
+        filepath: SQLite database, usually the calibration history file.
+    """
+    def __init__(self, filepath: str, timeout: float = 30.0):
+        self.filepath = filepath
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+        self._connection = sqlite3.connect(filepath, timeout=timeout, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        create_tables(self._connection)
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def update_data(
+            self,
+            station: str,
+            channels: list,
+            first=None,
+            last=None,
+            n_records: int = None,
+            sensors: list = None,
+            serial: str = None):
+        """
+        Record the time span and record count of the ingested channels of a
+        station, an earlier `last` never replaces a later one. `n_records`
+        replaces the stored count: the count of the whole station dataset
+        when known, else that of the last ingested file.
+
+        `sensors` (one per channel, see `channel_sensors()`) and `serial`
+        attribute the channels as `CalibrationHistory.record()` does. Without
+        `sensors` the channels are recorded for the whole station.
+        """
+        first = None if first is None else pd.Timestamp(first).strftime(TIME_FORMAT)
+        last = None if last is None else pd.Timestamp(last).strftime(TIME_FORMAT)
+        channels = [str(c) for c in channels]
+        sensors = [''] * len(channels) if sensors is None else [str(s) for s in sensors]
+        if len(sensors) != len(channels):
+            raise ValueError('`sensors` must have one sensor per channel')
+        serial = '' if serial is None else str(serial)
+        with self._connection:
+            self._connection.executemany(
+                "INSERT INTO data_status (station, sensor, serial, channel, first_data, last_data, n_records) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (station, sensor, serial, channel) DO UPDATE SET "
+                "first_data = min(coalesce(first_data, excluded.first_data), coalesce(excluded.first_data, first_data)), "
+                "last_data = max(coalesce(last_data, excluded.last_data), coalesce(excluded.last_data, last_data)), "
+                "n_records = coalesce(excluded.n_records, n_records), "
+                "updated_at = strftime('%Y-%m-%d %H:%M:%S', 'now')",
+                [(station, s, serial, c, first, last, n_records) for c, s in zip(channels, sensors)])
+
+    def version(self) -> tuple:
+        """
+        Changes whenever a status row is written, a cheap cache key.
+        """
+        return self._connection.execute(
+            "SELECT (SELECT max(updated_at) FROM channel_status), (SELECT count(*) FROM channel_status), "
+            "(SELECT max(updated_at) FROM data_status), (SELECT count(*) FROM data_status)").fetchone()
+
+    def read(self) -> pd.DataFrame:
+        """
+        One row per channel: the calibrated channels and the ingested Up
+        channels without a calibration, with their data freshness.
+        """
+        key = ['station', 'sensor', 'serial', 'up']
+        freshness = ['first_data', 'last_data', 'n_records']
+        calibrations = pd.read_sql_query('SELECT * FROM channel_status', self._connection)
+        data = pd.read_sql_query(
+            'SELECT station, sensor, serial, channel AS up, first_data, last_data, n_records FROM data_status',
+            self._connection)
+        data = data[data['up'].str.startswith('Up')]
+        shared = data['sensor'] == ''
+        status = calibrations.drop(columns='updated_at').merge(data[~shared], on=key, how='outer')
+
+        # Station wide freshness for the sensors without their own
+        station_data = data[shared].drop(columns=['sensor', 'serial'])
+        fallback = status[['station', 'up']].merge(station_data, on=['station', 'up'], how='left')
+        own = status[freshness].notna().any(axis=1).to_numpy()
+        for c in freshness:
+            status[c] = status[c].where(own, fallback[c].to_numpy())
+        listed = pd.MultiIndex.from_frame(status[['station', 'up']])
+        station_data = data[shared & ~pd.MultiIndex.from_frame(data[['station', 'up']]).isin(listed)]
+        status = pd.concat([status, station_data], ignore_index=True)
+        for c in ('window_end', 'first_data', 'last_data'):
+            status[c] = pd.to_datetime(status[c], format=TIME_FORMAT)
+        return status
+
+
+def channel_states(
+        status: pd.DataFrame,
+        now=None,
+        max_data_age_days: float = 2,
+        max_calibration_age_days: float = 365) -> np.ndarray:
+    """
+    State of every channel of `StatusStore.read()`, one of `STATES`.
+    """
+    now = pd.Timestamp.now() if now is None else pd.Timestamp(now)
+    calibration_age = (now - status['window_end']).dt.total_seconds().to_numpy() / 86400
+    data_age = (now - status['last_data']).dt.total_seconds().to_numpy() / 86400
+    reasons = status['reasons'].fillna('').to_numpy(dtype=str)
+    with np.errstate(invalid='ignore'):
+        return np.select(
+            [
+                (reasons != '') | (calibration_age > max_calibration_age_days),
+                data_age > max_data_age_days,
+                np.isnan(data_age),
+                np.isnan(calibration_age),
+                ],
+            STATES[:4],
+            default=STATES[4])
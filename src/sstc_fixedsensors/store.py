@@ -0,0 +1,250 @@
+"""
+    Columnar storage of ingested sensor time series.
+
+    Validated Up/Dw channels are written as Parquet files partitioned by
+    station, year and sensor model:
+
+        <root>/station=ANS/year=2023/sensor=Skye/<name>.parquet
+
+    Every file holds `TIMESTAMP` plus the Up/Down columns of the channel pairs
+    of that sensor. The channels configuration of STEP 03 is stored as JSON in
+    the Parquet schema metadata. Reads are memory mapped and only the requested
+    columns are decoded, so loading one channel-year does not touch the others.
+"""
+import glob
+import json
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from sstc_fixedsensors.app.schemas import SITES
+
+
+TIMESTAMP = 'TIMESTAMP'
+METADATA_KEY = b'sstc_fixedsensors'
+CHANNEL_METADATA_COLUMNS = [
+    'Up',
+    'Down',
+    'sensor_model',
+    'sensor_sites_named',
+    'center_wavelength_nm',
+    'mast_height_m',
+    ]
+
+
+def station_acronym(station: str) -> str:
+    """
+    Returns the acronym of a research station given either its name (as in
+    the station selectbox) or its acronym.
+    """
+    research_stations = SITES['research_stations']
+    if station in research_stations:
+        return research_stations[station]['acronym']
+    acronyms = {s['acronym'] for s in research_stations.values()}
+    if station in acronyms:
+        return station
+    raise ValueError(f'Unknown station `{station}`. Valid acronyms: {sorted(acronyms)}')
+
+
+def _partition_value(value) -> str:
+    if value is None or (isinstance(value, float) and np.isnan(value)) or str(value) == '':
+        return 'unknown'
+    return str(value).replace('/', '-').replace('=', '-').replace(' ', '_')
+
+
+def partition_dirpath(root_dirpath: str, station: str, year: int, sensor: str) -> str:
+    return os.path.join(
+        root_dirpath,
+        f'station={station_acronym(station)}',
+        f'year={int(year)}',
+        f'sensor={_partition_value(sensor)}')
+
+
+def _channels_records(channels: pd.DataFrame) -> list:
+    columns = [c for c in CHANNEL_METADATA_COLUMNS if c in channels.columns]
+    records = channels[columns].astype(object).where(channels[columns].notna(), None)
+    return records.to_dict(orient='records')
+
+
+def write_dataset(
+        cal_df: pd.DataFrame,
+        channels_df: pd.DataFrame,
+        station: str,
+        root_dirpath: str,
+        name: str = None,
+        validated_only: bool = True,
+        compression: str = 'zstd') -> list:
+    """
+    Ingest the channel pairs of a calibration dataset into the Parquet store.
+
+    Parameters:
+    -----------
+        cal_df: dataset with a parsed `TIMESTAMP` column and one column per channel.
+        channels_df: channels configuration from STEP 03.
+        station: station name or acronym.
+        root_dirpath: root directory of the store.
+        name: file name within each partition, a unique id if None. Writing
+            the same name again replaces the file, use the content hash of the
+            source file to make ingestion idempotent.
+        validated_only: ingest only the pairs with `is_validated` set.
+
+    Returns:
+    --------
+        list of written file paths.
+    """
+    if TIMESTAMP not in cal_df.columns:
+        raise KeyError(f'`{TIMESTAMP}` column not found')
+
+    pairs = channels_df.dropna(subset=['Up', 'Down'])
+    if validated_only and 'is_validated' in pairs.columns:
+        pairs = pairs[pairs['is_validated'].fillna(False).astype(bool)]
+    if 'sensor_model' not in pairs.columns:
+        pairs = pairs.assign(sensor_model=None)
+
+    name = name or uuid.uuid4().hex
+    acronym = station_acronym(station)
+    timestamps = pd.to_datetime(cal_df[TIMESTAMP])
+    years = timestamps.dt.year.to_numpy()
+
+    written = []
+    for sensor, sensor_pairs in pairs.groupby(
+            pairs['sensor_model'].map(_partition_value), sort=False):
+        columns = list(dict.fromkeys(list(sensor_pairs['Up']) + list(sensor_pairs['Down'])))
+        metadata = json.dumps({
+            'station': acronym,
+            'sensor': sensor,
+            'channels': _channels_records(sensor_pairs),
+            })
+
+        for year in np.unique(years):
+            rows = years == year
+            # Built from numpy so NaN stays NaN instead of becoming null,
+            # which keeps the columns readable as zero-copy views
+            arrays = {TIMESTAMP: pa.array(timestamps[rows].to_numpy())}
+            for c in columns:
+                arrays[c] = pa.array(cal_df[c].to_numpy(dtype=np.float64)[rows])
+
+            table = pa.table(arrays, metadata={METADATA_KEY: metadata.encode('utf-8')})
+
+            dirpath = partition_dirpath(root_dirpath, acronym, year, sensor)
+            os.makedirs(dirpath, exist_ok=True)
+            filepath = os.path.join(dirpath, f'{name}.parquet')
+            pq.write_table(table, filepath, compression=compression)
+            written.append(filepath)
+
+    return written
+
+
+def partition_files(root_dirpath: str, station: str, year: int, sensor: str) -> list:
+    return sorted(glob.glob(os.path.join(
+        partition_dirpath(root_dirpath, station, year, sensor), '*.parquet')))
+
+
+def read_table(
+        root_dirpath: str,
+        station: str,
+        year: int,
+        sensor: str,
+        columns: list = None) -> pa.Table:
+    """
+    Memory mapped read of a station/year/sensor partition, only `TIMESTAMP`
+    and `columns` are decoded. Files are concatenated sorted by name.
+
+    Files may hold different channels (e.g. the logger program changed
+    mid-year), a channel is null in the rows of the files without it.
+
+    Raises:
+    -------
+        FileNotFoundError: if the partition is empty.
+        KeyError: if a requested column is in none of its files.
+    """
+    filepaths = partition_files(root_dirpath, station, year, sensor)
+    if not filepaths:
+        raise FileNotFoundError(
+            f'No data for station `{station}`, year {year}, sensor `{sensor}` in `{root_dirpath}`')
+
+    read_columns = None if columns is None else [TIMESTAMP] + [c for c in columns if c != TIMESTAMP]
+    tables = []
+    found = set()
+    for f in filepaths:
+        names = pq.read_schema(f).names
+        found.update(names)
+        file_columns = None if read_columns is None else [c for c in read_columns if c in names]
+        tables.append(pq.read_table(f, columns=file_columns, memory_map=True))
+    if read_columns is not None:
+        missing = [c for c in read_columns if c not in found]
+        if missing:
+            raise KeyError(f'Columns not found in the partition: {missing}')
+
+    if len(tables) == 1:
+        return tables[0]
+    table = pa.concat_tables(tables, promote_options='default')
+    if read_columns is not None:
+        table = table.select(read_columns)
+    return table
+
+
+def read_arrays(
+        root_dirpath: str,
+        station: str,
+        year: int,
+        sensor: str,
+        columns: list = None) -> dict:
+    """
+    Read a partition as a dict of numpy arrays. Columns made of a single
+    chunk without missing values are zero-copy views of the Arrow buffers.
+    """
+    table = read_table(root_dirpath, station, year, sensor, columns)
+    arrays = {}
+    for name in table.column_names:
+        column = table.column(name)
+        if column.num_chunks == 1 and column.null_count == 0:
+            arrays[name] = column.chunk(0).to_numpy(zero_copy_only=True)
+        else:
+            arrays[name] = column.to_numpy()
+    return arrays
+
+
+def read_channels(
+        root_dirpath: str,
+        station: str,
+        year: int,
+        sensor: str,
+        columns: list = None) -> pd.DataFrame:
+    """
+    Read a partition as a DataFrame with `TIMESTAMP` and the requested channels.
+    """
+    return read_table(root_dirpath, station, year, sensor, columns).to_pandas(
+        self_destruct=True, split_blocks=True)
+
+
+def read_metadata(filepath: str) -> dict:
+    """
+    Station, sensor and channels configuration stored with a Parquet file.
+    """
+    metadata = pq.read_schema(filepath).metadata or {}
+    if METADATA_KEY not in metadata:
+        return {}
+    return json.loads(metadata[METADATA_KEY].decode('utf-8'))
+
+
+def list_partitions(root_dirpath: str) -> pd.DataFrame:
+    """
+    Table of the station, year and sensor partitions available in the store.
+    """
+    records = []
+    for dirpath in sorted(glob.glob(os.path.join(root_dirpath, 'station=*', 'year=*', 'sensor=*'))):
+        parts = dict(p.split('=', 1) for p in os.path.relpath(dirpath, root_dirpath).split(os.sep))
+        filepaths = glob.glob(os.path.join(dirpath, '*.parquet'))
+        records.append({
+            'station': parts['station'],
+            'year': int(parts['year']),
+            'sensor': parts['sensor'],
+            'files': len(filepaths),
+            'bytes': sum(os.path.getsize(f) for f in filepaths),
+            })
+    return pd.DataFrame(records, columns=['station', 'year', 'sensor', 'files', 'bytes'])
@@ -0,0 +1,210 @@
+"""
+    Reader for Campbell Scientific TOA5 `.dat` files.
+
+    A TOA5 file starts with 4 header lines:
+
+        "TOA5","<station>","<logger model>","<serial>","<OS>","<program>","<signature>","<table>"
+        "TIMESTAMP","RECORD","Up_650","Dw_650",...    ==> field names
+        "TS","RN","mV","mV",...                       ==> units
+        "","","Avg","Avg",...                         ==> aggregation
+
+    followed by the comma separated records. Campbell writes missing values as `"NAN"`.
+"""
+import csv
+import io
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+
+HEADER_LINES = 4
+TIMESTAMP = 'TIMESTAMP'
+RECORD = 'RECORD'
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+NA_VALUES = ['NAN', 'INF', '-INF']
+# Aggregations the logger only computes on numbers, `Smp` fields may hold strings
+NUMERIC_AGGREGATIONS = ('Avg', 'Max', 'Min', 'Tot', 'Std', 'WVc', 'Med')
+
+
+@dataclass(frozen=True)
+class TOA5Header:
+    """
+    Metadata stored in the 4 header lines of a TOA5 file.
+    """
+    file_format: str
+    station_name: str
+    logger_model: str
+    logger_serial: str
+    os_version: str
+    program_name: str
+    program_signature: str
+    table_name: str
+    fields: tuple
+    units: tuple
+    aggregations: tuple
+
+    def units_of(self, field: str) -> str:
+        return self.units[self.fields.index(field)]
+
+    def aggregation_of(self, field: str) -> str:
+        return self.aggregations[self.fields.index(field)]
+
+    def to_dict(self) -> dict:
+        return {
+            'file_format': self.file_format,
+            'station_name': self.station_name,
+            'logger_model': self.logger_model,
+            'logger_serial': self.logger_serial,
+            'os_version': self.os_version,
+            'program_name': self.program_name,
+            'program_signature': self.program_signature,
+            'table_name': self.table_name,
+            }
+
+    def fields_df(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            'field': self.fields,
+            'units': self.units,
+            'aggregation': self.aggregations})
+
+
+def _open_text(source):
+    """
+    Returns a text stream for a file path, a text buffer or a binary buffer
+    (e.g. Streamlit `UploadedFile`), rewound to the start.
+    """
+    if isinstance(source, (str, bytes)) or hasattr(source, '__fspath__'):
+        return open(source, 'r', encoding='utf-8', newline='')
+    source.seek(0)
+    if isinstance(source, io.TextIOBase):
+        return source
+    return io.TextIOWrapper(source, encoding='utf-8', newline='')
+
+
+def _close_text(stream, source):
+    # Detach the wrapper so the caller buffer stays open
+    if stream is source:
+        return
+    if isinstance(stream, io.TextIOWrapper) and stream.buffer is source:
+        stream.detach()
+    else:
+        stream.close()
+
+
+def read_header(source) -> TOA5Header:
+    """
+    Parse the 4 header lines of a TOA5 file.
+
+    Raises:
+    -------
+        ValueError: if `source` is not a TOA5 file.
+    """
+    stream = _open_text(source)
+    try:
+        lines = [next(stream, '') for _ in range(HEADER_LINES)]
+    finally:
+        _close_text(stream, source)
+
+    rows = list(csv.reader(lines))
+    if len(rows) < HEADER_LINES or not rows[0] or rows[0][0] != 'TOA5':
+        raise ValueError('Not a TOA5 file: the first header line must start with "TOA5"')
+
+    environment = (rows[0] + [''] * 8)[:8]
+    fields, units, aggregations = rows[1], rows[2], rows[3]
+    if not (len(fields) == len(units) == len(aggregations)):
+        raise ValueError('TOA5 header lines have different number of fields')
+
+    return TOA5Header(*environment, tuple(fields), tuple(units), tuple(aggregations))
+
+
+def is_toa5(source) -> bool:
+    try:
+        read_header(source)
+    except (ValueError, UnicodeDecodeError):
+        return False
+    return True
+
+
+def parse_timestamp(values: pd.Series) -> pd.Series:
+    """
+    Parse Campbell timestamps, fractional seconds are allowed.
+    """
+    try:
+        return pd.to_datetime(values, format=TIMESTAMP_FORMAT)
+    except ValueError:
+        return pd.to_datetime(values, format='ISO8601')
+
+
+def _finalize(chunk: pd.DataFrame, inferred: list, dtype) -> pd.DataFrame:
+    if TIMESTAMP in chunk.columns:
+        chunk[TIMESTAMP] = parse_timestamp(chunk[TIMESTAMP])
+    for c in inferred:
+        if pd.api.types.is_numeric_dtype(chunk[c]) and not pd.api.types.is_bool_dtype(chunk[c]):
+            chunk[c] = chunk[c].astype(dtype)
+    return chunk
+
+
+def read_toa5(
+        source,
+        columns: list = None,
+        dtype=np.float64,
+        chunksize: int = None,
+        header: TOA5Header = None):
+    """
+    Read the records of a TOA5 file.
+
+    Only `TIMESTAMP`, `RECORD` (when present) and the requested `columns` are
+    parsed. `TIMESTAMP` is returned as datetime64, `RECORD` as int64 and the
+    numeric data columns with `dtype` (float64 by default, float32 halves the
+    memory). Fields holding strings (status, sensor ID, ...) are kept as object.
+
+    Parameters:
+    -----------
+        source: file path or buffer.
+        columns: data columns to read, all fields if None.
+        dtype: numpy float dtype of the data columns.
+        chunksize: if set, an iterator of DataFrames of `chunksize` rows is
+            returned so that large files are processed in bounded memory.
+        header: already parsed header, read from `source` if None.
+
+    Returns:
+    --------
+        DataFrame, or iterator of DataFrames when `chunksize` is set.
+    """
+    if header is None:
+        header = read_header(source)
+
+    if columns is None:
+        columns = [f for f in header.fields if f not in (TIMESTAMP, RECORD)]
+    missing = [c for c in columns if c not in header.fields]
+    if missing:
+        raise KeyError(f'Columns not found in the TOA5 file: {missing}')
+
+    usecols = [f for f in (TIMESTAMP, RECORD) if f in header.fields] + list(columns)
+    # Sampled fields can be strings: their type is inferred, then numbers cast to `dtype`
+    dtypes = {c: dtype for c in columns if header.aggregation_of(c) in NUMERIC_AGGREGATIONS}
+    inferred = [c for c in columns if c not in dtypes]
+    if RECORD in usecols:
+        dtypes[RECORD] = np.int64
+    if TIMESTAMP in usecols:
+        dtypes[TIMESTAMP] = str
+
+    if not isinstance(source, str) and not hasattr(source, '__fspath__'):
+        source.seek(0)
+
+    reader = pd.read_csv(
+        source,
+        header=None,
+        skiprows=HEADER_LINES,
+        names=list(header.fields),
+        usecols=usecols,
+        dtype=dtypes,
+        na_values=NA_VALUES,
+        engine='c',
+        chunksize=chunksize,
+        )
+
+    if chunksize is None:
+        return _finalize(reader, inferred, dtype)[usecols]
+    return (_finalize(chunk, inferred, dtype)[usecols] for chunk in reader)
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from sstc_fixedsensors import bootstrap
+from sstc_fixedsensors.bootstrap import bootstrap_fit
+
+
+def pair_data(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(50, 800, n)
+    y = 1.1 * x + 3.0 + rng.normal(0, 2.0, n)
+    return x, y
+
+
+def test_intervals_cover_the_true_line():
+    x, y = pair_data()
+    result = bootstrap_fit(x, y, n_resamples=1000, seed=42)
+    assert result.slope_ci[0] < 1.1 < result.slope_ci[1]
+    assert result.intercept_ci[0] < 3.0 < result.intercept_ci[1]
+    assert result.slope_ci[0] < result.slope < result.slope_ci[1]
+
+    # Standard error of the least squares slope
+    residuals = y - (result.slope * x + result.intercept)
+    se = np.sqrt(residuals @ residuals / (len(x) - 2) / ((x - x.mean()) @ (x - x.mean())))
+    assert result.slope_se == pytest.approx(se, rel=0.15)
+
+
+def test_same_replicates_with_and_without_the_pool():
+    x, y = pair_data(n=500)
+    serial = bootstrap_fit(x, y, n_resamples=300, seed=7, batch_size=64)
+    pooled = bootstrap_fit(x, y, n_resamples=300, seed=7, batch_size=64, processes=2)
+    np.testing.assert_array_equal(serial.slopes, pooled.slopes)
+    assert serial.slope_ci == pooled.slope_ci
+    assert len(serial.slopes) == 300
+
+    other = bootstrap_fit(x, y, n_resamples=300, seed=8, batch_size=64)
+    assert not np.array_equal(serial.slopes, other.slopes)
+
+
+def test_blocks_do_not_change_the_replicates(monkeypatch):
+    x, y = pair_data(n=500)
+    reference = bootstrap_fit(x, y, n_resamples=50, seed=5)
+    # Blocks of 3 replicates, the last one partial
+    monkeypatch.setattr(bootstrap, 'BLOCK_INDICES', 1500)
+    np.testing.assert_array_equal(bootstrap_fit(x, y, n_resamples=50, seed=5).slopes, reference.slopes)
+
+
+def test_replicate_sums_match_an_explicit_resample():
+    x, y = pair_data(n=50)
+    result = bootstrap_fit(x, y, n_resamples=1, seed=3, batch_size=1)
+    index = np.random.default_rng(np.random.SeedSequence(3).spawn(1)[0]).integers(0, 50, size=50, dtype=np.int32)
+    slope, intercept = np.polyfit(x[index], y[index], 1)
+    assert result.slopes[0] == pytest.approx(slope, rel=1e-9)
+    assert result.intercepts[0] == pytest.approx(intercept, rel=1e-7)
+
+
+def test_too_few_samples():
+    result = bootstrap_fit([1.0, np.nan], [2.0, 3.0], n_resamples=10)
+    assert np.isnan(result.slope) and result.n_resamples == 0
@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sstc_fixedsensors.cache import ResultCache, content_hash, make_key
+
+
+def frame():
+    return pd.DataFrame({'Up_650': [1.0, 2.0, 3.0], 'Dw_650': [0.5, 1.0, 1.5]})
+
+
+def test_make_key_is_stable_on_content():
+    assert make_key(frame(), {'Threshold': 0.03, 'speed': 6}) == make_key(frame(), {'speed': 6, 'Threshold': 0.03})
+    assert make_key(np.arange(4)) == make_key(np.arange(4))
+    assert content_hash(b'abc') == content_hash(b'abc') != content_hash(b'abd')
+
+
+def test_make_key_changes_with_data_and_parameters():
+    reference = make_key(frame(), {'Threshold': 0.03})
+    changed = frame()
+    changed.loc[1, 'Dw_650'] = 1.01
+    renamed = frame().rename(columns={'Dw_650': 'Dw_660'})
+    assert make_key(changed, {'Threshold': 0.03}) != reference
+    assert make_key(renamed, {'Threshold': 0.03}) != reference
+    assert make_key(frame(), {'Threshold': 0.04}) != reference
+    assert make_key(np.arange(4, dtype=np.int32)) != make_key(np.arange(4, dtype=np.int64))
+    assert make_key(np.arange(4).reshape(2, 2)) != make_key(np.arange(4))
+
+
+def test_lru_eviction():
+    cache = ResultCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1  # `b` becomes the least recently used
+    cache.set('c', 3)
+    assert 'b' not in cache and 'a' in cache and 'c' in cache
+    assert cache.get('b', 'missing') == 'missing'
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_spill_and_reload(tmp_path):
+    cache = ResultCache(maxsize=1, spill_dirpath=str(tmp_path))
+    cache.set('a', frame())
+    cache.set('b', 2)
+    assert len(cache) == 1
+    assert os.path.exists(tmp_path / 'a.pkl')
+    assert 'a' in cache
+
+    pd.testing.assert_frame_equal(cache.get('a'), frame())
+    assert not os.path.exists(tmp_path / 'a.pkl')
+    assert os.path.exists(tmp_path / 'b.pkl')
+
+    cache.clear()
+    assert len(cache) == 0 and not os.listdir(tmp_path)
+
+
+def test_get_or_compute():
+    cache = ResultCache()
+    calls = []
+
+    def compute(x):
+        calls.append(x)
+        return x * 2
+
+    assert cache.get_or_compute('k', compute, 2) == 4
+    assert cache.get_or_compute('k', compute, 3) == 4
+    assert calls == [2]
+
+    # A cached None is a hit, not a miss
+    assert cache.get_or_compute('none', lambda: None) is None
+    assert cache.get_or_compute('none', pytest.fail) is None
@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sstc_fixedsensors import qc
+from sstc_fixedsensors.calibration import calibrate_pairs, calibration, linear_fit, pair_result
+
+
+def baseline_calibration(up_channel, dw_channel, standard=1, Threshold=0.03, Iter=100, speed=6):
+    # The `curve_fit` loop of `app/calval.py` before the closed-form engine, without the plots
+    curve_fit = pytest.importorskip('scipy.optimize').curve_fit
+
+    up_channel = np.asarray(up_channel, dtype=np.float64)
+    dw_channel = np.asarray(dw_channel, dtype=np.float64) / standard
+    popt, _ = curve_fit(linear_fit, up_channel, dw_channel)
+    yfit = linear_fit(up_channel, *popt)
+    ME = np.abs((yfit - dw_channel) / yfit)
+    MaxME = np.max(ME)
+    counter = 0
+    while MaxME > Threshold:
+        Ind = np.where(ME > speed * Threshold)[0]
+        up_channel = np.delete(up_channel, Ind)
+        dw_channel = np.delete(dw_channel, Ind)
+        popt, _ = curve_fit(linear_fit, up_channel, dw_channel)
+        yfit = linear_fit(up_channel, *popt)
+        ME = np.abs(yfit - dw_channel) / np.mean(yfit)
+        MaxME = np.max(ME)
+        speed -= 1
+        if speed < 1:
+            speed = 1
+        counter += 1
+        if counter > Iter:
+            return None
+    return popt[0], popt[1], len(up_channel), counter
+
+
+def pair_data(n=5000, slope=1.1, intercept=3.0, outliers=0.02, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(50, 800, n)
+    y = slope * x + intercept + rng.normal(0, 1.0, n)
+    corrupted = rng.random(n) < outliers
+    y[corrupted] *= rng.uniform(0.3, 2.0, corrupted.sum())
+    return pd.Series(x, name='Up_650'), pd.Series(y, name='Dw_650')
+
+
+def dataset(n=3000, n_pairs=3, seed=0):
+    rng = np.random.default_rng(seed)
+    columns, pairs = {}, []
+    for i in range(n_pairs):
+        x, y = pair_data(n, slope=rng.uniform(0.8, 1.2), intercept=rng.uniform(-5, 5), seed=seed + i)
+        columns[f'Up_{i}'], columns[f'Dw_{i}'] = x.to_numpy(), y.to_numpy()
+        pairs.append((f'Up_{i}', f'Dw_{i}'))
+    cal_df = pd.DataFrame(columns)
+    cal_df.iloc[::97, 0] = np.nan
+    return cal_df, pd.DataFrame(pairs, columns=['Up', 'Down'])
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2, 3])
+def test_calibration_matches_baseline(seed):
+    # Module tolerance: slope and intercept within 1e-6, same samples rejected
+    up, dw = pair_data(seed=seed)
+    expected = baseline_calibration(up, dw)
+    assert expected is not None
+    slope, intercept, n_samples, iterations = expected
+
+    result = calibration(up, dw)
+    assert result.converged
+    assert result.slope == pytest.approx(slope, rel=1e-6)
+    assert result.intercept == pytest.approx(intercept, rel=1e-6, abs=1e-6)
+    assert result.n_samples == n_samples
+    assert result.iterations == iterations
+
+
+def test_calibration_standard_and_mask():
+    up, dw = pair_data(seed=4)
+    result = calibration(up, dw * 2, standard=2)
+    reference = calibration(up, dw)
+    assert result.slope == pytest.approx(reference.slope)
+    assert result.mask.sum() == result.n_samples == len(result.up_channel)
+    np.testing.assert_allclose(result.yfit, result.slope * result.up_channel + result.intercept)
+
+
+def test_calibration_skips_non_finite_and_flagged_samples():
+    up, dw = pair_data(seed=5)
+    up[:10] = np.nan
+    flags = np.zeros(len(up), dtype=np.uint8)
+    flags[10:20] = qc.QC.STUCK
+    result = calibration(up, dw, qc=flags)
+    assert not result.mask[:20].any()
+
+
+def test_calibration_length_mismatch():
+    up, dw = pair_data(n=10)
+    with pytest.raises(ValueError):
+        calibration(up, dw[:5])
+
+
+def test_calibrate_pairs_single_pair_with_qc():
+    cal_df, channels_df = dataset()
+    flags = qc.screen(cal_df)
+    flags.iloc[5:10] |= np.uint8(qc.QC.STUCK)
+    original = cal_df.copy()
+    coefficients = calibrate_pairs(cal_df, channels_df.iloc[:1], qc=flags)
+    up, dw = channels_df.loc[0, 'Up'], channels_df.loc[0, 'Down']
+    reference = calibration(cal_df[up], cal_df[dw], qc=qc.pair_flags(flags, up, dw))
+    assert coefficients.loc[0, 'slope'] == pytest.approx(reference.slope, rel=1e-12)
+    # The rejected samples are not blanked in the caller dataset
+    pd.testing.assert_frame_equal(cal_df, original)
+
+
+@pytest.mark.parametrize('processes', [None, 2])
+def test_calibrate_pairs_matches_calibration(processes):
+    cal_df, channels_df = dataset()
+    flags = qc.screen(cal_df)
+    coefficients, masks = calibrate_pairs(cal_df, channels_df, qc=flags, processes=processes, masks=True)
+    assert len(coefficients) == len(channels_df)
+    assert masks.shape == (len(channels_df), len(cal_df))
+
+    for pair in coefficients.index:
+        up, dw = coefficients.loc[pair, 'Up'], coefficients.loc[pair, 'Down']
+        reference = calibration(cal_df[up], cal_df[dw], qc=qc.pair_flags(flags, up, dw))
+        assert coefficients.loc[pair, 'slope'] == pytest.approx(reference.slope, rel=1e-12)
+        assert coefficients.loc[pair, 'intercept'] == pytest.approx(reference.intercept, rel=1e-12)
+        assert coefficients.loc[pair, 'n_samples'] == reference.n_samples
+        assert coefficients.loc[pair, 'iterations'] == reference.iterations
+
+        result = pair_result(cal_df, coefficients, masks, pair)
+        np.testing.assert_array_equal(result.mask, reference.mask)
+        np.testing.assert_array_equal(result.up_channel, reference.up_channel)
+
+
+def test_calibrate_pairs_skips_incomplete_rows():
+    cal_df, channels_df = dataset(n_pairs=2)
+    channels_df.loc[1, 'Down'] = None
+    coefficients = calibrate_pairs(cal_df, channels_df)
+    assert list(coefficients['Up']) == ['Up_0']
+
+    empty = calibrate_pairs(cal_df, channels_df.iloc[1:])
+    assert empty.empty and 'slope' in empty.columns
+
+
+def test_calibrate_pairs_bootstrap_columns():
+    cal_df, channels_df = dataset(n=2000, n_pairs=2)
+    coefficients = calibrate_pairs(cal_df, channels_df, n_bootstrap=200)
+    assert (coefficients['slope_ci_low'] <= coefficients['slope']).all()
+    assert (coefficients['slope'] <= coefficients['slope_ci_high']).all()
+    assert (coefficients['slope_se'] > 0).all()
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sstc_fixedsensors.cli import expand_inputs, main, output_stems
+from sstc_fixedsensors.incremental import IncrementalCalibrator
+
+
+def write_toa5(filepath, n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    up = rng.uniform(50, 800, (2, n))
+    dw = np.array([[1.1], [0.9]]) * up + np.array([[3.0], [-2.0]]) + rng.normal(0, 0.5, (2, n))
+    df = pd.DataFrame({
+        'TIMESTAMP': pd.date_range('2023-06-01', periods=n, freq='min').strftime('%Y-%m-%d %H:%M:%S'),
+        'RECORD': np.arange(n),
+        'Up_650': up[0], 'Dw_650': dw[0], 'Up_860': up[1], 'Dw_860': dw[1]})
+    with open(filepath, 'w') as f:
+        f.write('"TOA5","ANS","CR1000X","12345","CR1000X.Std.05","CPU:ans.CR1X","4321","Table1"\n')
+        f.write(','.join(f'"{c}"' for c in df.columns) + '\n')
+        f.write('"TS","RN","mV","mV","mV","mV"\n')
+        f.write('"","","Avg","Avg","Avg","Avg"\n')
+        df.to_csv(f, header=False, index=False)
+
+
+def test_main_writes_coefficients_readable_by_data_processing(tmp_path):
+    write_toa5(tmp_path / 'ANS_2023.dat')
+    channels_filepath = tmp_path / 'channels.csv'
+    pd.DataFrame({'Up': ['Up_650', 'Up_860'], 'Down': ['Dw_650', 'Dw_860']}).to_csv(channels_filepath)
+    output = tmp_path / 'results'
+
+    status = main([
+        str(tmp_path), '--channels', str(channels_filepath), '--output', str(output),
+        '--workers', '1', '--station', 'ANS'])
+    assert status == 0
+
+    # Read back the way the data processing activity reads it
+    coefficients = pd.read_csv(output / 'ANS_2023_calibration.csv', index_col=0)
+    assert list(coefficients['station']) == ['ANS', 'ANS']
+    assert list(coefficients['Up']) == ['Up_650', 'Up_860']
+    np.testing.assert_allclose(coefficients['slope'], [1.1, 0.9], rtol=1e-2)
+    np.testing.assert_allclose(coefficients['intercept'], [3.0, -2.0], atol=0.5)
+
+
+def test_same_named_files_in_different_directories(tmp_path):
+    for year, seed in (('2023', 0), ('2024', 1)):
+        (tmp_path / year).mkdir()
+        write_toa5(tmp_path / year / 'CR1000_Table1.dat', seed=seed)
+    channels_filepath = tmp_path / 'channels.csv'
+    pd.DataFrame({'Up': ['Up_650', 'Up_860'], 'Down': ['Dw_650', 'Dw_860']}).to_csv(channels_filepath)
+    output = tmp_path / 'results'
+
+    status = main([
+        str(tmp_path), '--channels', str(channels_filepath), '--output', str(output),
+        '--workers', '2', '--station', 'ANS', '--store', str(tmp_path / 'store')])
+    assert status == 0
+    assert sorted(p.name for p in output.iterdir()) == [
+        '2023_CR1000_Table1_calibration.csv', '2024_CR1000_Table1_calibration.csv']
+    first = pd.read_csv(output / '2023_CR1000_Table1_calibration.csv', index_col=0)
+    second = pd.read_csv(output / '2024_CR1000_Table1_calibration.csv', index_col=0)
+    assert list(first['file']) == list(second['file']) == ['CR1000_Table1.dat'] * 2
+    assert not np.allclose(first['slope'], second['slope'], rtol=0, atol=1e-12)
+    stored = sorted(p.name for p in (tmp_path / 'store').rglob('*.parquet'))
+    assert {'2023_CR1000_Table1.parquet', '2024_CR1000_Table1.parquet'} <= set(stored)
+
+
+def test_output_stems():
+    assert output_stems(['/a/x.dat', '/a/y.dat']) == ['x', 'y']
+    assert output_stems(['/a/2023/x.dat', '/a/2024/x.dat', '/a/2024/y.dat']) == ['2023_x', '2024_x', 'y']
+    with pytest.raises(ValueError):
+        output_stems(['/a/2023_x.dat', '/a/2023/x.dat', '/a/x.dat'])
+
+
+def test_main_without_inputs(tmp_path):
+    channels_filepath = tmp_path / 'channels.csv'
+    pd.DataFrame({'Up': ['Up_650'], 'Down': ['Dw_650']}).to_csv(channels_filepath)
+    assert main([str(tmp_path / 'missing'), '--channels', str(channels_filepath)]) == 1
+
+
+def test_expand_inputs(tmp_path):
+    (tmp_path / '2023').mkdir()
+    for name in ('2023/a.dat', 'b.dat', 'c.csv'):
+        (tmp_path / name).write_text('')
+    assert expand_inputs([str(tmp_path)]) == [str(tmp_path / '2023/a.dat'), str(tmp_path / 'b.dat')]
+    assert expand_inputs([str(tmp_path / '*.csv')]) == [str(tmp_path / 'c.csv')]
+
+
+def test_state_skips_files_already_absorbed(tmp_path):
+    write_toa5(tmp_path / 'ANS_2023.dat')
+    channels_filepath = tmp_path / 'channels.csv'
+    pd.DataFrame({'Up': ['Up_650', 'Up_860'], 'Down': ['Dw_650', 'Dw_860']}).to_csv(channels_filepath)
+    state_filepath = tmp_path / 'state.npz'
+    argv = [
+        str(tmp_path), '--channels', str(channels_filepath), '--output', str(tmp_path / 'results'),
+        '--workers', '1', '--state', str(state_filepath)]
+
+    assert main(argv) == 0
+    first = IncrementalCalibrator.load(str(state_filepath)).coefficients()
+    assert main(argv) == 0
+    pd.testing.assert_frame_equal(IncrementalCalibrator.load(str(state_filepath)).coefficients(), first)
+
+    write_toa5(tmp_path / 'ANS_2024.dat', seed=1)
+    assert main(argv) == 0
+    second = IncrementalCalibrator.load(str(state_filepath))
+    assert len(second.sources) == 2
+    assert (second.coefficients()['n_samples'] > first['n_samples']).all()
@@ -0,0 +1,124 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sstc_fixedsensors.dataset import StationDataset
+
+
+def write_toa5(filepath, start, n, first_record=0, gap_after=None, status=False):
+    timestamps = pd.date_range(start, periods=n, freq='min')
+    if gap_after is not None:
+        timestamps = timestamps.where(np.arange(n) < gap_after, timestamps + pd.Timedelta('10min'))
+    minutes = (timestamps - pd.Timestamp('2023-06-01')) // pd.Timedelta('1min')
+    fields = ['TIMESTAMP', 'RECORD', 'Up_650', 'Dw_650'] + (['Status'] if status else [])
+    with open(filepath, 'w') as f:
+        f.write('"TOA5","ANS","CR1000X","12345","CR1000X.Std.05","CPU:ans.CR1X","4321","Table1"\n')
+        f.write(','.join(f'"{c}"' for c in fields) + '\n')
+        f.write(','.join(['"TS"', '"RN"', '"mV"', '"mV"'] + (['""'] if status else [])) + '\n')
+        f.write(','.join(['""', '""', '"Avg"', '"Avg"'] + (['"Smp"'] if status else [])) + '\n')
+        for i, (t, m) in enumerate(zip(timestamps, minutes)):
+            values = [f'"{t:%Y-%m-%d %H:%M:%S}"', str(first_record + i), f'{m:.1f}', f'{2 * m:.1f}']
+            f.write(','.join(values + (['"OK"'] if status else [])) + '\n')
+    return str(filepath)
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    return StationDataset(str(tmp_path / 'datasets'), 'Abisko')
+
+
+def test_overlapping_files_are_merged_in_time_order(dataset, tmp_path):
+    later = write_toa5(tmp_path / 'b.dat', '2023-06-01 00:05', 10, first_record=5)
+    earlier = write_toa5(tmp_path / 'a.dat', '2023-06-01 00:00', 10)
+    summary = dataset.add_files([later, earlier], chunksize=4)
+    assert list(summary['added']) == [10, 5]
+    assert list(summary['duplicates']) == [0, 5]
+    assert list(summary['conflicts']) == [0, 0]
+
+    df = dataset.window()
+    assert len(dataset) == len(df) == 15
+    np.testing.assert_array_equal(df['TIMESTAMP'], pd.date_range('2023-06-01', periods=15, freq='min'))
+    np.testing.assert_array_equal(df['RECORD'], np.arange(15))
+    np.testing.assert_array_equal(df['Dw_650'], 2 * np.arange(15.0))
+
+    window = dataset.window('2023-06-01 00:03', '2023-06-01 00:06', columns=['Up_650'])
+    assert list(window.columns) == ['TIMESTAMP', 'RECORD', 'Up_650']
+    np.testing.assert_array_equal(window['Up_650'], [3.0, 4.0, 5.0, 6.0])
+
+
+def test_duplicates_conflicts_and_missing_timestamps(dataset, tmp_path):
+    filepath = write_toa5(tmp_path / 'a.dat', '2023-06-01', 5)
+    with open(filepath, 'a') as f:
+        f.write('"2023-06-01 00:01:00",1,1.0,2.0\n')    # duplicate
+        f.write('"2023-06-01 00:02:00",99,2.0,4.0\n')   # same time, other RECORD
+        f.write('"",100,"NAN","NAN"\n')                 # no timestamp
+    summary = dataset.add_file(filepath)
+    assert (summary['rows'], summary['added'], summary['duplicates']) == (8, 5, 2)
+    assert (summary['conflicts'], summary['invalid']) == (1, 1)
+
+    again = dataset.add_file(filepath)
+    assert again['skipped'] and again['added'] == 0
+    assert len(dataset) == 5
+
+
+def test_duplicates_across_chunks_of_a_file(dataset, tmp_path):
+    filepath = write_toa5(tmp_path / 'a.dat', '2023-06-01', 40)
+    with open(filepath, 'a') as f:
+        f.write('"2023-06-01 00:01:00",1,1.0,2.0\n')     # duplicate of the first chunk
+        f.write('"2023-06-01 00:03:00",77,3.0,6.0\n')    # same time as the second chunk, other RECORD
+        f.write('"2023-05-31 23:50:00",500,-10.0,-20.0\n')
+    summary = dataset.add_file(filepath, chunksize=3)
+    assert (summary['added'], summary['duplicates'], summary['conflicts']) == (41, 2, 1)
+
+    timestamps = dataset.window()['TIMESTAMP']
+    assert timestamps.is_monotonic_increasing and timestamps.is_unique
+    assert timestamps.iloc[0] == pd.Timestamp('2023-05-31 23:50')
+    np.testing.assert_array_equal(dataset.window()['RECORD'], [500, *range(40)])
+
+    # Entries pending from the file are committed to the index once
+    reopened = StationDataset(os.path.dirname(dataset.dirpath), 'ANS')
+    for k in dataset.index:
+        np.testing.assert_array_equal(reopened.index[k], dataset.index[k])
+
+
+def test_gaps(dataset, tmp_path):
+    dataset.add_file(write_toa5(tmp_path / 'a.dat', '2023-06-01', 30, gap_after=20))
+    gaps = dataset.gaps()
+    assert len(gaps) == 1
+    assert gaps.loc[0, 'start'] == pd.Timestamp('2023-06-01 00:19')
+    assert gaps.loc[0, 'end'] == pd.Timestamp('2023-06-01 00:30')
+    assert gaps.loc[0, 'missing'] == 10
+    assert dataset.gaps(interval='20min').empty
+
+
+def test_reopen_and_interrupted_save(dataset, tmp_path, monkeypatch):
+    dataset.add_file(write_toa5(tmp_path / 'a.dat', '2023-06-01', 10))
+    dirpath = dataset.dirpath
+    reopened = StationDataset(os.path.dirname(dirpath), 'ANS')
+    assert len(reopened) == 10 and reopened.columns == ['Up_650', 'Dw_650']
+
+    # A crash before the manifest is replaced leaves the previous dataset
+    def crash(*args, **kwargs):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(json, 'dump', crash)
+    with pytest.raises(OSError):
+        reopened.add_file(write_toa5(tmp_path / 'b.dat', '2023-06-01 00:10', 10, first_record=10))
+    monkeypatch.undo()
+
+    recovered = StationDataset(os.path.dirname(dirpath), 'ANS')
+    assert len(recovered) == 10
+    assert len(recovered.window()) == 10
+    indexes = [f for f in os.listdir(dirpath) if f.startswith('index')]
+    assert recovered.manifest['index'] in indexes
+
+
+def test_string_fields(dataset, tmp_path):
+    dataset.add_file(write_toa5(tmp_path / 'a.dat', '2023-06-01', 3, status=True))
+    dataset.add_file(write_toa5(tmp_path / 'b.dat', '2023-06-01 00:03', 2, first_record=3))
+    df = dataset.window()
+    assert list(df['Status'][:3]) == ['OK', 'OK', 'OK']
+    assert df['Status'][3:].isna().all()
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from sstc_fixedsensors.decimation import LODTiles, grid_indices, minmax_indices
+
+
+def series(n=100_000, seed=0):
+    rng = np.random.default_rng(seed)
+    y = np.cumsum(rng.normal(0, 1, n))
+    y[n // 8] = 1e6
+    y[n // 2] = -1e6
+    y[::997] = np.nan
+    return y
+
+
+def test_minmax_keeps_the_extrema_of_every_bin():
+    y = series(n=10_000)
+    indices = minmax_indices(y, 100)
+    assert np.all(np.diff(indices) > 0)
+    assert np.isfinite(y[indices]).all()
+    for b in range(100):
+        selected = y[indices[(indices >= b * 100) & (indices < (b + 1) * 100)]]
+        assert selected.min() == np.nanmin(y[b * 100:(b + 1) * 100])
+        assert selected.max() == np.nanmax(y[b * 100:(b + 1) * 100])
+
+
+def test_minmax_spikes_and_short_series():
+    y = series()
+    indices = minmax_indices(y, 500)
+    assert {len(y) // 8, len(y) // 2} <= set(indices)
+    assert len(indices) <= 1000
+    # Short series are kept whole, but for non finite samples
+    np.testing.assert_array_equal(minmax_indices([1.0, np.nan, 3.0], 10), [0, 2])
+
+
+def test_minmax_union_over_series():
+    y = np.zeros((2, 1000))
+    y[0, 10], y[1, 900] = 5.0, -5.0
+    indices = minmax_indices(y, 10)
+    assert {10, 900} <= set(indices)
+
+
+def test_grid_indices_one_sample_per_cell():
+    x = np.repeat(np.arange(10.0), 50)
+    y = np.tile(np.arange(50.0), 10)
+    assert len(grid_indices(x, y, width=10, height=50)) == 500
+    thinned = grid_indices(x, y, width=10, height=5)
+    assert 40 <= len(thinned) <= 50
+    # Each group has its own grid
+    groups = np.arange(500) % 2
+    assert len(grid_indices(x, y, width=10, height=5, groups=groups)) == 2 * len(thinned)
+    assert len(grid_indices([np.nan], [1.0])) == 0
+
+
+def test_lod_tiles_levels():
+    y = series()
+    tiles = LODTiles(np.arange(len(y)), y, points_per_tile=1000)
+    # 2**k tiles down to at most 1000 samples per tile: 1, 2, ..., 128 tiles
+    assert tiles.n_levels == 8
+    assert tiles.level_for(0, len(y)) == 0
+    assert tiles.level_for(0, len(y) // 4) == 2
+    assert tiles.level_for(0, 10) == tiles.n_levels - 1
+
+
+@pytest.mark.parametrize('span', [100_000, 25_000, 3_000, 500])
+def test_lod_tiles_view(span):
+    y = series()
+    x = np.arange(len(y)) * 60.0
+    tiles = LODTiles(x, y, points_per_tile=1000)
+    start = 40_000 if span < len(y) else 0
+    indices = tiles.view(x[start], x[min(start + span, len(y)) - 1])
+    assert len(indices) <= 2 * tiles.points_per_tile + 2
+    inside = indices[(indices >= start) & (indices < start + span)]
+    # The extrema of the view are drawn
+    assert np.nanmax(y[inside]) == np.nanmax(y[start:start + span])
+    assert np.nanmin(y[inside]) == np.nanmin(y[start:start + span])
@@ -0,0 +1,68 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sstc_fixedsensors.sensors.harmonize import (
+    DEFAULT_FWHM_NM, WAVELENGTH_GRID_NM, adjustment_factors, channel_responses, harmonize, response_matrix)
+
+
+def test_response_matrix_rows():
+    W = response_matrix([650.0, 810.0], [10.0, np.nan])
+    assert W.shape == (2, len(WAVELENGTH_GRID_NM))
+    np.testing.assert_allclose(W.sum(axis=1), 1.0)
+    assert WAVELENGTH_GRID_NM[W[0].argmax()] == 650.0
+    # NaN widths fall back to the default
+    np.testing.assert_allclose(W[1], response_matrix([810.0], [DEFAULT_FWHM_NM])[0])
+
+
+def test_channel_responses_by_serial():
+    channels_df = pd.DataFrame({'Up': ['Up_650', 'Up_860'], 'sensor_model': ['Skye', 'Skye']})
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        responses = channel_responses(channels_df, serial=44732)
+    np.testing.assert_allclose(responses['center_wavelength_nm'], [643.3, 857.4])
+    np.testing.assert_allclose(responses['fwhm_nm'], [50.5, 36.3])
+
+
+def test_channel_responses_by_nominal_wavelength():
+    channels_df = pd.DataFrame({'Up': ['Up_650', 'Up_570'], 'sensor_model': ['Decagon', 'Decagon']})
+    responses = channel_responses(channels_df)
+    np.testing.assert_allclose(responses['center_wavelength_nm'], [650.0, 570.0])
+    np.testing.assert_allclose(responses['fwhm_nm'], [10.0, 10.0])
+
+
+def test_channel_responses_do_not_borrow_another_band():
+    # No datasheet band at 640 nm: neither the Skye 643.3 nor the Decagon 650 band is taken
+    channels_df = pd.DataFrame({'Up': ['Up_640', 'Up_640'], 'sensor_model': ['Skye', None]})
+    with pytest.warns(UserWarning, match='Up_640'):
+        responses = channel_responses(channels_df)
+    np.testing.assert_allclose(responses['center_wavelength_nm'], [640.0, 640.0])
+    np.testing.assert_allclose(responses['fwhm_nm'], [DEFAULT_FWHM_NM, DEFAULT_FWHM_NM])
+
+
+def test_flat_spectrum_factor_is_one():
+    source = pd.DataFrame({'center_wavelength_nm': [643.3, 857.4, 531.6], 'fwhm_nm': [50.5, 36.3, 11.9]})
+    spectra = np.full((3, len(WAVELENGTH_GRID_NM)), [[0.05], [0.3], [0.6]])
+    factors = adjustment_factors(source, spectra)
+    assert list(factors['target']) == ['red', 'nir', '531']
+    np.testing.assert_allclose(factors['factor'], 1.0)
+    np.testing.assert_allclose(factors['factor_std'], 0.0, atol=1e-12)
+
+
+def test_sloped_spectrum_factor():
+    # The band average of a linear spectrum is its value at the band center
+    source = pd.DataFrame({'center_wavelength_nm': [643.3, 857.4], 'fwhm_nm': [50.5, 36.3]})
+    spectrum = 0.1 + 0.001 * (WAVELENGTH_GRID_NM - 600.0)
+    factors = adjustment_factors(source, spectrum[None, :])
+    np.testing.assert_allclose(factors['target_center_nm'], [650.0, 810.0])
+    expected = (0.1 + 0.001 * (np.array([650.0, 810.0]) - 600.0)) / (0.1 + 0.001 * (np.array([643.3, 857.4]) - 600.0))
+    np.testing.assert_allclose(factors['factor'], expected, rtol=1e-6)
+
+
+def test_harmonize_broadcasts_one_factor_per_channel():
+    values = np.arange(6.0).reshape(2, 3)
+    np.testing.assert_array_equal(harmonize(values, [2.0, 0.5]), [[0.0, 2.0, 4.0], [1.5, 2.0, 2.5]])
+    out = np.empty_like(values)
+    assert harmonize(values, pd.Series([1.0, 1.0]), out=out) is out
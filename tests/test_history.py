@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sstc_fixedsensors.history import CalibrationHistory, drift
+from sstc_fixedsensors.status import StatusStore
+
+
+def coefficients(slopes, r2=0.99, ci=None):
+    df = pd.DataFrame({
+        'Up': [f'Up_{i}' for i in range(len(slopes))],
+        'Down': [f'Dw_{i}' for i in range(len(slopes))],
+        'sensor_model': 'SKR1850',
+        'center_wavelength_nm': [650.0 + 10 * i for i in range(len(slopes))],
+        'slope': slopes,
+        'intercept': 0.1,
+        'r2': r2,
+        'n_samples': 1000,
+        'iterations': 3,
+        'converged': True,
+        })
+    if ci is not None:
+        df['slope_ci_low'] = df['slope'] - ci
+        df['slope_ci_high'] = df['slope'] + ci
+    return df
+
+
+@pytest.fixture
+def history(tmp_path):
+    with CalibrationHistory(str(tmp_path / 'history.sqlite')) as history:
+        yield history
+
+
+def record_series(history, slopes_by_year, **kwargs):
+    for year, slopes in slopes_by_year.items():
+        history.record(
+            coefficients(slopes, **kwargs), station='ANS',
+            start=f'{year}-06-01', end=f'{year}-06-30', serial='SN1')
+
+
+def test_record_upserts_the_same_window(history):
+    assert history.record(coefficients([1.0, 2.0]), station='ANS', start='2023-06-01', end='2023-06-30') == 2
+    history.record(coefficients([1.1, 2.0]), station='ANS', start='2023-06-01', end='2023-06-30')
+    assert len(history) == 2
+    df = history.query(channel='Up_0')
+    assert list(df['slope']) == [1.1]
+    assert df['wavelength_nm'].iloc[0] == 650.0
+    assert history.record(coefficients([]), station='ANS', start='2023-06-01', end='2023-06-30') == 0
+
+
+def test_query_filters(history):
+    record_series(history, {2021: [1.0, 2.0], 2022: [1.0, 2.0]})
+    assert len(history.query(station='ANS')) == 4
+    assert len(history.query(wavelength_nm=660.3)) == 2
+    assert len(history.query(start='2022-01-01')) == 2
+    with pytest.raises(ValueError):
+        history.query(station='XXX')
+
+
+def test_drift_of_a_linear_series(history):
+    # Up_0 loses 1 % a year, Up_1 is stable
+    record_series(history, {2020 + k: [1.0 - 0.01 * k, 2.0] for k in range(4)})
+    summary = history.drift(step_threshold=0.05).set_index('up')
+
+    assert list(summary['n_calibrations']) == [4, 4]
+    assert summary.loc['Up_0', 'slope_change'] == pytest.approx(-0.03)
+    # Windows end a year apart within a leap day
+    assert summary.loc['Up_0', 'drift_per_year'] == pytest.approx(-0.01, rel=1e-2)
+    assert summary.loc['Up_1', 'drift_per_year'] == pytest.approx(0.0, abs=1e-12)
+    assert summary.loc['Up_0', 'slope'] == pytest.approx(0.97)
+    assert (summary['n_steps'] == 0).all()
+    assert summary['last_step_at'].isna().all()
+
+
+def test_drift_detects_steps(history):
+    record_series(history, {2020: [1.0], 2021: [1.0], 2022: [1.1], 2023: [1.1]})
+    summary = history.drift(step_threshold=0.05)
+    assert summary['n_steps'].iloc[0] == 1
+    assert summary['last_step_at'].iloc[0] == pd.Timestamp('2022-06-30')
+    assert summary['last_step'].iloc[0] == pytest.approx(0.0)
+
+
+def test_overlapping_intervals_are_not_steps(history):
+    record_series(history, {2020: [1.0], 2021: [1.1]}, ci=0.06)
+    assert history.drift(step_threshold=0.05)['n_steps'].iloc[0] == 0
+
+    record_series(history, {2022: [1.3]}, ci=0.06)
+    assert history.drift(step_threshold=0.05)['n_steps'].iloc[0] == 1
+
+
+def test_drift_of_an_empty_history():
+    summary = drift(pd.DataFrame(columns=['station', 'sensor', 'serial', 'up', 'down', 'slope', 'window_end']))
+    assert summary.empty and 'drift_per_year' in summary.columns
+
+
+def test_needs_recalibration_reasons(history):
+    history.record(coefficients([1.0, 1.0, 1.0]), station='ANS', start='2022-06-01', end='2022-06-30')
+    history.record(
+        coefficients([1.0, 1.2, 1.0], r2=[0.99, 0.99, 0.5]), station='ANS', start='2023-06-01', end='2023-06-30')
+    summary = history.needs_recalibration(now='2023-07-01', max_drift_per_year=1.0).set_index('up')
+
+    assert not summary.loc['Up_0', 'needs_recalibration']
+    assert summary.loc['Up_0', 'reasons'] == ''
+    assert summary.loc['Up_1', 'reasons'] == 'change, step'
+    assert summary.loc['Up_2', 'reasons'] == 'r2'
+
+    aged = history.needs_recalibration(now='2025-01-01', max_drift_per_year=1.0).set_index('up')
+    assert aged.loc['Up_0', 'reasons'] == 'age'
+
+
+def test_record_refreshes_channel_status(history):
+    history.record(coefficients([1.0]), station='ANS', start='2022-06-01', end='2022-06-30')
+    history.record(coefficients([1.2]), station='ANS', start='2023-06-01', end='2023-06-30')
+    with StatusStore(history.filepath) as store:
+        status = store.read()
+    assert len(status) == 1
+    row = status.iloc[0]
+    assert row['slope'] == pytest.approx(1.2)
+    assert row['n_calibrations'] == 2
+    assert row['window_end'] == pd.Timestamp('2023-06-30')
+    assert row['reasons'] == 'drift, change, step'
+    assert np.isnan(row['n_records'])
@@ -0,0 +1,31 @@
+from sstc_fixedsensors.importtime import app_modules, top_level_imports
+
+
+def test_top_level_imports(tmp_path):
+    source = tmp_path / 'activity.py'
+    source.write_text(
+        'import os\n'
+        'import numpy as np\n'
+        'from schemas import SITES\n'
+        'from sstc_fixedsensors import qc\n'
+        'from sstc_fixedsensors.toa5 import read_toa5\n'
+        'from sstc_fixedsensors.sensors import registry, NOT_A_MODULE\n'
+        'try:\n'
+        '    import pyarrow\n'
+        'except ImportError:\n'
+        '    pass\n'
+        '\n'
+        'def run():\n'
+        '    import altair\n')
+    assert top_level_imports(str(source)) == [
+        'numpy', 'sstc_fixedsensors.app.schemas', 'sstc_fixedsensors.qc', 'sstc_fixedsensors.toa5',
+        'sstc_fixedsensors.sensors.registry', 'pyarrow']
+
+
+def test_app_modules_follow_the_activities():
+    modules = app_modules()
+    assert modules[:2] == ['streamlit', 'streamlit_activities_menu']
+    assert {'sstc_fixedsensors.calibration', 'sstc_fixedsensors.status', 'sstc_fixedsensors.resample'} <= set(modules)
+    # Deferred to the functions that need them
+    assert 'sstc_fixedsensors.store' not in modules
+    assert len(modules) == len(set(modules))
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sstc_fixedsensors.calibration import calibration
+from sstc_fixedsensors.incremental import IncrementalCalibrator
+
+
+def pair_data(n=4000, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(50, 800, n)
+    y = 1.1 * x + 3.0 + rng.normal(0, 1.0, n)
+    corrupted = rng.random(n) < 0.02
+    y[corrupted] *= rng.uniform(0.3, 2.0, corrupted.sum())
+    return x, y
+
+
+def test_batches_converge_to_the_batch_fit():
+    x, y = pair_data()
+    calibrator = IncrementalCalibrator()
+    for i in range(0, len(x), 500):
+        calibrator.update(x[i:i + 500], y[i:i + 500], ('Up_650', 'Dw_650'))
+    coefficients = calibrator.coefficients().iloc[0]
+    reference = calibration(x, y)
+    assert coefficients['slope'] == pytest.approx(reference.slope, rel=1e-3)
+    assert coefficients['n_samples'] == pytest.approx(reference.n_samples, rel=0.02)
+
+
+def test_retract_subtracts_only_accepted_samples():
+    x, y = pair_data()
+    pair = ('Up_650', 'Dw_650')
+    calibrator = IncrementalCalibrator()
+    calibrator.update(x[:2000], y[:2000], pair)
+    before = calibrator.coefficients()
+
+    accepted = calibrator.update(x[2000:], y[2000:], pair)
+    assert not accepted.all()
+    assert calibrator.retract(x[2000:], y[2000:], pair, accepted=accepted).sum() == accepted.sum()
+    pd.testing.assert_frame_equal(calibrator.coefficients(), before, rtol=1e-9)
+
+    with pytest.raises(KeyError):
+        calibrator.retract(x, y, ('Up_860', 'Dw_860'))
+
+
+def test_retract_more_than_absorbed():
+    x, y = pair_data(n=200)
+    pair = ('Up_650', 'Dw_650')
+    calibrator = IncrementalCalibrator(min_samples=1000)
+    calibrator.update(x[:100], y[:100], pair)
+    with pytest.raises(ValueError):
+        calibrator.retract(x, y, pair, accepted=np.ones(len(x), dtype=bool))
+
+
+def test_save_and_load(tmp_path):
+    x, y = pair_data()
+    calibrator = IncrementalCalibrator(Threshold=0.05, standard=2)
+    calibrator.update(x, y, ('Up_650', 'Dw_650'))
+    filepath = str(tmp_path / 'state.npz')
+    calibrator.save(filepath)
+    loaded = IncrementalCalibrator.load(filepath)
+    assert (loaded.Threshold, loaded.standard, loaded.pairs) == (0.05, 2, [('Up_650', 'Dw_650')])
+    pd.testing.assert_frame_equal(loaded.coefficients(), calibrator.coefficients())
+
+
+def test_large_first_batch_is_screened():
+    rng = np.random.default_rng(1)
+    x = rng.uniform(50, 800, 20_000)
+    y = 1.1 * x + 3.0 + rng.normal(0, 1.0, len(x))
+    corrupted = rng.random(len(x)) < 0.05
+    y[corrupted] *= rng.uniform(0.3, 2.0, corrupted.sum())
+
+    calibrator = IncrementalCalibrator()
+    accepted = calibrator.update(x, y, ('Up_650', 'Dw_650'))
+    reference = calibration(x, y)
+    np.testing.assert_array_equal(accepted, reference.mask)
+    coefficients = calibrator.coefficients().iloc[0]
+    assert coefficients['slope'] == pytest.approx(reference.slope, rel=1e-9)
+    assert coefficients['intercept'] == pytest.approx(reference.intercept, rel=1e-6)
+    assert coefficients['n_samples'] == reference.n_samples < len(x)
+
+
+def test_sources_are_checkpointed(tmp_path):
+    x, y = pair_data(n=1000)
+    cal_df = pd.DataFrame({'Up_650': x, 'Dw_650': y})
+    channels_df = pd.DataFrame({'Up': ['Up_650'], 'Down': ['Dw_650']})
+    calibrator = IncrementalCalibrator()
+    calibrator.update_frame(cal_df, channels_df, source='a1b2')
+    with pytest.raises(ValueError):
+        calibrator.update_frame(cal_df, channels_df, source='a1b2')
+
+    filepath = str(tmp_path / 'state.npz')
+    calibrator.save(filepath)
+    assert IncrementalCalibrator.load(filepath).sources == ['a1b2']
+
+
+def test_failed_update_frame_absorbs_nothing():
+    x, y = pair_data(n=1000)
+    cal_df = pd.DataFrame({'Up_650': x, 'Dw_650': y, 'Up_860': x})
+    channels_df = pd.DataFrame({'Up': ['Up_650', 'Up_860'], 'Down': ['Dw_650', 'Dw_860']})
+    calibrator = IncrementalCalibrator()
+    calibrator.update_frame(cal_df, channels_df.iloc[:1], source='a1b2')
+    before = calibrator.coefficients()
+
+    # The second pair misses its Down channel, after the first was absorbed
+    with pytest.raises(KeyError):
+        calibrator.update_frame(cal_df, channels_df, source='c3d4')
+    pd.testing.assert_frame_equal(calibrator.coefficients(), before)
+    assert calibrator.sources == ['a1b2']
+
+    cal_df['Dw_860'] = y
+    calibrator.update_frame(cal_df, channels_df, source='c3d4')
+    assert calibrator.sources == ['a1b2', 'c3d4']
+    assert list(calibrator.coefficients()['Up']) == ['Up_650', 'Up_860']
+    assert calibrator.coefficients()['n_samples'].iloc[0] > before['n_samples'].iloc[0]
@@ -0,0 +1,58 @@
+import tracemalloc
+
+import numpy as np
+
+from sstc_fixedsensors.instrumentation import Profiler, timed
+
+
+MB = 1024 * 1024
+
+
+def test_stage_aggregates():
+    profiler = Profiler()
+    for _ in range(3):
+        with profiler.stage('step'):
+            pass
+    stage = profiler.to_dict()['step']
+    assert stage['count'] == 3
+    assert stage['min_s'] <= stage['max_s'] <= stage['total_s']
+    assert 'sstc_stage_calls_total{stage="step"} 3' in profiler.to_prometheus()
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = Profiler(enabled=False)
+
+    @timed('fit', profiler)
+    def fit():
+        return 1
+
+    assert fit() == 1
+    assert not profiler.stages
+
+
+def test_nested_stages_keep_their_own_peak():
+    was_tracing = tracemalloc.is_tracing()
+    profiler = Profiler(trace_memory=True)
+    try:
+        with profiler.stage('outer'):
+            big = np.ones(10 * MB, dtype=np.uint8)
+            del big
+            with profiler.stage('inner'):
+                small = np.ones(MB, dtype=np.uint8)
+                del small
+        stages = profiler.to_dict()
+        assert stages['outer']['peak_bytes'] >= 10 * MB
+        assert MB <= stages['inner']['peak_bytes'] < 10 * MB
+    finally:
+        profiler.stop_memory_tracing()
+    assert tracemalloc.is_tracing() == was_tracing
+
+
+def test_tracing_stops_with_the_last_profiler():
+    if tracemalloc.is_tracing():
+        return
+    first, second = Profiler(trace_memory=True), Profiler(trace_memory=True)
+    first.stop_memory_tracing()
+    assert tracemalloc.is_tracing()
+    second.stop_memory_tracing()
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+
+from sstc_fixedsensors.jobs import CANCELLED, DONE, JobQueue, UserLimitReached
+
+
+def wait_for(event, progress):
+    while not event.wait(0.01):
+        progress(0.5)
+    return 'result'
+
+
+@pytest.fixture
+def queue():
+    queue = JobQueue(max_workers=1, max_per_user=1)
+    yield queue
+    queue.shutdown()
+
+
+def test_jobs_are_deduplicated_by_key(queue):
+    release = threading.Event()
+    job = queue.submit('key', 'a', wait_for, release)
+    assert queue.submit('key', 'b', wait_for, release) is job
+    release.set()
+    job._future.result()
+    assert job.status == DONE and job.result == 'result'
+
+
+def test_per_user_limit(queue):
+    release = threading.Event()
+    queue.submit('key', 'a', wait_for, release)
+    with pytest.raises(UserLimitReached):
+        queue.submit('other', 'a', wait_for, release)
+    release.set()
+
+
+def test_cancel_waits_for_the_last_subscriber(queue):
+    release = threading.Event()
+    job = queue.submit('key', 'a', wait_for, release)
+    queue.submit('key', 'b', wait_for, release)
+
+    assert not queue.cancel('key', 'a')
+    assert not job._cancel.is_set()
+    assert queue.cancel('key', 'b')
+    job._future.result()
+    assert job.status == CANCELLED
+
+
+def test_cancel_without_owner_cancels_for_everyone(queue):
+    release = threading.Event()
+    job = queue.submit('key', 'a', wait_for, release)
+    queue.submit('key', 'b', wait_for, release)
+    assert queue.cancel('key')
+    job._future.result()
+    assert job.status == CANCELLED
+    assert not queue.cancel('missing')
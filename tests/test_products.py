@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sstc_fixedsensors.sensors.products import compute_products, match_index_bands, ndvi, pri, reflectance
+
+
+def test_reflectance():
+    np.testing.assert_allclose(reflectance([100.0, 200.0], [50.0, 80.0], 2.0, 0.0), [0.25, 0.2])
+    # One coefficient per channel of a (channels, timestamps) array
+    up = np.array([[100.0, 200.0], [10.0, 20.0]])
+    dw = np.array([[50.0, 50.0], [6.0, 6.0]])
+    np.testing.assert_allclose(reflectance(up, dw, [1.0, 2.0], [0.0, 10.0]), [[0.5, 0.25], [0.2, 0.12]])
+
+
+def test_ndvi_and_pri():
+    assert ndvi(0.05, 0.45) == pytest.approx(0.8)
+    assert pri(0.06, 0.04) == pytest.approx(0.2)
+    out = np.empty(2)
+    assert ndvi(np.array([0.1, 0.0]), np.array([0.5, 0.0]), out=out) is out
+    assert out[0] == pytest.approx(2 / 3) and np.isnan(out[1])
+
+
+def coefficients(suffix=''):
+    return pd.DataFrame({
+        'Up': [f'Up_{w}{suffix}' for w in (650, 810, 531, 570)],
+        'Down': [f'Dw_{w}{suffix}' for w in (650, 810, 531, 570)],
+        'slope': [1.0, 1.0, 2.0, 1.0],
+        'intercept': [0.0, 0.0, 0.0, 10.0],
+        })
+
+
+def cal_df(suffix=''):
+    return pd.DataFrame({
+        'TIMESTAMP': pd.to_datetime(['2023-06-01 12:00']),
+        f'Up_650{suffix}': [100.0], f'Dw_650{suffix}': [10.0],
+        f'Up_810{suffix}': [100.0], f'Dw_810{suffix}': [50.0],
+        f'Up_531{suffix}': [50.0], f'Dw_531{suffix}': [6.0],
+        f'Up_570{suffix}': [90.0], f'Dw_570{suffix}': [4.0],
+        })
+
+
+def test_compute_products():
+    products = compute_products(cal_df(), coefficients())
+    assert list(products.columns) == ['TIMESTAMP', 'R_650', 'R_810', 'R_531', 'R_570', 'NDVI', 'PRI']
+    row = products.iloc[0]
+    assert (row['R_650'], row['R_810'], row['R_531'], row['R_570']) == pytest.approx((0.1, 0.5, 0.06, 0.04))
+    assert row['NDVI'] == pytest.approx((0.5 - 0.1) / (0.5 + 0.1))
+    assert row['PRI'] == pytest.approx((0.06 - 0.04) / (0.06 + 0.04))
+
+
+def test_index_per_pair_set():
+    products = compute_products(cal_df('_1'), coefficients('_1'), dtype=np.float32)
+    assert {'R_650_1', 'NDVI_1', 'PRI_1'} <= set(products.columns)
+    assert products['NDVI_1'].dtype == np.float32
+
+    # Only the red band: no NDVI
+    assert match_index_bands(coefficients().iloc[[0, 2, 3]]).keys() == {'PRI'}
+
+
+def test_center_wavelength_column_and_unnamed_channels():
+    renamed = coefficients().assign(Up=['Up_red', 'Up_nir', 'Up_a', 'Up_b'])
+    with pytest.raises(ValueError, match='Up_red'):
+        match_index_bands(renamed)
+
+    located = renamed.assign(center_wavelength_nm=[650, 810, 531, 570])
+    assert set(match_index_bands(located)) == {'NDVI', 'PRI'}
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+from sstc_fixedsensors.qc import DEFAULT_REJECT, QC, pair_flags, screen, summary, usable
+
+
+def has(flags, flag) -> np.ndarray:
+    return (np.asarray(flags) & np.uint8(flag)) != 0
+
+
+def logger_df(n=200):
+    rng = np.random.default_rng(0)
+    timestamps = pd.date_range('2023-06-01', periods=n, freq='1min')
+    return pd.DataFrame({
+        'TIMESTAMP': timestamps,
+        'RECORD': np.arange(n),
+        'Up_650': rng.uniform(100, 200, n),
+        'Dw_650': rng.uniform(100, 200, n),
+        })
+
+
+def test_screen_clean_data():
+    flags = screen(logger_df())
+    assert list(flags.columns) == ['Up_650', 'Dw_650']
+    assert flags.dtypes.eq(np.uint8).all()
+    assert not flags.to_numpy().any()
+
+
+def test_screen_channel_flags():
+    df = logger_df()
+    df.loc[3, 'Up_650'] = np.nan
+    df.loc[5, 'Dw_650'] = -7999.0
+    df.loc[10:13, 'Dw_650'] = 500.0       # clipped at the channel maximum
+    df.loc[50:89, 'Up_650'] = 150.0       # stuck over 40 rows
+    flags = screen(df)
+
+    assert flags.loc[3, 'Up_650'] == QC.MISSING
+    assert flags.loc[5, 'Dw_650'] == QC.SENTINEL
+    assert has(flags.loc[10:13, 'Dw_650'], QC.SATURATED).all()
+    assert has(flags.loc[50:89, 'Up_650'], QC.STUCK).all()
+    assert not has(flags.loc[90:, 'Up_650'], QC.STUCK).any()
+
+
+def test_screen_timestamp_flags_apply_to_every_channel():
+    df = logger_df()
+    df.loc[20, 'TIMESTAMP'] = df.loc[19, 'TIMESTAMP']
+    df.loc[30, 'TIMESTAMP'] = df.loc[0, 'TIMESTAMP'] - pd.Timedelta('1min')
+    flags = screen(df)
+
+    assert has(flags.loc[20], QC.DUPLICATE_TIMESTAMP).all()
+    assert has(flags.loc[30], QC.NONMONOTONIC_TIMESTAMP).all()
+    assert not has(flags.loc[21], QC.DUPLICATE_TIMESTAMP | QC.NONMONOTONIC_TIMESTAMP).any()
+
+
+def test_screen_night_from_solar_zenith():
+    df = logger_df(10)
+    zenith = np.array([95, 85, 80, 79, 60, 45, 60, 81, 90, 100], dtype=float)
+    flags = screen(df, solar_zenith=zenith, max_zenith=80)
+    night = has(flags['Dw_650'], QC.NIGHT)
+    np.testing.assert_array_equal(night, zenith > 80)
+
+
+def test_screen_night_from_up_irradiance():
+    df = logger_df()
+    df.loc[:9, 'Up_650'] = 0.5
+    flags = screen(df)
+    assert has(flags.loc[:9, 'Up_650'], QC.NIGHT).all()
+    assert not has(flags.loc[10:, 'Up_650'], QC.NIGHT).any()
+
+
+def test_pair_flags_and_usable():
+    df = logger_df(5)
+    df.loc[1, 'Up_650'] = np.nan
+    df.loc[2, 'Dw_650'] = -7999.0
+    flags = screen(df)
+    pair = pair_flags(flags, 'Up_650', 'Dw_650')
+    np.testing.assert_array_equal(usable(pair), [True, False, False, True, True])
+    np.testing.assert_array_equal(usable(pair, reject=QC.MISSING), [True, False, True, True, True])
+
+
+def test_night_rejected_by_default():
+    df = logger_df()
+    df.loc[:9, 'Up_650'] = 0.5
+    pair = pair_flags(screen(df), 'Up_650', 'Dw_650')
+    assert DEFAULT_REJECT & QC.NIGHT
+    assert not usable(pair[:10]).any()
+    assert usable(pair[:10], reject=DEFAULT_REJECT & ~QC.NIGHT).all()
+
+
+def test_summary_counts():
+    df = logger_df()
+    df.loc[:4, 'Up_650'] = np.nan
+    counts = summary(screen(df))
+    assert counts.loc['Up_650', 'MISSING'] == 5
+    assert counts.loc['Dw_650', 'MISSING'] == 0
@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+from sstc_fixedsensors.sensors.registry import get_registry
+
+
+@pytest.fixture
+def registry():
+    return get_registry()
+
+
+def test_by_serial(registry):
+    bands = registry.by_serial(44732)
+    assert [b.channel for b in bands] == [1, 2, 3, 4]
+    assert {b.looking for b in bands} == {'Up'}
+    assert registry.band(44735, 2).center_wavelength_nm == 856.9
+    assert registry.by_serial('44732') == bands
+    assert registry.by_serial(1) == ()
+    with pytest.raises(KeyError):
+        registry.band(44732, 9)
+
+
+def test_by_wavelength(registry):
+    # Rounded to the nm
+    assert {(b.brand, b.serial) for b in registry.by_wavelength(643.3)} == {('Skye', 44732), ('Skye', 44735)}
+    assert {b.brand for b in registry.by_wavelength(650)} == {'Skye', 'Decagon'}
+    assert registry.by_wavelength(1000) == ()
+    assert registry.match_channel('Up_531_1') == registry.by_wavelength(531)
+    assert registry.match_channel('Up_red') == ()
+    assert registry.match_channel('Up') == ()
+    assert 830 in registry.brand_wavelengths_nm('Decagon')
+    assert 830 not in registry.brand_wavelengths_nm('Skye')
+
+
+def test_auto_match(registry):
+    channels_df = pd.DataFrame({
+        'Up': ['Up_830_1', 'Up_1640', 'Up_810', 'Up_999'],
+        'Down': ['Dw_1640', 'Dw_810', 'Dw_999', 'Dw_830_1'],
+        'center_wavelength_nm': [None, None, None, None],
+        'sensor_model': [None, 'Skye', None, None],
+        })
+    matched = registry.auto_match(channels_df)
+    assert list(matched['Down']) == ['Dw_830_1', 'Dw_1640', 'Dw_810', 'Dw_999']
+    assert list(matched['center_wavelength_nm'][:3]) == [830, 1640, 810]
+    assert pd.isna(matched.loc[3, 'center_wavelength_nm'])
+    # 810 nm is offered by both brands, the model is left for the user
+    assert list(matched['sensor_model'][:2]) == ['Decagon', 'Skye']
+    assert matched['sensor_model'][2:].isna().all()
+    assert channels_df.loc[0, 'Down'] == 'Dw_1640'
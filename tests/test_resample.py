@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sstc_fixedsensors.resample import Resampler, resample, window_labels
+
+
+def logger_df(n=3000, freq='1min', seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'TIMESTAMP': pd.date_range('2023-06-01 00:07', periods=n, freq=freq),
+        'RECORD': np.arange(n),
+        'Up_650': rng.normal(100, 10, n),
+        'Dw_650': rng.normal(80, 10, n),
+        })
+    df.loc[rng.random(n) < 0.05, 'Up_650'] = np.nan
+    return df
+
+
+def chunks(df, size):
+    return [df.iloc[i:i + size] for i in range(0, len(df), size)]
+
+
+@pytest.mark.parametrize('window, rule', [('10min', '10min'), ('hourly', 'h'), ('daily', 'D')])
+def test_resample_matches_pandas(window, rule):
+    df = logger_df()
+    result = resample(df, window=window, stats=('mean', 'median', 'min', 'max', 'std', 'count'), quantiles=(0.25,))
+    expected = df.set_index('TIMESTAMP')[['Up_650', 'Dw_650']].resample(rule)
+
+    for channel in ('Up_650', 'Dw_650'):
+        for stat in ('mean', 'median', 'min', 'max', 'std', 'count'):
+            np.testing.assert_allclose(
+                result[f'{channel}_{stat}'].to_numpy(dtype=np.float64),
+                getattr(expected[channel], stat)().to_numpy(dtype=np.float64),
+                rtol=1e-9, err_msg=f'{channel}_{stat}')
+        np.testing.assert_allclose(
+            result[f'{channel}_q25'].to_numpy(), expected[channel].quantile(0.25).to_numpy(), rtol=1e-9)
+    assert (result.index == expected.mean().index).all()
+
+
+@pytest.mark.parametrize('size', [1, 7, 60, 1000])
+def test_chunked_equals_single_pass(size):
+    df = logger_df()
+    single = resample(df, window='hourly', stats=('mean', 'median', 'count'))
+    chunked = resample(chunks(df, size), window='hourly', stats=('mean', 'median', 'count'))
+    pd.testing.assert_frame_equal(chunked, single)
+
+
+def test_min_coverage_and_fill_gaps():
+    df = logger_df(n=600)
+    df = df[(df['TIMESTAMP'] < '2023-06-01 03:00') | (df['TIMESTAMP'] >= '2023-06-01 06:00')]
+    df = df[~df['TIMESTAMP'].between('2023-06-01 07:00', '2023-06-01 07:45')]
+    result = resample(chunks(df, 100), window='hourly', min_coverage=0.5, fill_gaps=True)
+
+    assert result['expected'].iloc[0] == 60
+    assert len(result) == len(pd.date_range(result.index[0], result.index[-1], freq='h'))
+    assert (result.loc['2023-06-01 03:00':'2023-06-01 05:00', 'Dw_650_count'] == 0).all()
+    sparse = result.loc['2023-06-01 07:00']
+    assert sparse['Dw_650_count'] == 14
+    assert np.isnan(sparse['Dw_650_mean'])
+
+
+def test_late_rows_are_counted_and_dropped():
+    df = logger_df(n=300)
+    resampler = Resampler(window='hourly')
+    first = resampler.update(df.iloc[:200])
+    late = resampler.update(df.iloc[:10])
+    assert resampler.late_rows == 10
+    assert late.empty and len(first) == 3
+
+
+def test_midday_window():
+    timestamps = pd.date_range('2023-06-01', periods=48, freq='h').to_numpy()
+    labels, keep = window_labels(timestamps, 'midday', longitude=15.0, midday_hours=(11, 13))
+    # Solar time is 1 h ahead at 15°E, 10:00 and 11:00 UTC fall in the window
+    kept = pd.DatetimeIndex(timestamps[keep])
+    assert list(kept.hour) == [10, 11, 10, 11]
+    assert len(np.unique(labels[keep])) == 2
+
+    with pytest.raises(ValueError):
+        Resampler(window='midday')
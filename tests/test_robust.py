@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sstc_fixedsensors.calibration import calibration
+from sstc_fixedsensors.robust import huber, ransac, robust_fit, theil_sen
+
+
+def pair_data(n=20_000, slope=1.1, intercept=3.0, outliers=0.1, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(50, 800, n)
+    y = slope * x + intercept + rng.normal(0, 1.0, n)
+    corrupted = rng.random(n) < outliers
+    y[corrupted] *= rng.uniform(0.3, 2.0, corrupted.sum())
+    x[::101] = np.nan
+    return x, y, corrupted
+
+
+@pytest.mark.parametrize('fit', [huber, theil_sen, ransac])
+def test_recovers_the_line_under_outliers(fit):
+    x, y, corrupted = pair_data()
+    result = fit(x, y)
+    assert result['slope'] == pytest.approx(1.1, rel=2e-3)
+    assert result['intercept'] == pytest.approx(3.0, abs=1.0)
+    assert result['converged']
+    # Non finite samples are never inliers, most clean samples are
+    assert not result['mask'][::101].any()
+    clean = ~corrupted & np.isfinite(x)
+    assert result['mask'][clean].mean() > 0.99
+    assert result['n_samples'] == result['mask'].sum()
+
+
+def test_theil_sen_subsamples_the_slopes():
+    x, y, _ = pair_data(n=2000)
+    exact = theil_sen(x, y, n_slopes=10**7)
+    drawn = theil_sen(x, y, n_slopes=10_000, seed=3)
+    assert drawn['slope'] == pytest.approx(exact['slope'], rel=1e-3)
+
+
+def test_ransac_is_deterministic_for_a_seed():
+    x, y, _ = pair_data(outliers=0.3)
+    first = ransac(x, y, seed=7, max_score_samples=5000)
+    second = ransac(x, y, seed=7, max_score_samples=5000)
+    assert (first['slope'], first['intercept'], first['iterations']) == \
+        (second['slope'], second['intercept'], second['iterations'])
+    np.testing.assert_array_equal(first['mask'], second['mask'])
+    assert first['slope'] == pytest.approx(1.1, rel=2e-3)
+
+
+def test_ransac_trial_budget():
+    x, y, _ = pair_data(n=5000, outliers=0.5)
+    result = ransac(x, y, max_trials=3)
+    assert result['iterations'] == 3
+    assert not result['converged']
+
+
+def test_degenerate_inputs():
+    result = ransac([1.0, np.nan], [2.0, 3.0])
+    assert np.isnan(result['slope']) and result['n_samples'] == 0 and not result['converged']
+    with pytest.raises(ValueError):
+        huber([1.0, 2.0], [1.0])
+
+
+def test_robust_fit_and_calibration_method():
+    x, y, _ = pair_data(n=5000)
+    with pytest.raises(ValueError):
+        robust_fit(x, y, 'lasso')
+    result = calibration(pd.Series(x), pd.Series(y), method='theil-sen', seed=1)
+    expected = robust_fit(x, y, 'theil-sen', seed=1)
+    assert result.method == 'theil-sen'
+    assert result.slope == expected['slope']
+    np.testing.assert_array_equal(result.mask, expected['mask'])
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sstc_fixedsensors import solar
+from sstc_fixedsensors.solar import daylight, solar_position, station_location, station_solar_position
+
+
+def test_station_location():
+    assert station_location('Abisko')['acronym'] == 'ANS'
+    assert station_location('STO')['latitude'] == 68.356
+    # No location with the station acronym: the location of the station
+    assert station_location('SSTC')['acronym'] == 'LU'
+    with pytest.raises(ValueError):
+        station_location('XYZ')
+
+
+def test_lund_summer_solstice_noon():
+    timestamps = pd.date_range('2023-06-21 00:00', '2023-06-21 23:59', freq='min')
+    zenith = station_solar_position('SSTC', timestamps)['solar_zenith'].to_numpy()
+    # 55.712 N minus the 23.44 degrees declination
+    assert zenith.min() == pytest.approx(32.3, abs=0.05)
+    noon = timestamps[zenith.argmin()]
+    assert pd.Timestamp('2023-06-21 11:05') <= noon <= pd.Timestamp('2023-06-21 11:12')
+    # Midnight sun is far below the horizon in Lund, but not at Abisko
+    assert zenith.max() > 90
+    assert station_solar_position('ANS', timestamps)['solar_zenith'].max() < 90
+
+
+def test_memo_interpolation_matches_the_direct_evaluation():
+    solar._DAY_TABLES.clear()
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp('2023-03-01').value
+    t = np.sort(start + rng.integers(0, 10 * 86400 * 10**9, 5000))
+    timestamps = pd.Series(pd.to_datetime(t), index=np.arange(5000) + 100)
+
+    misses = solar._DAY_TABLES.misses
+    first = station_solar_position('Asa', timestamps)
+    assert solar._DAY_TABLES.misses - misses == 10
+    hits = solar._DAY_TABLES.hits
+    second = station_solar_position('Asa', timestamps)
+    assert solar._DAY_TABLES.hits - hits == 10
+    pd.testing.assert_frame_equal(first, second)
+    assert (first.index == timestamps.index).all()
+
+    location = station_location('Asa')
+    zenith, azimuth = solar_position(t, location['latitude'], location['longitude'])
+    np.testing.assert_allclose(first['solar_zenith'], zenith, atol=1e-3)
+    difference = np.remainder(first['solar_azimuth'].to_numpy() - azimuth + 180, 360) - 180
+    np.testing.assert_allclose(difference, 0, atol=1e-2)
+
+
+def test_utc_offset_and_missing_timestamps():
+    utc = station_solar_position('LON', ['2023-06-21 11:00', None])
+    local = station_solar_position('LON', ['2023-06-21 12:00', None], utc_offset=1)
+    np.testing.assert_allclose(local['solar_zenith'], utc['solar_zenith'])
+    assert np.isnan(local.loc[1, 'solar_zenith'])
+    np.testing.assert_array_equal(
+        daylight('LON', ['2023-06-21 11:00', '2023-06-21 23:00', None]), [True, False, False])
+
+
+def test_low_sun_samples_are_left_out_of_the_fits_by_default():
+    from sstc_fixedsensors.calibration import calibrate_pairs
+    from sstc_fixedsensors.qc import screen
+
+    timestamps = pd.date_range('2023-03-21 00:00', '2023-03-21 23:59', freq='min')
+    zenith = station_solar_position('SSTC', timestamps)['solar_zenith'].to_numpy()
+    rng = np.random.default_rng(0)
+    up = rng.uniform(100, 800, len(timestamps))
+    dw = 1.1 * up + 3.0
+    # Low sun: the Down channel sees a different geometry
+    low_sun = zenith > 80
+    dw[low_sun] = 0.6 * up[low_sun]
+    df = pd.DataFrame({'TIMESTAMP': timestamps, 'Up_650': up, 'Dw_650': dw})
+    channels_df = pd.DataFrame({'Up': ['Up_650'], 'Down': ['Dw_650']})
+
+    qc = screen(df, solar_zenith=zenith, max_zenith=80)
+    fit = calibrate_pairs(df, channels_df, qc=qc).iloc[0]
+    assert fit['slope'] == pytest.approx(1.1)
+    assert fit['n_samples'] == (~low_sun).sum()
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from sstc_fixedsensors.spatial import GridIndex
+
+
+def brute_force(latitude, longitude, south, west, north, east):
+    return np.flatnonzero((latitude >= south) & (latitude <= north) & (longitude >= west) & (longitude <= east))
+
+
+@pytest.mark.parametrize('cell_deg', [0.1, 0.5, 2.0, 10.0])
+def test_query_matches_brute_force(cell_deg):
+    rng = np.random.default_rng(0)
+    latitude = rng.uniform(54, 70, 2000)
+    longitude = rng.uniform(10, 25, 2000)
+    latitude[::50] = np.nan
+    index = GridIndex(latitude, longitude, cell_deg=cell_deg)
+    assert len(index) == 2000 - 40
+
+    for _ in range(50):
+        south, north = np.sort(rng.uniform(50, 72, 2))
+        west, east = np.sort(rng.uniform(5, 30, 2))
+        np.testing.assert_array_equal(
+            index.query(south, west, north, east), brute_force(latitude, longitude, south, west, north, east))
+
+
+def test_query_many_points_per_cell():
+    # Stations share coordinates, every channel of a station is a point
+    latitude = np.repeat([56.1, 64.2, 68.35], [7, 3, 12])
+    longitude = np.repeat([13.2, 19.8, 18.8], [7, 3, 12])
+    index = GridIndex(latitude, longitude)
+
+    np.testing.assert_array_equal(index.query(55, 10, 70, 25), np.arange(22))
+    np.testing.assert_array_equal(index.query(68, 18, 69, 19), np.arange(10, 22))
+    assert not len(index.query(60, 10, 62, 12))
+
+
+def test_query_bounds_are_included():
+    index = GridIndex([60.0, 61.0], [15.0, 16.0])
+    np.testing.assert_array_equal(index.query(60.0, 15.0, 61.0, 16.0), [0, 1])
+    assert not len(index.query(61.0, 15.0, 60.0, 16.0))
+
+
+def test_empty_index():
+    index = GridIndex([np.nan], [np.nan])
+    assert len(index) == 0
+    assert not len(index.query(-90, -180, 90, 180))
+
+
+def test_query_across_the_antimeridian():
+    rng = np.random.default_rng(1)
+    latitude = rng.uniform(-60, 60, 1000)
+    longitude = rng.uniform(-180, 180, 1000)
+    longitude[:3] = [180.0, -180.0, 179.99]
+    index = GridIndex(latitude, longitude, cell_deg=2.0)
+
+    crossing = index.query(-60, 170, 60, -170)
+    expected = np.flatnonzero((longitude >= 170) | (longitude <= -170))
+    np.testing.assert_array_equal(crossing, expected)
+    assert {0, 1, 2} <= set(crossing)
+
+    # Longitudes are taken modulo 360 degrees
+    np.testing.assert_array_equal(index.query(-60, 170, 60, 190), crossing)
+    np.testing.assert_array_equal(index.query(-60, 10, 60, 20), index.query(-60, 370, 60, 380))
+    np.testing.assert_array_equal(index.query(-90, -180, 90, 180), np.arange(1000))
+    np.testing.assert_array_equal(
+        GridIndex(latitude, longitude + 360).query(-60, 10, 60, 20), index.query(-60, 10, 60, 20))
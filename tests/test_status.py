@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sstc_fixedsensors.status import STATES, StatusStore, channel_sensors, channel_states
+
+
+@pytest.fixture
+def store(tmp_path):
+    with StatusStore(str(tmp_path / 'history.sqlite')) as store:
+        yield store
+
+
+def test_update_data_keeps_the_widest_span(store):
+    store.update_data('ANS', ['Up_650', 'Dw_650'], '2023-06-01', '2023-06-30', 1000)
+    store.update_data('ANS', ['Up_650'], '2023-05-01', '2023-06-15', 500)
+    store.update_data('ANS', ['Up_650'], None, '2023-07-10')
+    status = store.read()
+
+    # Only Up channels are listed, the Down ones belong to their pair
+    assert list(status['up']) == ['Up_650']
+    row = status.iloc[0]
+    assert row['first_data'] == pd.Timestamp('2023-05-01')
+    assert row['last_data'] == pd.Timestamp('2023-07-10')
+    assert row['n_records'] == 500
+    assert np.isnan(row['slope'])
+
+
+def test_version_changes_on_write(store):
+    before = store.version()
+    store.update_data('ANS', ['Up_650'], '2023-06-01', '2023-06-30', 10)
+    assert store.version() != before
+
+
+def test_channel_states():
+    now = pd.Timestamp('2023-07-01')
+    status = pd.DataFrame({
+        'window_end': pd.to_datetime([
+            '2023-06-01', '2022-01-01', '2023-06-01', '2023-06-01', None, '2023-06-01']),
+        'last_data': pd.to_datetime([
+            '2023-06-30 12:00', '2023-06-30 12:00', '2023-06-01 00:00', None, '2023-06-30 12:00', '2023-06-30 12:00']),
+        'reasons': [None, None, None, None, None, 'drift'],
+        })
+    states = channel_states(status, now=now, max_data_age_days=2, max_calibration_age_days=365)
+    assert list(states) == ['ok', 'recalibrate', 'stale', 'no data', 'not calibrated', 'recalibrate']
+    assert set(states) <= set(STATES)
+
+    relaxed = channel_states(status, now=now, max_data_age_days=60, max_calibration_age_days=1000)
+    assert list(relaxed) == ['ok', 'ok', 'ok', 'no data', 'not calibrated', 'recalibrate']
+
+
+def test_channels_of_two_sensors_are_kept_apart(tmp_path):
+    filepath = str(tmp_path / 'history.sqlite')
+    channels_df = pd.DataFrame({
+        'Up': ['Up_650', 'Up_650_2'], 'Down': ['Dw_650', 'Dw_650_2'],
+        'sensor_sites_named': ['SKR_A', 'SKR_B']})
+    keys = channel_sensors(channels_df)
+    assert list(keys['sensor']) == ['SKR_A', 'SKR_B', 'SKR_A', 'SKR_B']
+
+    with StatusStore(filepath) as store:
+        # Two loggers both name their channel `Up_650`
+        store.update_data('ANS', ['Up_650', 'Dw_650'], '2023-06-01', '2023-06-30', 100, sensors=['SKR_A'] * 2)
+        store.update_data('ANS', ['Up_650'], '2023-01-01', '2023-03-31', 50, sensors=['SKR_B'], serial='44735')
+        with pytest.raises(ValueError):
+            store.update_data('ANS', ['Up_650', 'Dw_650'], sensors=['SKR_A'])
+        status = store.read().sort_values('sensor').reset_index(drop=True)
+
+    assert list(status['sensor']) == ['SKR_A', 'SKR_B']
+    assert list(status['serial']) == ['', '44735']
+    assert list(status['last_data']) == [pd.Timestamp('2023-06-30'), pd.Timestamp('2023-03-31')]
+    assert list(status['n_records']) == [100, 50]
+
+
+def test_station_data_fills_sensors_without_their_own(tmp_path):
+    filepath = str(tmp_path / 'history.sqlite')
+    with StatusStore(filepath) as store:
+        store.update_data('ANS', ['Up_650'], '2023-01-01', '2023-03-31', 50, sensors=['SKR_A'])
+        store._connection.execute(
+            "INSERT INTO channel_status (station, sensor, serial, up, down) VALUES "
+            "('ANS', 'SKR_A', '', 'Up_650', 'Dw_650'), ('ANS', 'SKR_B', '', 'Up_650', 'Dw_650')")
+        # A station dataset knows the channel names only
+        store.update_data('ANS', ['Up_650', 'Up_860'], '2023-01-01', '2023-07-01', 900)
+        status = store.read().sort_values(['up', 'sensor']).reset_index(drop=True)
+
+    assert list(zip(status['up'], status['sensor'])) == [('Up_650', 'SKR_A'), ('Up_650', 'SKR_B'), ('Up_860', '')]
+    assert list(status['last_data']) == [
+        pd.Timestamp('2023-03-31'), pd.Timestamp('2023-07-01'), pd.Timestamp('2023-07-01')]
+    assert list(status['n_records']) == [50, 900, 900]
+
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sstc_fixedsensors.store import (
+    list_partitions, partition_files, read_arrays, read_channels, read_metadata, read_table, write_dataset)
+
+
+def cal_df(start='2023-12-31 23:58', n=5, channels=('Up_650', 'Dw_650')):
+    df = pd.DataFrame({'TIMESTAMP': pd.date_range(start, periods=n, freq='min')})
+    for i, c in enumerate(channels):
+        df[c] = np.arange(n, dtype=np.float64) + 10 * i
+    return df
+
+
+def channels_df(pairs=(('Up_650', 'Dw_650'),), sensor='SKR1800'):
+    return pd.DataFrame({
+        'Up': [p[0] for p in pairs],
+        'Down': [p[1] for p in pairs],
+        'sensor_model': sensor,
+        'is_validated': True})
+
+
+def test_write_and_read_round_trip(tmp_path):
+    df = cal_df()
+    df.loc[1, 'Up_650'] = np.nan
+    written = write_dataset(df, channels_df(), 'ANS', str(tmp_path), name='a')
+    # The rows are split over the 2023 and 2024 partitions
+    assert len(written) == 2
+
+    parts = pd.concat([read_channels(str(tmp_path), 'ANS', year, 'SKR1800') for year in (2023, 2024)])
+    pd.testing.assert_frame_equal(parts.reset_index(drop=True), df, check_dtype=False)
+
+    metadata = read_metadata(written[0])
+    assert metadata['station'] == 'ANS' and metadata['sensor'] == 'SKR1800'
+    assert metadata['channels'][0]['Up'] == 'Up_650'
+
+
+def test_partition_pruning(tmp_path):
+    write_dataset(cal_df(), channels_df(), 'Abisko', str(tmp_path), name='a')
+    write_dataset(
+        cal_df(channels=('Up_860', 'Dw_860')), channels_df([('Up_860', 'Dw_860')], sensor='SRS'),
+        'ASA', str(tmp_path), name='a')
+
+    partitions = list_partitions(str(tmp_path))
+    assert len(partitions) == 4
+    assert set(partitions['station']) == {'ANS', 'ASA'}
+
+    # Only the files of the requested partition are read
+    assert len(partition_files(str(tmp_path), 'ANS', 2024, 'SKR1800')) == 1
+    table = read_table(str(tmp_path), 'ANS', 2024, 'SKR1800', columns=['Dw_650'])
+    assert table.column_names == ['TIMESTAMP', 'Dw_650']
+    assert table.num_rows == 3
+    with pytest.raises(FileNotFoundError):
+        read_table(str(tmp_path), 'ANS', 2022, 'SKR1800')
+
+
+def test_unvalidated_pairs_are_skipped(tmp_path):
+    channels = channels_df([('Up_650', 'Dw_650'), ('Up_860', 'Dw_860')])
+    channels.loc[1, 'is_validated'] = False
+    df = cal_df(channels=('Up_650', 'Dw_650', 'Up_860', 'Dw_860'))
+    write_dataset(df, channels, 'ANS', str(tmp_path), name='a')
+    assert 'Up_860' not in read_table(str(tmp_path), 'ANS', 2023, 'SKR1800').column_names
+
+
+def test_files_with_different_channels(tmp_path):
+    # The logger program gained a channel mid-year
+    write_dataset(cal_df('2023-03-01', n=3), channels_df(), 'ANS', str(tmp_path), name='a')
+    write_dataset(
+        cal_df('2023-06-01', n=2, channels=('Up_650', 'Dw_650', 'Up_860', 'Dw_860')),
+        channels_df([('Up_650', 'Dw_650'), ('Up_860', 'Dw_860')]), 'ANS', str(tmp_path), name='b')
+
+    table = read_table(str(tmp_path), 'ANS', 2023, 'SKR1800')
+    assert table.num_rows == 5
+    assert table.column('Up_860').null_count == 3
+
+    arrays = read_arrays(str(tmp_path), 'ANS', 2023, 'SKR1800', columns=['Up_860', 'Dw_650'])
+    assert list(arrays) == ['TIMESTAMP', 'Up_860', 'Dw_650']
+    np.testing.assert_array_equal(arrays['Up_860'], [np.nan, np.nan, np.nan, 20.0, 21.0])
+    np.testing.assert_array_equal(arrays['Dw_650'], [10.0, 11.0, 12.0, 10.0, 11.0])
+
+    with pytest.raises(KeyError):
+        read_table(str(tmp_path), 'ANS', 2023, 'SKR1800', columns=['Up_999'])
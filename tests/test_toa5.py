@@ -0,0 +1,92 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sstc_fixedsensors.toa5 import is_toa5, read_header, read_toa5
+
+
+TOA5_TEXT = '''"TOA5","ANS","CR1000X","12345","CR1000X.Std.05","CPU:ans.CR1X","4321","Table1"
+"TIMESTAMP","RECORD","Up_650","Dw_650","Up_860","Dw_860"
+"TS","RN","mV","mV","mV","mV"
+"","","Avg","Avg","Avg","Avg"
+"2023-06-01 00:00:00",0,101.5,90.25,201.0,180.5
+"2023-06-01 00:01:00",1,"NAN",91.0,202.0,181.0
+"2023-06-01 00:02:00",2,103.5,92.5,203.0,182.5
+"2023-06-01 00:03:00.5",3,104.0,93.0,204.0,183.0
+"2023-06-01 00:04:00",4,105.0,94.0,205.0,184.0
+'''
+
+
+@pytest.fixture
+def toa5_filepath(tmp_path):
+    filepath = tmp_path / 'CR1000X_ANS_Table1.dat'
+    filepath.write_text(TOA5_TEXT)
+    return str(filepath)
+
+
+def test_read_header(toa5_filepath):
+    header = read_header(toa5_filepath)
+    assert header.station_name == 'ANS'
+    assert header.logger_serial == '12345'
+    assert header.table_name == 'Table1'
+    assert header.fields == ('TIMESTAMP', 'RECORD', 'Up_650', 'Dw_650', 'Up_860', 'Dw_860')
+    assert header.units_of('Up_650') == 'mV'
+    assert header.aggregation_of('Dw_860') == 'Avg'
+
+
+def test_is_toa5(toa5_filepath):
+    assert is_toa5(toa5_filepath)
+    assert not is_toa5(io.StringIO('TIMESTAMP,Up_650\n2023-06-01 00:00:00,1.0\n'))
+
+
+def test_read_toa5(toa5_filepath):
+    df = read_toa5(toa5_filepath)
+    assert list(df.columns) == ['TIMESTAMP', 'RECORD', 'Up_650', 'Dw_650', 'Up_860', 'Dw_860']
+    assert df['TIMESTAMP'].dtype.kind == 'M'
+    assert df['RECORD'].dtype == np.int64
+    assert df['Up_650'].dtype == np.float64
+    assert np.isnan(df.loc[1, 'Up_650'])
+    assert df.loc[3, 'TIMESTAMP'] == pd.Timestamp('2023-06-01 00:03:00.5')
+    assert df.loc[4, 'Dw_860'] == 184.0
+
+
+def test_read_toa5_columns_and_dtype(toa5_filepath):
+    df = read_toa5(toa5_filepath, columns=['Dw_650'], dtype=np.float32)
+    assert list(df.columns) == ['TIMESTAMP', 'RECORD', 'Dw_650']
+    assert df['Dw_650'].dtype == np.float32
+    with pytest.raises(KeyError):
+        read_toa5(toa5_filepath, columns=['Up_999'])
+
+
+def test_read_toa5_chunks_match_single_read(toa5_filepath):
+    chunks = list(read_toa5(toa5_filepath, chunksize=2))
+    assert [len(c) for c in chunks] == [2, 2, 1]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), read_toa5(toa5_filepath))
+
+
+def test_read_toa5_buffer():
+    buffer = io.StringIO(TOA5_TEXT)
+    header = read_header(buffer)
+    df = read_toa5(buffer, header=header)
+    assert len(df) == 5
+
+
+def test_read_toa5_string_fields(tmp_path):
+    filepath = tmp_path / 'CR1000X_ANS_Status.dat'
+    filepath.write_text(
+        '"TOA5","ANS","CR1000X","12345","CR1000X.Std.05","CPU:ans.CR1X","4321","Status"\n'
+        '"TIMESTAMP","RECORD","SensorID","BattV_Min","Count"\n'
+        '"TS","RN","","Volts",""\n'
+        '"","","Smp","Min","Smp"\n'
+        '"2023-06-01 00:00:00",0,"SKR1860-A",12.5,3\n'
+        '"2023-06-01 00:01:00",1,"SKR1860-B","NAN",4\n')
+    df = read_toa5(filepath, dtype=np.float32)
+    assert list(df['SensorID']) == ['SKR1860-A', 'SKR1860-B']
+    assert not pd.api.types.is_numeric_dtype(df['SensorID'])
+    assert df['BattV_Min'].dtype == np.float32 and np.isnan(df.loc[1, 'BattV_Min'])
+    assert df['Count'].dtype == np.float32
+
+    chunks = list(read_toa5(filepath, chunksize=1))
+    assert [c.loc[c.index[0], 'SensorID'] for c in chunks] == ['SKR1860-A', 'SKR1860-B']